@@ -0,0 +1,84 @@
+"""Measure the direct-URL fallback latency as the number of jobs grows.
+
+Usage: python benchmarks/job_lookup_benchmark.py [max_jobs]
+
+Compares the old linear scan over every job for a matching prompt with
+the JobContext path the pipeline now uses, at 1k, 10k and 100k jobs.
+The context path should stay flat; the scan grows with the job count.
+"""
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from job_store import JobContext, SQLiteJobStore  # noqa: E402
+
+DIRECT_URL = "https://example.com/api-error.mp4"
+RUNS = 200
+
+
+def make_job(index: int) -> dict:
+    return {
+        "status": "completed",
+        "prompt": f"Animate prompt number {index}",
+        "created_at": time.time() - index,
+        "title": f"Animation {index}"
+    }
+
+
+def legacy_scan(jobs: dict, prompt: str):
+    job_id = next((k for k, v in jobs.items() if v.get("prompt") == prompt), None)
+    if job_id:
+        jobs[job_id]["direct_url"] = DIRECT_URL
+    return job_id
+
+
+def context_fallback(job_store: SQLiteJobStore, context: JobContext):
+    context.direct_url = DIRECT_URL
+    job_store.update(context.job_id, {"direct_url": context.direct_url})
+
+
+def time_per_call(func, *args) -> float:
+    started = time.perf_counter()
+    for _ in range(RUNS):
+        func(*args)
+    return (time.perf_counter() - started) / RUNS * 1e6
+
+
+def main():
+    max_jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    sizes = [size for size in (1_000, 10_000, 100_000) if size <= max_jobs] or [max_jobs]
+
+    print(f"{'jobs':>8} {'scan us':>10} {'context us':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        job_store = SQLiteJobStore(Path(tmp) / "jobs.db", cache_size=1000, flush_interval=3600)
+        jobs = {}
+        for size in sizes:
+            for index in range(len(jobs), size):
+                job_id = str(uuid.uuid4())
+                job = make_job(index)
+                jobs[job_id] = job
+                job_store.put(job_id, job)
+            job_store.flush()
+
+            # The newest job is the one failing, which the scan finds last
+            job_id = str(uuid.uuid4())
+            prompt = "Explain the Pythagorean theorem"
+            jobs[job_id] = {"status": "processing", "prompt": prompt, "created_at": time.time()}
+            job_store.put(job_id, dict(jobs[job_id]))
+            context = JobContext(job_id, prompt)
+
+            scan_us = time_per_call(legacy_scan, jobs, prompt)
+            context_us = time_per_call(context_fallback, job_store, context)
+            print(f"{size:>8} {scan_us:>10.1f} {context_us:>11.1f}")
+
+            del jobs[job_id]
+            job_store.delete(job_id)
+        job_store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Measure sanitize_manim_code time per KB over a corpus of generated scenes.
+
+Usage: python benchmarks/sanitizer_benchmark.py [scene.py ...]
+
+Without arguments the corpus is every saved scene under outputs/code plus
+the built-in samples below, scaled up to exercise larger generated files.
+Each scene is also run through the original sequential regex sanitizer, so
+the ratio column shows the cost of the token-aware pass against it.
+"""
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from code_sanitizer import rule_stats, sanitize_manim_code  # noqa: E402
+
+SAMPLE_SCENES = {
+    "calculus": '''# Derivative as Slope of Tangent
+from manim import *
+import numpy as np
+
+class DerivativeScene(Scene):
+    def construct(self):
+        axes = Axes(x_range=[-3, 3, 1], y_range=[-1, 9, 1], x_length=8, y_length=5)
+        axes.add_coordinates()
+        graph = axes.plot(lambda x: x ** 2, color=BLUE, label=MathTex("f(x) = x^2"))
+        label = MathTex(r"\\frac{d}{dx} x^2 = 2x").to_edge(UP)
+        dot = Dot(axes.c2p(1, 1), color=YELLOW)
+        tangent = Line(axes.c2p(0, -1), axes.c2p(2, 3), color=RED, shorten_ends=0.1)
+        self.play(ShowCreation(axes), ShowCreation(graph))
+        self.play(Write(label), FadeIn(dot))
+        self.play(Create(tangent))
+        self.wait(1)
+''',
+    "plane": '''# Linear Transformation
+from manim import *
+
+class TransformScene(Scene):
+    def construct(self):
+        plane = NumberPlane(x_range=(-7, 7, 1), background_line_style={"stroke_color": TEAL, "stroke_opacity": 0.4})
+        vector = Arrow(ORIGIN, [2, 1, 0], buff=0, color=YELLOW)
+        vector.set_stroke_width(4)
+        matrix = MathTex(r"\\begin{pmatrix} 1 & 1 \\\\ 0 & 1 \\end{pmatrix}").to_corner(UL)
+        self.add_fixed_in_frame_mobjects(matrix)
+        self.play(Create(plane), GrowArrow(vector))
+        self.play(ApplyMatrix([[1, 1], [0, 1]], plane), ApplyMatrix([[1, 1], [0, 1]], vector))
+        self.wait(1)
+''',
+    "algorithm": '''# Bubble Sort
+from manim import *
+
+class BubbleSortScene(Scene):
+    def construct(self):
+        values = [5, 2, 8, 1, 9, 3]
+        bars = VGroup(*[Rectangle(width=0.6, height=v * 0.4).set_fill_opacity(0.8) for v in values])
+        bars.arrange(RIGHT, buff=0.2, aligned_edge=DOWN).move_to(ORIGIN)
+        title = Text("Bubble Sort (ShowCreation is deprecated)").to_edge(UP)
+        self.play(Write(title), *[ShowCreation(bar) for bar in bars])
+        for i in range(len(values)):
+            for j in range(len(values) - i - 1):
+                if values[j] > values[j + 1]:
+                    values[j], values[j + 1] = values[j + 1], values[j]
+                    self.play(Swap(bars[j], bars[j + 1]), run_time=0.3)
+        self.wait(1)
+''',
+}
+
+
+# The sanitizer as it was before rules were compiled into one pass, kept as the baseline
+LEGACY_FIXES = [
+    (r'\.shorten_ends\([^)]*\)', ''),
+    (r'shorten_ends\s*=\s*[^,)]+[,)]?', ''),
+    (r'Line\.set_length\(', 'Line(ORIGIN, RIGHT).scale('),
+    (r'NumberPlane\([^)]*background_line_style[^)]*\)', 'NumberPlane()'),
+    (r'\.add_coordinates\(\)', '.add_coordinate_labels()'),
+    (r'axes\.plot\([^,]+,\s*label\s*=\s*[^,)]+', lambda m: m.group(0).split(',')[0]),
+    (r'\.next_to_point\(', '.next_to('),
+    (r'\.shift_onto_screen\(\)', '.to_edge()'),
+    (r'ShowCreation\(', 'Create('),
+    (r'DrawBorderThenFill\(', 'DrawBorderThenFill('),
+    (r'\bAVERAGE_COLOR\b', 'BLUE'),
+    (r'\bCOLOR_MAP\b', 'BLUE'),
+    (r'\.set_stroke_width\(', '.set_stroke(width='),
+    (r'\.set_fill_opacity\(', '.set_fill(opacity='),
+    (r'self\.camera\.frame\.', 'self.camera.frame.'),
+    (r'self\.add_fixed_in_frame_mobjects\(', 'self.add_fixed_orientation_mobjects('),
+]
+
+
+def legacy_sanitize(code: str) -> str:
+    for pattern, replacement in LEGACY_FIXES:
+        code = re.sub(pattern, replacement, code)
+    return code
+
+
+def time_per_run(func, code: str, runs: int = 20) -> float:
+    started = time.perf_counter()
+    for _ in range(runs):
+        try:
+            func(code)
+        except ValueError:
+            pass
+    return (time.perf_counter() - started) / runs
+
+
+def scale_scene(code: str, factor: int) -> str:
+    """Repeat the construct body to simulate longer generated scenes"""
+    header, body = code.split("    def construct(self):\n", 1)
+    return header + "    def construct(self):\n" + body * factor
+
+
+def load_corpus(paths):
+    corpus = {}
+    if paths:
+        for path in paths:
+            corpus[Path(path).name] = Path(path).read_text()
+        return corpus
+
+    for path in sorted(Path("outputs/code").glob("*.py")):
+        corpus[path.name] = path.read_text()
+    for name, code in SAMPLE_SCENES.items():
+        for factor in (1, 10, 100):
+            corpus[f"{name}_x{factor}"] = scale_scene(code, factor)
+    return corpus
+
+
+def main():
+    corpus = load_corpus(sys.argv[1:])
+    total_bytes = 0
+    total_seconds = 0.0
+    total_baseline = 0.0
+
+    print(f"{'scene':<30} {'KB':>8} {'ms':>9} {'ms/KB':>8} {'base ms/KB':>11} {'ratio':>7}")
+    for name, code in corpus.items():
+        elapsed = time_per_run(sanitize_manim_code, code)
+        baseline = time_per_run(legacy_sanitize, code)
+
+        kb = len(code.encode()) / 1024
+        total_bytes += len(code.encode())
+        total_seconds += elapsed
+        total_baseline += baseline
+        print(
+            f"{name:<30} {kb:>8.1f} {elapsed * 1000:>9.3f} {elapsed * 1000 / kb:>8.3f} "
+            f"{baseline * 1000 / kb:>11.3f} {elapsed / baseline:>7.2f}"
+        )
+
+    total_kb = total_bytes / 1024
+    print(
+        f"\nOverall: {total_seconds * 1000 / total_kb:.3f} ms/KB over {len(corpus)} scenes "
+        f"(baseline {total_baseline * 1000 / total_kb:.3f} ms/KB, {total_seconds / total_baseline:.2f}x)"
+    )
+    print(f"Rule hits: {rule_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,543 @@
+import ast
+import bisect
+import logging
+import re
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+_hits = Counter()
+_hits_lock = threading.Lock()
+
+
+def _count(rule_names):
+    with _hits_lock:
+        _hits.update(rule_names)
+
+
+def rule_stats() -> dict:
+    """Number of rewrites each sanitizer rule has made since startup"""
+    with _hits_lock:
+        return dict(_hits)
+
+
+# Strings and comments, which rewrites must never touch; f-strings are skipped whole.
+# The string branches are unrolled ("normal* (special normal*)*") instead of using
+# lazy quantifiers, which makes the scan about four times faster.
+_STRING_OR_COMMENT = r"""
+    \#[^\n]*
+  | \'\'\'[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*\'\'\'
+  | \"\"\"[^"\\]*(?:(?:\\.|"(?!""))[^"\\]*)*\"\"\"
+  | '[^'\\\n]*(?:\\.[^'\\\n]*)*'
+  | "[^"\\\n]*(?:\\.[^"\\\n]*)*"
+"""
+_IGNORED = re.compile(_STRING_OR_COMMENT, re.VERBOSE | re.DOTALL)
+# Searching for single characters and matching _IGNORED only where one opens a string
+# or comment is faster than one regex that tries every branch at every position
+_BRACKET_COMMA_OR_QUOTE = re.compile(r"[()\[\]{},#'\"]")
+_BRACKET = re.compile(r"[()\[\]{}]")
+
+
+def _argument_pattern(nesting: int) -> str:
+    """Regex for one call argument, with brackets nested up to nesting levels inside it.
+
+    Every alternative starts with a different character, so the pattern is
+    unrolled ("plain* (special plain*)*") and matches in linear time.
+    """
+    nested = None
+    for _ in range(nesting):
+        special = _STRING_OR_COMMENT if nested is None else f"{_STRING_OR_COMMENT} | {nested}"
+        nested = rf"[(\[{{]  [^()\[\]{{}}'\"\#]* (?:(?:{special}) [^()\[\]{{}}'\"\#]*)*  [)\]}}]"
+    return rf"[^()\[\]{{}},'\"\#]* (?:(?:{_STRING_OR_COMMENT} | {nested}) [^()\[\]{{}},'\"\#]*)*"
+
+
+_KEYWORD_PREFIX = r"([A-Za-z_]\w*)\s*=(?!=)"
+_LEADING_SPACE_PREFIX = r"(?:\s|\#[^\n]*)*"
+
+# One argument, its keyword and the comma or paren after it in one regex call; arguments
+# nested deeper than this (or invalid code) fall back to a character-by-character scan
+_ARGUMENT_NESTING = 4
+_ARGUMENT = re.compile(
+    rf"{_LEADING_SPACE_PREFIX} ((?:{_KEYWORD_PREFIX})? (?:{_argument_pattern(_ARGUMENT_NESTING)})) ([,)])",
+    re.VERBOSE | re.DOTALL
+)
+
+_KEYWORD = re.compile(_KEYWORD_PREFIX)
+_LEADING_SPACE = re.compile(_LEADING_SPACE_PREFIX, re.VERBOSE)
+
+# How far enclosing_paren() looks back per step when searching for an open bracket
+_BACKWARD_WINDOW = 512
+
+
+class _Call:
+    """One call expression, located by character offsets.
+
+    name is the dotted callee ("a.b.method"); it starts with a dot when the
+    chain begins with a call or subscript result, as in "Line(...).method".
+    args holds (start, end) spans of the top-level arguments and separators
+    the offsets of the commas between them, and keywords the keyword of
+    each argument (None for positional ones).
+    """
+
+    __slots__ = ("name", "first", "name_start", "close", "args", "separators", "keywords")
+
+    def __init__(self, name, first, name_start, close, args, separators, keywords):
+        self.name = name
+        self.first = first
+        self.name_start = name_start
+        self.close = close
+        self.args = args
+        self.separators = separators
+        self.keywords = keywords
+
+
+class _Source:
+    """Strings and comments of a code string, with bracket matching around given offsets.
+
+    Built from one regex scan instead of the tokenizer: on generated scenes
+    tokenize costs about 1.6 ms/KB and ast.parse about 0.7 ms/KB, several
+    times the whole sequential regex sanitizer this replaced (about 0.1
+    ms/KB). Brackets are only matched locally, around the calls a rule's
+    trigger points at, so the cost stays below that of the old regex list
+    (see benchmarks/sanitizer_benchmark.py).
+    """
+
+    def __init__(self, code: str):
+        self.code = code
+        spans = [match.span() for match in _IGNORED.finditer(code)]
+        self._ignored_starts = [start for start, _ in spans]
+        self._ignored_ends = [end for _, end in spans]
+
+    def _span_at(self, position: int) -> int:
+        index = bisect.bisect_right(self._ignored_starts, position) - 1
+        if index >= 0 and position < self._ignored_ends[index]:
+            return index
+        return -1
+
+    def in_ignored(self, position: int) -> bool:
+        return self._span_at(position) >= 0
+
+    def enclosing_paren(self, position: int) -> int:
+        """Offset of the innermost bracket containing position, or -1"""
+        code = self.code
+        depth = 0
+        end = position
+        # Keyword arguments are nearly always on the line that opens the call
+        window = position - code.rfind("\n", 0, position)
+        while end > 0:
+            start = max(0, end - window)
+            window = _BACKWARD_WINDOW
+            for match in reversed(list(_BRACKET.finditer(code, start, end))):
+                offset = match.start()
+                if self.in_ignored(offset):
+                    continue
+                if code[offset] in ")]}":
+                    depth += 1
+                elif depth:
+                    depth -= 1
+                else:
+                    return offset
+            end = start
+        return -1
+
+    def call_at(self, open_paren: int):
+        """The call whose argument list opens at open_paren, or None if it is not a complete named call"""
+        code = self.code
+        if open_paren < 0 or code[open_paren] != "(":
+            return None
+
+        # Walk back over a dotted chain of names: a.b.method(
+        name_start = self._identifier_before(open_paren)
+        if name_start < 0:
+            return None
+        first = name_start
+        parts = [code[name_start:self._skip_space_back(open_paren)]]
+        while True:
+            dot = self._skip_space_back(first) - 1
+            if dot < 0 or code[dot] != ".":
+                break
+            start = self._identifier_before(dot)
+            if start < 0:
+                # The chain starts with a call or subscript result
+                parts.append("")
+                break
+            first = start
+            parts.append(code[start:self._skip_space_back(dot)])
+        name = ".".join(reversed(parts))
+
+        arguments = self._arguments(open_paren)
+        if arguments is None:
+            return None
+        return _Call(name, first, name_start, *arguments)
+
+    def _arguments(self, open_paren: int):
+        """(close, args, separators, keywords) of the argument list at open_paren, or None if unclosed"""
+        code = self.code
+        args = []
+        separators = []
+        keywords = []
+        position = open_paren + 1
+        while True:
+            match = _ARGUMENT.match(code, position)
+            if match is None:
+                break
+            start, end = match.span(1)
+            end = self._trim_end(start, end)
+            if start < end:
+                args.append((start, end))
+                keywords.append(match.group(2))
+            position = match.end()
+            if code[position - 1] == ")":
+                return position - 1, args, separators, keywords
+            separators.append(position - 1)
+
+        # Nested too deeply for _ARGUMENT: scan the remaining characters for the closing paren
+        depth = 0
+        search = _BRACKET_COMMA_OR_QUOTE.search
+        bounds = [position - 1]
+        while True:
+            match = search(code, position)
+            if match is None:
+                return None
+            offset = match.start()
+            char = code[offset]
+            position = offset + 1
+            if char == ",":
+                if depth == 0:
+                    bounds.append(offset)
+            elif char in "([{":
+                depth += 1
+            elif char in ")]}":
+                if not depth:
+                    bounds.append(offset)
+                    break
+                depth -= 1
+            else:
+                skipped = _IGNORED.match(code, offset)
+                if skipped:
+                    position = skipped.end()
+
+        for left, right in zip(bounds, bounds[1:]):
+            start = _LEADING_SPACE.match(code, left + 1, right).end()
+            end = self._trim_end(start, right)
+            if start < end:
+                args.append((start, end))
+                keyword = _KEYWORD.match(code, start, end)
+                keywords.append(keyword.group(1) if keyword else None)
+        separators.extend(bounds[1:-1])
+        return bounds[-1], args, separators, keywords
+
+    def _skip_space_back(self, position: int) -> int:
+        while position > 0 and self.code[position - 1].isspace():
+            position -= 1
+        return position
+
+    def _identifier_before(self, position: int) -> int:
+        """Start of the identifier ending just before position (ignoring whitespace), or -1"""
+        code = self.code
+        end = start = self._skip_space_back(position)
+        while start > 0 and (code[start - 1].isalnum() or code[start - 1] == "_"):
+            start -= 1
+        if start == end or code[start].isdigit():
+            return -1
+        return start
+
+    def _trim_end(self, start: int, end: int) -> int:
+        """Move end back over whitespace and trailing comments"""
+        code = self.code
+        if code.find("#", start, end) < 0:
+            while end > start and code[end - 1].isspace():
+                end -= 1
+            return end
+        while end > start:
+            if code[end - 1].isspace():
+                end -= 1
+                continue
+            span = self._span_at(end - 1)
+            if span >= 0 and code[self._ignored_starts[span]] == "#":
+                end = self._ignored_starts[span]
+                continue
+            break
+        return end
+
+
+class CallRule:
+    """Rewrites whole call expressions, matching parentheses outside strings and comments.
+
+    trigger is a name the rule needs to see, either as the called name or as
+    a keyword argument; only calls reached from a trigger are examined.
+    Triggering on the called name is cheaper, since the call is then parsed
+    forward from its parenthesis instead of searched for backwards.
+    """
+
+    def __init__(self, name: str, trigger: str):
+        self.name = name
+        self.trigger = trigger
+
+    def edits(self, source: _Source, call: _Call) -> list:
+        raise NotImplementedError
+
+
+class RemoveMethodCall(CallRule):
+    """obj.method(...) -> obj"""
+
+    def __init__(self, name: str, method: str):
+        super().__init__(name, method)
+        self.method = method
+
+    def edits(self, source, call):
+        if not call.name.endswith("." + self.method):
+            return []
+        dot = source.code.rindex(".", 0, call.name_start)
+        return [(dot, call.close + 1, "")]
+
+
+class RemoveKeyword(CallRule):
+    """f(a, keyword=value, b) -> f(a, b), optionally only for calls to a given method"""
+
+    def __init__(self, name: str, keyword: str, method: str = None):
+        super().__init__(name, method or keyword)
+        self.keyword = keyword
+        self.method = method
+
+    def edits(self, source, call):
+        if self.method and not call.name.endswith("." + self.method):
+            return []
+        args = call.args
+        for index, arg in enumerate(args):
+            if call.keywords[index] != self.keyword:
+                continue
+            if index + 1 < len(args):
+                # Remove up to the next argument, taking the comma with it
+                return [(arg[0], args[index + 1][0], "")]
+            if index > 0:
+                # Last argument: remove the preceding comma instead
+                return [(call.separators[index - 1], arg[1], "")]
+            return [(arg[0], arg[1], "")]
+        return []
+
+
+class ReplaceCallWithKeyword(CallRule):
+    """Replace the whole call when it passes a given keyword"""
+
+    def __init__(self, name: str, func: str, keyword: str, replacement: str):
+        super().__init__(name, func)
+        self.func = func
+        self.keyword = keyword
+        self.replacement = replacement
+
+    def edits(self, source, call):
+        if call.name.split(".")[-1] != self.func:
+            return []
+        if self.keyword in call.keywords:
+            return [(call.first, call.close + 1, self.replacement)]
+        return []
+
+
+# Deprecated APIs that need the call structure to rewrite correctly
+CALL_RULES = [
+    # Fix deprecated shorten_ends method
+    RemoveMethodCall("shorten_ends_method", "shorten_ends"),
+    RemoveKeyword("shorten_ends_keyword", "shorten_ends"),
+
+    # Fix deprecated NumberPlane methods
+    ReplaceCallWithKeyword("number_plane_line_style", "NumberPlane", "background_line_style", "NumberPlane()"),
+
+    # Labels on plots cause rendering issues
+    RemoveKeyword("plot_label", "label", method="plot"),
+]
+
+# Simple renames, each compiled once into its own pattern
+TEXT_RULES = [
+    # Fix deprecated Line methods
+    ("line_set_length", r'Line\.set_length\(', 'Line(ORIGIN, RIGHT).scale('),
+
+    # Fix deprecated Axes methods
+    ("add_coordinates", r'\.add_coordinates\(\)', '.add_coordinate_labels()'),
+
+    # Fix deprecated positioning methods
+    ("next_to_point", r'\.next_to_point\(', '.next_to('),
+    ("shift_onto_screen", r'\.shift_onto_screen\(\)', '.to_edge()'),
+
+    # Fix deprecated animation methods
+    ("show_creation", r'\bShowCreation\(', 'Create('),
+
+    # Fix deprecated color constants
+    ("average_color", r'\bAVERAGE_COLOR\b', 'BLUE'),
+    ("color_map", r'\bCOLOR_MAP\b', 'BLUE'),
+
+    # Fix deprecated VMobject methods
+    ("set_stroke_width", r'\.set_stroke_width\(', '.set_stroke(width='),
+    ("set_fill_opacity", r'\.set_fill_opacity\(', '.set_fill(opacity='),
+
+    # Fix deprecated Scene methods
+    ("fixed_in_frame", r'self\.add_fixed_in_frame_mobjects\(', 'self.add_fixed_orientation_mobjects('),
+]
+
+# Render profiles own the output format, so assignments to these config attributes are
+# replaced with pass, even when made inside construct(). They can span lines or assign
+# tuples, so whole statements are found with ast rather than by pattern.
+RENDER_CONFIG_ATTRIBUTES = {"pixel_height", "pixel_width", "frame_rate", "frame_width", "frame_height"}
+_RENDER_CONFIG_TRIGGER = re.compile(r"config(?<!\wconfig)\s*[.\[]")
+
+
+def _compile_rule(pattern: str):
+    """Compile with a leading \\b moved behind the literal it guards.
+
+    A pattern that starts with a literal lets the regex engine jump between
+    occurrences of it; one that starts with \\b is tried at every position,
+    which is about 40 times slower on generated scenes.
+    """
+    match = re.match(r"\\b([A-Za-z_]\w*)", pattern)
+    if match:
+        literal = match.group(1)
+        pattern = f"{literal}(?<!\\w{literal}){pattern[match.end():]}"
+    return re.compile(pattern)
+
+
+# One literal-prefixed regex per rule beats a single alternation, which loses the prefix search
+_TEXT_PATTERNS = [(name, _compile_rule(pattern), replacement) for name, pattern, replacement in TEXT_RULES]
+
+
+# Call rules only look at calls reached from an occurrence of one of their trigger names
+_CALL_TRIGGERS = [_compile_rule(rf"\b{trigger}\b") for trigger in sorted({rule.trigger for rule in CALL_RULES})]
+_AFTER_TRIGGER = re.compile(r"\s*(?:(\()|=(?!=))")
+
+
+def _is_render_config(target) -> bool:
+    """Whether an assignment target only sets RENDER_CONFIG_ATTRIBUTES on config"""
+    if isinstance(target, (ast.Tuple, ast.List)):
+        return bool(target.elts) and all(_is_render_config(element) for element in target.elts)
+    if isinstance(target, ast.Attribute):
+        owner, attribute = target.value, target.attr
+    elif isinstance(target, ast.Subscript) and isinstance(target.slice, ast.Constant):
+        owner, attribute = target.value, target.slice.value
+    else:
+        return False
+    return isinstance(owner, ast.Name) and owner.id == "config" and attribute in RENDER_CONFIG_ATTRIBUTES
+
+
+def _render_config_edits(code: str) -> list:
+    """Edits replacing every assignment to render config attributes with pass"""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        # Left for validation to report; the renderer applies the profile either way
+        return []
+
+    lines = code.split("\n")
+    line_starts = [0]
+    for line in lines:
+        line_starts.append(line_starts[-1] + len(line) + 1)
+
+    def offset(lineno, col):
+        # ast columns count UTF-8 bytes
+        line = lines[lineno - 1]
+        if not line.isascii():
+            col = len(line.encode()[:col].decode(errors="ignore"))
+        return line_starts[lineno - 1] + col
+
+    edits = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign):
+            matches = all(_is_render_config(target) for target in node.targets)
+        elif isinstance(node, (ast.AugAssign, ast.AnnAssign)):
+            matches = _is_render_config(node.target)
+        else:
+            continue
+        if matches:
+            start = offset(node.lineno, node.col_offset)
+            end = offset(node.end_lineno, node.end_col_offset)
+            edits.append((start, end, "pass", "render_config"))
+    return edits
+
+
+def _apply_edits(code: str, edits: list) -> str:
+    """Apply (start, end, replacement, rule) edits; an edit nested in an earlier one is dropped"""
+    kept = []
+    kept_end = -1
+    for edit in sorted(edits, key=lambda edit: (edit[0], -edit[1])):
+        if edit[0] >= kept_end:
+            kept.append(edit)
+            kept_end = edit[1]
+
+    parts = []
+    position = 0
+    for start, end, replacement, _ in kept:
+        parts.append(code[position:start])
+        parts.append(replacement)
+        position = end
+    parts.append(code[position:])
+    _count(edit[3] for edit in kept)
+    return "".join(parts)
+
+
+def apply_rules(code: str) -> str:
+    """Apply every rewrite rule in one pass, leaving strings and comments untouched"""
+    text_matches = [
+        (match.start(), match.end(), replacement, name)
+        for name, pattern, replacement in _TEXT_PATTERNS
+        for match in pattern.finditer(code)
+    ]
+    trigger_matches = [match for pattern in _CALL_TRIGGERS for match in pattern.finditer(code)]
+    sets_config = _RENDER_CONFIG_TRIGGER.search(code) is not None
+    # Fast path: no rule's trigger appears, so there is nothing to tokenize or rewrite
+    if not text_matches and not trigger_matches and not sets_config:
+        return code
+
+    source = _Source(code)
+    edits = [edit for edit in text_matches if not source.in_ignored(edit[0])]
+    if sets_config:
+        edits.extend(_render_config_edits(code))
+
+    # A trigger is either the called name, method(...), or a keyword, f(..., keyword=...)
+    open_parens = set()
+    for match in trigger_matches:
+        if source.in_ignored(match.start()):
+            continue
+        after = _AFTER_TRIGGER.match(code, match.end())
+        if after is None:
+            continue
+        open_parens.add(after.start(1) if after.group(1) else source.enclosing_paren(match.start()))
+
+    for open_paren in sorted(open_parens):
+        call = source.call_at(open_paren)
+        if call is None:
+            continue
+        for rule in CALL_RULES:
+            for start, end, replacement in rule.edits(source, call):
+                edits.append((start, end, replacement, rule.name))
+
+    return _apply_edits(code, edits)
+
+
+def sanitize_manim_code(code: str) -> str:
+    """Sanitize Manim code to fix common issues and deprecated methods"""
+    try:
+        logger.info("Sanitizing Manim code...")
+
+        # Remove deprecated methods and fix common issues
+        code = apply_rules(code)
+
+        # Ensure proper imports
+        if 'from manim import *' not in code:
+            code = 'from manim import *\n' + code
+
+        # Ensure numpy import if used
+        if 'np.' in code and 'import numpy as np' not in code:
+            code = code.replace('from manim import *', 'from manim import *\nimport numpy as np')
+
+        # Validate basic structure
+        if 'class' not in code or 'Scene' not in code:
+            raise ValueError("Code missing required class or Scene inheritance")
+
+        if 'def construct(self):' not in code:
+            raise ValueError("Code missing construct method")
+
+        logger.info("Code sanitization completed successfully")
+        return code
+
+    except Exception as e:
+        logger.error(f"Error sanitizing code: {str(e)}")
+        raise ValueError(f"Code sanitization failed: {str(e)}")
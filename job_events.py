@@ -0,0 +1,50 @@
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class JobEvents:
+    """Fans job record changes out to asyncio subscribers (SSE and WebSocket streams).
+
+    publish() is called from pipeline threads; each subscriber gets the
+    new record on its own event loop's queue, or None once the job is
+    deleted.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._subscribers.setdefault(job_id, []).append((loop, queue))
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        with self._lock:
+            subscribers = [entry for entry in self._subscribers.get(job_id, []) if entry[1] is not queue]
+            if subscribers:
+                self._subscribers[job_id] = subscribers
+            else:
+                self._subscribers.pop(job_id, None)
+
+    def publish(self, job_id: str, job):
+        with self._lock:
+            subscribers = list(self._subscribers.get(job_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, job)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                self.unsubscribe(job_id, queue)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "jobs_watched": len(self._subscribers),
+                "subscribers": sum(len(entries) for entries in self._subscribers.values())
+            }
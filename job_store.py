@@ -0,0 +1,450 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+# Records in these states are written before put()/update() return
+TERMINAL_STATUSES = {"completed", "failed"}
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode()).hexdigest()
+
+
+class JobContext:
+    """State for one job carried through a pipeline run, so stages never look the job up"""
+
+    def __init__(self, job_id: str, prompt: str, gemini_api_key: str = None):
+        self.job_id = job_id
+        self.prompt = prompt
+        self.gemini_api_key = gemini_api_key
+        self.direct_url = None  # Prerendered video to serve instead of rendering
+        self.lineage = job_id  # The original job of a chain of edits; edits reuse its render cache
+        self.profile = None  # Render profile name; None renders with the default profile
+        self.prompt_cache_entry = None  # (model, title) of generated code, cached once it renders
+        self.timings = {}
+
+    @contextmanager
+    def timed(self, stage: str):
+        """Add the time spent in the block to timings[stage], in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = round(self.timings.get(stage, 0.0) + time.perf_counter() - started, 3)
+
+
+class JobStore:
+    """Job records keyed by id, with a bounded LRU cache in front of the backend.
+
+    get() returns a copy, so callers change records through put(), update()
+    and delete() only. update() merges fields into the stored record under
+    the store lock, so concurrent updates to different fields do not lose
+    each other's writes.
+
+    Writes are queued and flushed by a background writer every
+    flush_interval seconds, so several updates to one job in quick
+    succession cost a single backend write. Records reaching a terminal
+    status are flushed before put()/update() returns.
+    """
+
+    def __init__(self, cache_size: int = None, flush_interval: float = None):
+        self.cache_size = cache_size if cache_size is not None else int(os.environ.get("JOB_CACHE_SIZE", "1000"))
+        self.flush_interval = flush_interval if flush_interval is not None else float(os.environ.get("JOB_STORE_FLUSH_INTERVAL", "0.5"))
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+        self.startup_seconds = 0.0  # Time the backend took to open, set by subclasses
+
+        # Latest record per job not yet written; readers check it before the backend
+        self._unflushed = {}
+        self._write_lock = threading.Lock()  # Serializes backend writes and deletes
+        self._updates = 0
+        self._records_written = 0
+        self._flushes = 0
+
+        self._listeners = []
+
+        self._stop = threading.Event()
+        self._writer = threading.Thread(target=self._writer_loop, name="job-store-writer", daemon=True)
+        self._writer.start()
+
+    # Backend interface
+
+    def _read(self, job_id: str):
+        raise NotImplementedError
+
+    def _write_many(self, jobs: dict, durable: bool):
+        """Write {job_id: record} in one batch; durable asks for the data to reach disk"""
+        raise NotImplementedError
+
+    def _remove(self, job_id: str):
+        raise NotImplementedError
+
+    def ids_by_status(self, status: str) -> list:
+        raise NotImplementedError
+
+    def ids_created_before(self, timestamp: float) -> list:
+        raise NotImplementedError
+
+    def latest_by_prompt(self, prompt: str):
+        """Id of the most recent job created for exactly this prompt, or None"""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    # Cached record access
+
+    def _cache_put(self, job_id: str, job: dict):
+        self._cache[job_id] = job
+        self._cache.move_to_end(job_id)
+        if self.cache_size and len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _get_locked(self, job_id: str):
+        job = self._cache.get(job_id)
+        if job is not None:
+            self._cache.move_to_end(job_id)
+            self._hits += 1
+            return job
+        self._misses += 1
+        job = self._unflushed.get(job_id)
+        if job is None:
+            job = self._read(job_id)
+        if job is not None:
+            self._cache_put(job_id, job)
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._get_locked(job_id)
+            return dict(job) if job is not None else None
+
+    def __contains__(self, job_id: str) -> bool:
+        return self.get(job_id) is not None
+
+    def add_listener(self, callback):
+        """Call callback(job_id, record or None when deleted) after every change.
+
+        Callbacks run under the store lock so they see changes in order;
+        they must not block or call back into the store.
+        """
+        self._listeners.append(callback)
+
+    def _notify_locked(self, job_id: str, job):
+        for callback in self._listeners:
+            try:
+                callback(job_id, dict(job) if job is not None else None)
+            except Exception as e:
+                logger.error(f"Job listener failed for {job_id}: {e}")
+
+    def _queue_write_locked(self, job_id: str, job: dict):
+        self._cache_put(job_id, job)
+        self._unflushed[job_id] = job
+        self._updates += 1
+        self._notify_locked(job_id, job)
+
+    def put(self, job_id: str, job: dict):
+        """Replace the whole record"""
+        job = dict(job)
+        with self._lock:
+            self._queue_write_locked(job_id, job)
+        if job.get("status") in TERMINAL_STATUSES:
+            self.flush([job_id])
+
+    def update(self, job_id: str, fields: dict):
+        """Merge fields into an existing record; returns the updated copy, or None if unknown"""
+        with self._lock:
+            job = self._get_locked(job_id)
+            if job is None:
+                logger.warning(f"Update for unknown job {job_id}")
+                return None
+            job = {**job, **fields}
+            self._queue_write_locked(job_id, job)
+        # Flushing takes the write lock, which is never acquired while holding the store lock
+        if job.get("status") in TERMINAL_STATUSES:
+            self.flush([job_id])
+        return dict(job)
+
+    def delete(self, job_id: str):
+        with self._write_lock:
+            with self._lock:
+                self._cache.pop(job_id, None)
+                self._unflushed.pop(job_id, None)
+                self._notify_locked(job_id, None)
+            try:
+                self._remove(job_id)
+            except Exception as e:
+                logger.error(f"Error deleting job {job_id}: {e}")
+
+    def flush(self, job_ids: list = None):
+        """Write queued records now, all of them or only job_ids"""
+        with self._write_lock:
+            with self._lock:
+                if job_ids is None:
+                    batch = dict(self._unflushed)
+                else:
+                    batch = {job_id: self._unflushed[job_id] for job_id in job_ids if job_id in self._unflushed}
+            if not batch:
+                return
+            try:
+                self._write_many(batch, durable=job_ids is not None)
+            except Exception as e:
+                # Records stay queued and are retried on the next flush
+                logger.error(f"Error saving {len(batch)} job(s): {e}")
+                return
+            with self._lock:
+                for job_id, job in batch.items():
+                    # A newer update that arrived during the write stays queued
+                    if self._unflushed.get(job_id) is job:
+                        del self._unflushed[job_id]
+                self._records_written += len(batch)
+                self._flushes += 1
+
+    def _writer_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def _merge_unflushed(self, job_ids: list, matches) -> list:
+        """Correct backend query results for records still queued for the writer"""
+        with self._lock:
+            queued = dict(self._unflushed)
+        merged = [job_id for job_id in job_ids if job_id not in queued or matches(queued[job_id])]
+        seen = set(merged)
+        merged.extend(job_id for job_id, job in queued.items() if job_id not in seen and matches(job))
+        return merged
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "backend": type(self).__name__,
+                "jobs": self.count(),
+                "cached": len(self._cache),
+                "cache_hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+                "startup_seconds": round(self.startup_seconds, 4),
+                "queued_writes": len(self._unflushed),
+                "updates": self._updates,
+                "records_written": self._records_written,
+                "flushes": self._flushes
+            }
+
+    def close(self):
+        self._stop.set()
+        self._writer.join(timeout=5)
+        self.flush()
+
+
+class SQLiteJobStore(JobStore):
+    """Jobs in one SQLite database (WAL) with indexes on status, created_at and prompt hash.
+
+    On first use, records from the legacy one-JSON-file-per-job directory
+    are imported so existing job ids keep resolving.
+    """
+
+    def __init__(self, db_path: Path, legacy_dir: Path = None, cache_size: int = None, flush_interval: float = None):
+        super().__init__(cache_size, flush_interval)
+        started = time.perf_counter()
+        # Reads and the writer thread use separate connections; WAL lets them run concurrently
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT,
+                created_at REAL,
+                prompt_hash TEXT,
+                data TEXT NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_prompt_hash ON jobs (prompt_hash, created_at)")
+        self._db.commit()
+
+        self._write_db = sqlite3.connect(str(db_path), check_same_thread=False)
+        # A commit survives a process crash without an fsync per transaction;
+        # _write_many switches to FULL for durable batches
+        self._write_db.execute("PRAGMA synchronous=NORMAL")
+
+        if legacy_dir is not None:
+            self._import_legacy(Path(legacy_dir))
+        self.startup_seconds = time.perf_counter() - started
+
+    @staticmethod
+    def _row(job_id: str, job: dict) -> tuple:
+        prompt = job.get("prompt")
+        return (
+            job_id,
+            job.get("status"),
+            job.get("created_at"),
+            prompt_hash(prompt) if prompt else None,
+            json.dumps(job)
+        )
+
+    def _import_legacy(self, legacy_dir: Path):
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM jobs LIMIT 1").fetchone():
+                return
+        rows = []
+        for job_file in legacy_dir.glob("*.json"):
+            try:
+                with open(job_file, "r") as f:
+                    rows.append(self._row(job_file.stem, json.load(f)))
+            except Exception as e:
+                logger.error(f"Error importing job file {job_file}: {e}")
+        if rows:
+            with self._write_lock:
+                self._write_db.executemany("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?)", rows)
+                self._write_db.commit()
+            logger.info(f"Imported {len(rows)} jobs from {legacy_dir}")
+
+    def _read(self, job_id):
+        row = self._db.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write_many(self, jobs, durable):
+        # One transaction per batch. Under synchronous=NORMAL a WAL commit can be lost
+        # on power failure, so durable batches (terminal states) fsync on commit.
+        if durable:
+            self._write_db.execute("PRAGMA synchronous=FULL")
+        try:
+            with self._write_db:
+                self._write_db.executemany(
+                    "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?)",
+                    [self._row(job_id, job) for job_id, job in jobs.items()]
+                )
+        finally:
+            if durable:
+                self._write_db.execute("PRAGMA synchronous=NORMAL")
+
+    def _remove(self, job_id):
+        with self._write_db:
+            self._write_db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def ids_by_status(self, status):
+        with self._lock:
+            job_ids = [row[0] for row in self._db.execute("SELECT id FROM jobs WHERE status = ?", (status,))]
+        return self._merge_unflushed(job_ids, lambda job: job.get("status") == status)
+
+    def ids_created_before(self, timestamp):
+        with self._lock:
+            job_ids = [row[0] for row in self._db.execute("SELECT id FROM jobs WHERE created_at < ?", (timestamp,))]
+        return self._merge_unflushed(job_ids, lambda job: job.get("created_at", timestamp) < timestamp)
+
+    def latest_by_prompt(self, prompt):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, created_at FROM jobs WHERE prompt_hash = ? ORDER BY created_at DESC LIMIT 1",
+                (prompt_hash(prompt),)
+            ).fetchone()
+            candidates = [(job.get("created_at", 0), job_id) for job_id, job in self._unflushed.items() if job.get("prompt") == prompt]
+        if row:
+            candidates.append((row[1] or 0, row[0]))
+        return max(candidates)[1] if candidates else None
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def close(self):
+        super().close()
+        with self._write_lock:
+            self._write_db.close()
+        with self._lock:
+            self._db.close()
+
+
+class FileJobStore(JobStore):
+    """Legacy layout: one JSON file per job.
+
+    Startup only lists the directory to build an id index; records are read
+    when first requested and kept in the LRU cache. Lookups by status,
+    creation time or prompt read every file, so they belong off the request
+    path (cleanup) or on the SQLite backend.
+    """
+
+    def __init__(self, job_dir: Path, cache_size: int = None, flush_interval: float = None):
+        super().__init__(cache_size, flush_interval)
+        started = time.perf_counter()
+        self.job_dir = Path(job_dir)
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+        self._ids = set()
+        with os.scandir(self.job_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json"):
+                    self._ids.add(entry.name[:-5])
+                elif entry.name.endswith(".json.tmp"):
+                    # Left over from a write interrupted before its rename
+                    os.unlink(entry.path)
+        self.startup_seconds = time.perf_counter() - started
+        logger.info(f"Indexed {len(self._ids)} job files in {self.startup_seconds * 1000:.1f}ms")
+
+    def _read(self, job_id):
+        if job_id not in self._ids:
+            return None
+        try:
+            with open(self.job_dir / f"{job_id}.json", "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            self._ids.discard(job_id)
+            return None
+
+    def _write_many(self, jobs, durable):
+        for job_id, job in jobs.items():
+            # Write a temp file and rename it over the old one so readers never see a partial file
+            job_file = self.job_dir / f"{job_id}.json"
+            temp_file = self.job_dir / f"{job_id}.json.tmp"
+            with open(temp_file, "w") as f:
+                json.dump(job, f)
+                if durable:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_file, job_file)
+            with self._lock:
+                self._ids.add(job_id)
+
+    def _remove(self, job_id):
+        self._ids.discard(job_id)
+        (self.job_dir / f"{job_id}.json").unlink(missing_ok=True)
+
+    def _scan(self):
+        """Yield (id, record) for every job without filling the cache"""
+        with self._lock:
+            job_ids = list(self._ids | self._unflushed.keys())
+        for job_id in job_ids:
+            with self._lock:
+                job = self._cache.get(job_id) or self._unflushed.get(job_id)
+                if job is None:
+                    try:
+                        job = self._read(job_id)
+                    except Exception as e:
+                        logger.error(f"Error loading job file {job_id}.json: {e}")
+                        continue
+            if job is not None:
+                yield job_id, job
+
+    def ids_by_status(self, status):
+        return [job_id for job_id, job in self._scan() if job.get("status") == status]
+
+    def ids_created_before(self, timestamp):
+        return [job_id for job_id, job in self._scan() if job.get("created_at", timestamp) < timestamp]
+
+    def latest_by_prompt(self, prompt):
+        matches = [(job.get("created_at", 0), job_id) for job_id, job in self._scan() if job.get("prompt") == prompt]
+        return max(matches)[1] if matches else None
+
+    def count(self):
+        with self._lock:
+            return len(self._ids)
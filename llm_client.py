@@ -0,0 +1,233 @@
+import asyncio
+import concurrent.futures
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import google.genai as genai
+from anthropic import AsyncAnthropic
+
+logger = logging.getLogger(__name__)
+
+
+class StreamRejected(Exception):
+    """Raised by a stream check to abandon a response that cannot become valid code"""
+
+
+class LLMClients:
+    """Async Gemini and Anthropic clients shared by every request.
+
+    Clients live on one dedicated event loop so their HTTP connection pools
+    are reused across jobs. Gemini clients are cached per API key (including
+    BYOK keys) and each provider has a bounded number of in-flight calls.
+    """
+
+    def __init__(self, anthropic_api_key: str = None, max_gemini_clients: int = None):
+        self.max_gemini_clients = max_gemini_clients or int(os.environ.get("LLM_MAX_GEMINI_CLIENTS", "32"))
+        self.timeout = float(os.environ.get("LLM_TIMEOUT", "120"))
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client-loop", daemon=True)
+        self._thread.start()
+
+        self._gemini_clients = OrderedDict()
+        self._gemini_lock = threading.Lock()
+        self._gemini_limit = asyncio.Semaphore(int(os.environ.get("LLM_GEMINI_CONCURRENCY", "8")))
+        self._anthropic_limit = asyncio.Semaphore(int(os.environ.get("LLM_ANTHROPIC_CONCURRENCY", "8")))
+
+        self._anthropic = AsyncAnthropic(api_key=anthropic_api_key) if anthropic_api_key else None
+
+        # "off" tries models strictly in order, "delay" also starts the next
+        # model once the current one has run for hedge_delay seconds, and
+        # "parallel" starts every model at once
+        self.hedge_mode = os.environ.get("LLM_HEDGE_MODE", "delay")
+        self.hedge_delay = float(os.environ.get("LLM_HEDGE_DELAY", "10"))
+
+        self._model_stats = {}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def has_anthropic(self) -> bool:
+        return self._anthropic is not None
+
+    def run(self, coro, timeout: float = None):
+        """Run a coroutine on the client loop from a worker thread and wait for it"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(timeout or self.timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"LLM call timed out after {timeout or self.timeout:g} seconds")
+
+    def _gemini_client(self, api_key: str):
+        # Index by a digest so BYOK keys are not kept around as dict keys
+        key_id = hashlib.sha256(api_key.encode()).hexdigest()
+        with self._gemini_lock:
+            client = self._gemini_clients.get(key_id)
+            if client is not None:
+                self._gemini_clients.move_to_end(key_id)
+                return client
+            client = genai.Client(api_key=api_key)
+            self._gemini_clients[key_id] = client
+            if len(self._gemini_clients) > self.max_gemini_clients:
+                self._gemini_clients.popitem(last=False)
+            return client
+
+    async def gemini_generate(self, api_key: str, model: str, prompt: str, check=None) -> str:
+        """Stream a Gemini response; check(text_so_far) may raise StreamRejected to stop early"""
+        client = self._gemini_client(api_key)
+        text = ""
+        async with self._gemini_limit:
+            stream = await client.aio.models.generate_content_stream(
+                model=model,
+                contents=[
+                    {'role': 'user', 'parts': [{'text': prompt}]}
+                ]
+            )
+            try:
+                async for chunk in stream:
+                    if chunk.text:
+                        text += chunk.text
+                        if check:
+                            check(text)
+            finally:
+                aclose = getattr(stream, "aclose", None)
+                if aclose:
+                    await aclose()
+        return text or None
+
+    async def anthropic_generate(self, model: str, system: str, prompt: str, max_tokens: int = 2000, temperature: float = 0.1, check=None) -> str:
+        """Stream a Claude response; check(text_so_far) may raise StreamRejected to stop early"""
+        if not self._anthropic:
+            return None
+        text = ""
+        async with self._anthropic_limit:
+            async with self._anthropic.messages.stream(
+                model=model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                system=system,
+                messages=[{"role": "user", "content": prompt}]
+            ) as stream:
+                async for delta in stream.text_stream:
+                    text += delta
+                    if check:
+                        check(text)
+        return text or None
+
+    def _hedge_delay(self):
+        if self.hedge_mode == "parallel":
+            return 0
+        if self.hedge_mode == "delay":
+            return self.hedge_delay
+        return None
+
+    def _record(self, model: str, outcome: str, latency: float):
+        with self._stats_lock:
+            stats = self._model_stats.setdefault(model, {"wins": 0, "rejected": 0, "errors": 0, "cancelled": 0, "latency_total": 0.0})
+            stats[outcome] += 1
+            if outcome != "cancelled":
+                stats["latency_total"] += latency
+
+    async def first_valid(self, attempts: list, accept):
+        """Run (model, coroutine factory) attempts under the hedging policy.
+
+        accept(model, text) returns the parsed result, or None to reject the
+        response. Returns (model, result) for the first accepted response and
+        cancels the attempts still running, or None if every attempt fails.
+        """
+        hedge_delay = self._hedge_delay()
+        running = {}
+        next_attempt = 0
+
+        def launch():
+            nonlocal next_attempt
+            model, factory = attempts[next_attempt]
+            next_attempt += 1
+            task = asyncio.ensure_future(asyncio.wait_for(factory(), self.timeout))
+            running[task] = (model, time.monotonic())
+            logger.info(f"Started LLM attempt with {model}")
+
+        try:
+            while running or next_attempt < len(attempts):
+                if not running:
+                    launch()
+                    continue
+
+                wait_for_next = hedge_delay if next_attempt < len(attempts) else None
+                done, _ = await asyncio.wait(running, timeout=wait_for_next, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # The current attempts are slow, hedge with the next model
+                    launch()
+                    continue
+
+                failed = False
+                for task in done:
+                    model, started = running.pop(task)
+                    latency = time.monotonic() - started
+                    try:
+                        text = task.result()
+                    except StreamRejected as e:
+                        logger.warning(f"Aborted {model} after {latency:.1f}s: {e}")
+                        self._record(model, "rejected", latency)
+                        failed = True
+                        continue
+                    except Exception as e:
+                        logger.error(f"Error with {model}: {str(e)}")
+                        self._record(model, "errors", latency)
+                        failed = True
+                        continue
+
+                    result = accept(model, text) if text else None
+                    if result is None:
+                        logger.warning(f"{model} returned unusable code after {latency:.1f}s")
+                        self._record(model, "rejected", latency)
+                        failed = True
+                        continue
+
+                    logger.info(f"{model} won after {latency:.1f}s")
+                    self._record(model, "wins", latency)
+                    return model, result
+
+                # Fall back to the next model straight away rather than waiting out the hedge delay
+                if failed and running and next_attempt < len(attempts):
+                    launch()
+            return None
+        finally:
+            for task, (model, started) in running.items():
+                task.cancel()
+                self._record(model, "cancelled", time.monotonic() - started)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            models = {}
+            for model, stats in self._model_stats.items():
+                finished = stats["wins"] + stats["rejected"] + stats["errors"]
+                started = finished + stats["cancelled"]
+                models[model] = {
+                    "wins": stats["wins"],
+                    "rejected": stats["rejected"],
+                    "errors": stats["errors"],
+                    "cancelled": stats["cancelled"],
+                    "win_rate": round(stats["wins"] / started, 3) if started else 0.0,
+                    "avg_latency": round(stats["latency_total"] / finished, 2) if finished else 0.0
+                }
+            return {
+                "hedge_mode": self.hedge_mode,
+                "hedge_delay": self.hedge_delay,
+                "models": models
+            }
+
+    def close(self):
+        async def _close():
+            if self._anthropic:
+                await self._anthropic.close()
+
+        try:
+            self.run(_close(), timeout=5)
+        except Exception as e:
+            logger.warning(f"Error closing LLM clients: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
@@ -1,26 +1,46 @@
 from dotenv import load_dotenv
 load_dotenv()
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse, RedirectResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse, StreamingResponse
 from pydantic import BaseModel
-from s3_storage import S3Storage
-
-from anthropic import Anthropic
-import google.genai as genai
+from storage_service import ObjectIndex, StorageService, UploadQueue, content_key
+from render_scheduler import RenderScheduler, QueueFullError, PRIORITY_LOW
+from render_workers import WarmRenderPool
+from render_cache import PartialMovieCache, RenderCache
+from render_profiles import RENDER_PROFILES, get_profile
+from tex_cache import TexCache
+from prompt_cache import PromptCache
+from job_store import FileJobStore, JobContext, SQLiteJobStore, TERMINAL_STATUSES
+from job_events import JobEvents
+from media_index import MediaIndex, file_sha256
+from scratch_space import ScratchSpace
+from scene_validator import validate_scene_code
+from code_sanitizer import sanitize_manim_code, rule_stats
+from render_progress import RenderProgress, count_animations
+
+from llm_client import LLMClients, StreamRejected
+import asyncio
+import codecs
+import codeop
+import functools
+import json
 import os
 import subprocess
+import textwrap
 import uuid
 import logging
 import signal
 from pathlib import Path
 import shutil
 import time
-import json
 import sys
 import re
-import hashlib
+import threading
+
+IMPORT_STARTED = time.perf_counter()
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -47,6 +67,9 @@ CODE_DIR = BASE_DIR / "code"
 MEDIA_DIR = BASE_DIR / "media"
 JOB_DIR = BASE_DIR / "jobs"
 LOG_DIR = BASE_DIR / "logs"
+RENDER_CACHE_DIR = BASE_DIR / "render_cache"
+PARTIAL_CACHE_DIR = BASE_DIR / "partial_cache"
+TEX_CACHE_DIR = BASE_DIR / "tex_cache"
 
 CODE_DIR.mkdir(parents=True, exist_ok=True)
 MEDIA_DIR.mkdir(parents=True, exist_ok=True)
@@ -59,41 +82,130 @@ logger.addHandler(file_handler)
 
 app.mount("/media", StaticFiles(directory=MEDIA_DIR), name="media")
 
-# Initialize S3 storage for cloud deployment
-s3_storage = S3Storage()
+# Bytes that live render directories and not yet uploaded videos may use together (0 disables)
+RENDER_DISK_QUOTA = int(os.environ.get("RENDER_DISK_QUOTA", str(10 * 1024 ** 3)))
+
+# Manim partial movie files kept per video lineage so edits only re-render changed animations
+RENDER_INCREMENTAL = os.environ.get("RENDER_INCREMENTAL", "1") == "1"
+PARTIAL_CACHE_MAX_FILES = int(os.environ.get("PARTIAL_CACHE_MAX_FILES", "100"))
+
+STATUS_STREAM_HEARTBEAT = 15  # Seconds between keep-alives on idle streams
+STATUS_STREAM_QUEUE_INTERVAL = 2  # Seconds between queue position refreshes while queued
+
+# Stateful services, created by create_services() in the startup hook rather than at
+# import. Launched as `python main.py`, every spawned process (uvicorn's reloader and
+# each warm render worker) re-runs this file as __mp_main__, and must not open the
+# stores, start threads or touch other renders' files.
+storage = None
+upload_queue = None
+object_index = None
+media_index = None
+scratch_space = None
+generation_scheduler = None
+render_scheduler = None
+render_pool = None
+render_cache = None
+partial_cache = None
+tex_cache = None
+prompt_cache = None
+job_store = None
+job_events = None
+llm_clients = None
+
+def create_services():
+    global storage, upload_queue, object_index, media_index, scratch_space, generation_scheduler, render_scheduler, render_pool
+    global render_cache, partial_cache, tex_cache, prompt_cache, job_store, job_events, llm_clients
+
+    # One pooled storage client for every upload; STORAGE_BACKEND=local serves objects from disk
+    storage = StorageService()
+
+    # Debug logging for S3 storage initialization status only
+    logger.info(f"Storage initialized: {storage.is_enabled} (backend: {storage.backend})")
+    if storage.is_enabled:
+        logger.info(f"Storage bucket configured: {storage.bucket_name}")
+        if storage.backend == "local":
+            storage.local_dir.mkdir(parents=True, exist_ok=True)
+            app.mount("/storage", StaticFiles(directory=storage.local_dir / storage.bucket_name, check_dir=False), name="storage")
+    else:
+        logger.info("S3 storage not initialized, using local storage only")
 
-# Debug logging for S3 storage initialization status only
-logger.info(f"S3 storage initialized: {s3_storage.is_enabled}")
-if s3_storage.is_enabled:
-    logger.info(f"S3 bucket configured: {s3_storage.bucket_name}")
-else:
-    logger.info("S3 storage not initialized, using local storage only")
-    
+    # Uploads run here, so render slots are released as soon as a video is rendered
+    upload_queue = UploadQueue()
 
+    # Uploaded objects are keyed by content hash; this maps them back to prompts and jobs
+    object_index = ObjectIndex(BASE_DIR / "objects.db")
 
-try:
-    # Initialize Gemini client with global API key (for fallback)
-    gemini_api_key = os.environ.get("GEMINI_API_KEY")
-    if gemini_api_key:
-        gemini_client = genai.Client(api_key=gemini_api_key)
-        logger.info("Gemini client initialized successfully with new SDK")
+    # Local rendered files per job, so media lookups never glob MEDIA_DIR
+    media_index = MediaIndex(BASE_DIR / "media.db")
+
+    # One private directory per render; set RENDER_SCRATCH_DIR to a tmpfs mount (e.g. /dev/shm) to keep it in memory
+    scratch_space = ScratchSpace(os.environ.get("RENDER_SCRATCH_DIR") or BASE_DIR / "scratch")
+
+    # LLM code generation runs on its own slots, so slow model calls never hold a render slot.
+    # The default matches the per-provider concurrency limit of the LLM clients; the other
+    # settings come from GENERATION_QUEUE_MAX, GENERATION_QUEUE_MAX_COST and GENERATION_PRIORITY_AGING
+    generation_scheduler = RenderScheduler(
+        slots=int(os.environ.get("GENERATION_SLOTS", "8")),
+        name="generation"
+    )
+
+    # Bounded pool of render slots; jobs are queued here once their code is ready.
+    # Queued renders wait while the disk quota is used up
+    render_scheduler = RenderScheduler(has_room=has_disk_room)
+
+    # Pre-started Manim processes, one per render slot by default (0 disables)
+    render_pool = WarmRenderPool(size=int(os.environ.get("RENDER_WARM_WORKERS", render_scheduler.slots)))
+
+    # Rendered videos keyed on sanitized code plus render settings
+    render_cache = RenderCache(RENDER_CACHE_DIR)
+
+    partial_cache = PartialMovieCache(PARTIAL_CACHE_DIR)
+
+    # Compiled LaTeX shared by every render, so repeated formulas compile once per node
+    tex_cache = TexCache(TEX_CACHE_DIR)
+
+    # Generated code for previously seen prompts
+    prompt_cache = PromptCache(BASE_DIR / "prompt_cache.db")
+
+    # Job records; JOB_STORE=files keeps the legacy one JSON file per job layout
+    if os.environ.get("JOB_STORE", "sqlite") == "files":
+        job_store = FileJobStore(JOB_DIR)
+    else:
+        job_store = SQLiteJobStore(BASE_DIR / "jobs.db", legacy_dir=JOB_DIR)
+
+    # Pushes job changes to /status/{id}/stream and /ws/status/{id} subscribers
+    job_events = JobEvents()
+    job_store.add_listener(job_events.publish)
+
+    # Shared async LLM clients; Gemini clients are created per API key on demand
+    llm_clients = LLMClients(anthropic_api_key=os.environ.get("ANTHROPIC_API_KEY"))
+    if os.environ.get("GEMINI_API_KEY"):
+        logger.info("Global Gemini API key configured")
     else:
-        gemini_client = None
         logger.warning("No global Gemini API key found")
-    
-    # Initialize Anthropic client
-    anthropic_api_key = os.environ.get("ANTHROPIC_API_KEY")
-    if anthropic_api_key:
-        anthropic_client = Anthropic(api_key=anthropic_api_key)
+    if llm_clients.has_anthropic:
         logger.info("Anthropic client initialized successfully")
     else:
         logger.warning("No Anthropic API key found")
-        anthropic_client = None
-        
-except Exception as e:
-    logger.error(f"Error initializing LLM clients: {e}")
-    anthropic_client = None
-    gemini_client = None
+
+def render_disk_usage() -> int:
+    # Published local videos are not counted: with storage disabled they are the final copies
+    return scratch_space.usage() + upload_queue.pending_bytes()
+
+def has_disk_room() -> bool:
+    return not RENDER_DISK_QUOTA or render_disk_usage() < RENDER_DISK_QUOTA
+
+ANTHROPIC_MODEL = "claude-3-5-haiku-20241022"
+
+# Prerendered video served when no LLM can generate code
+API_ERROR_VIDEO_URL = "https://manim-ai-videos.s3.amazonaws.com/videos/9f13cd36-1399-4ffe-af16-a2f1f9bdbdf7.mp4"
+
+# Failed renders are sent back to the editing model with their traceback (0 attempts disables)
+RENDER_REPAIR_ATTEMPTS = int(os.environ.get("RENDER_REPAIR_ATTEMPTS", "2"))
+RENDER_REPAIR_BUDGET = float(os.environ.get("RENDER_REPAIR_BUDGET", "240"))  # Seconds for all repairs of one job
+RENDER_REPAIR_TRACEBACK_CHARS = 4000
+repair_stats = {"jobs": 0, "attempts": 0, "repaired": 0, "failed": 0}
+repair_stats_lock = threading.Lock()
 
 DEV_MODE = os.environ.get("DEV_MODE", "0") == "1"
 if DEV_MODE:
@@ -102,17 +214,28 @@ if DEV_MODE:
 class PromptRequest(BaseModel):
     prompt: str
     gemini_api_key: str = None  # BYOK support for Gemini
+    use_cache: bool = True  # Set to False to always call the LLM
+    preview: bool = False  # Publish a quick 480p15 render before the full-quality one
+    profile: str = None  # Render profile: preview, standard, hd or social-vertical
 
 class ManimGenerationResponse(BaseModel):
     id: str
     status: str
     video_url: str = None
+    preview_url: str = None  # Draft render, set before video_url when preview was requested
     title: str = None
     code: str = None
     previous_video_url: str = None
     previous_video_id: str = None
     error: str = None
     error_type: str = None
+    queue_position: int = None
+    validation_errors: list = None
+    repair_attempts: int = None
+    profile: str = None
+    stage: str = None  # queued, generating, sanitizing, rendering, repairing, uploading, completed, failed
+    progress: float = None  # Render progress in percent, when known
+    render_progress: dict = None  # {"animation", "animations", "frame", "frames", "percent"}
 
 class EditRequest(BaseModel):
     code: str
@@ -120,32 +243,21 @@ class EditRequest(BaseModel):
     previous_video_url: str = None
     previous_video_id: str = None
     gemini_api_key: str = None
-
-generation_jobs = {}
-
-def load_jobs():
-    try:
-        job_files = list(JOB_DIR.glob("*.json"))
-        for job_file in job_files:
-            try:
-                with open(job_file, "r") as f:
-                    job_data = json.load(f)
-                    job_id = job_file.stem
-                    generation_jobs[job_id] = job_data
-                    logger.info(f"Loaded job {job_id} from disk")
-            except Exception as e:
-                logger.error(f"Error loading job file {job_file}: {e}")
-    except Exception as e:
-        logger.error(f"Error loading jobs: {e}")
-
-def save_job(job_id, job_data):
-    try:
-        job_file = JOB_DIR / f"{job_id}.json"
-        with open(job_file, "w") as f:
-            json.dump(job_data, f)
-        logger.info(f"Saved job {job_id} to disk")
-    except Exception as e:
-        logger.error(f"Error saving job {job_id}: {e}")
+    preview: bool = False
+    profile: str = None
+
+def queue_full_response(job_id: str, retry_after: int):
+    logger.warning(f"Render queue full, rejecting job {job_id} (retry after {retry_after}s)")
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": str(retry_after)},
+        content={
+            "detail": "Render queue is full. Please try again later.",
+            "id": job_id,
+            "status": "rejected",
+            "retry_after": retry_after
+        }
+    )
 
 def categorize_error(error_message: str) -> tuple[str, str]:
     """Categorize errors and return user-friendly messages"""
@@ -178,96 +290,49 @@ def categorize_error(error_message: str) -> tuple[str, str]:
     else:
         return "UNKNOWN_ERROR", "An unexpected error occurred. Please try again or contact support."
 
-def sanitize_filename(prompt: str) -> str:
-    """Convert prompt to a safe filename for S3 upload"""
-    # Remove special characters and replace spaces with underscores
-    sanitized = re.sub(r'[^a-zA-Z0-9\s\-_]', '', prompt)
-    sanitized = re.sub(r'\s+', '_', sanitized)
-    sanitized = sanitized.strip('_')
-    
-    # Limit length and add hash for uniqueness
-    if len(sanitized) > 50:
-        sanitized = sanitized[:50]
-    
-    # Add hash for uniqueness
-    prompt_hash = hashlib.md5(prompt.encode()).hexdigest()[:8]
-    return f"{sanitized}_{prompt_hash}"
-def sanitize_manim_code(code: str) -> str:
-    """Sanitize Manim code to fix common issues and deprecated methods"""
-    try:
-        logger.info("Sanitizing Manim code...")
-        
-        # Remove deprecated methods and fix common issues
-        fixes = [
-            # Fix deprecated shorten_ends method
-            (r'\.shorten_ends\([^)]*\)', ''),
-            (r'shorten_ends\s*=\s*[^,)]+[,)]?', ''),
-            
-            # Fix deprecated Line methods
-            (r'Line\.set_length\(', 'Line(ORIGIN, RIGHT).scale('),
-            
-            # Fix deprecated NumberPlane methods  
-            (r'NumberPlane\([^)]*background_line_style[^)]*\)', 'NumberPlane()'),
-            
-            # Fix deprecated Axes methods
-            (r'\.add_coordinates\(\)', '.add_coordinate_labels()'),
-            (r'axes\.plot\([^,]+,\s*label\s*=\s*[^,)]+', lambda m: m.group(0).split(',')[0]),
-            
-            # Fix deprecated positioning methods
-            (r'\.next_to_point\(', '.next_to('),
-            (r'\.shift_onto_screen\(\)', '.to_edge()'),
-            
-            # Fix deprecated animation methods
-            (r'ShowCreation\(', 'Create('),
-            (r'DrawBorderThenFill\(', 'DrawBorderThenFill('),
-            
-            # Fix deprecated color constants
-            (r'\bAVERAGE_COLOR\b', 'BLUE'),
-            (r'\bCOLOR_MAP\b', 'BLUE'),
-            
-            # Fix deprecated VMobject methods
-            (r'\.set_stroke_width\(', '.set_stroke(width='),
-            (r'\.set_fill_opacity\(', '.set_fill(opacity='),
-            
-            # Fix deprecated Scene methods
-            (r'self\.camera\.frame\.', 'self.camera.frame.'),
-            (r'self\.add_fixed_in_frame_mobjects\(', 'self.add_fixed_orientation_mobjects('),
-        ]
-        
-        # Apply all fixes
-        for pattern, replacement in fixes:
-            if callable(replacement):
-                code = re.sub(pattern, replacement, code)
-            else:
-                code = re.sub(pattern, replacement, code)
-        
-        # Ensure proper imports
-        if 'from manim import *' not in code:
-            code = 'from manim import *\n' + code
-            
-        # Ensure numpy import if used
-        if 'np.' in code and 'import numpy as np' not in code:
-            code = code.replace('from manim import *', 'from manim import *\nimport numpy as np')
-        
-        # Validate basic structure
-        if 'class' not in code or 'Scene' not in code:
-            raise ValueError("Code missing required class or Scene inheritance")
-            
-        if 'def construct(self):' not in code:
-            raise ValueError("Code missing construct method")
-        
-        logger.info("Code sanitization completed successfully")
-        return code
-        
-    except Exception as e:
-        logger.error(f"Error sanitizing code: {str(e)}")
-        raise ValueError(f"Code sanitization failed: {str(e)}")
+def queued_render_cost(profile, preview: bool = False) -> float:
+    """Scheduler cost of a job's first render; preview jobs queue their full render separately"""
+    return RENDER_PROFILES["preview"].cost if preview else profile.cost
+
+def check_scene_code(job_id: str, code: str):
+    """Reject code that cannot render before it takes up a render slot"""
+    started = time.perf_counter()
+    errors = validate_scene_code(code)
+    logger.info(f"Static validation for job {job_id} took {(time.perf_counter() - started) * 1000:.1f}ms")
+    if errors:
+        logger.error(f"Static validation failed for job {job_id}: {errors}")
+        job_store.update(job_id, {"validation_errors": errors})
+        # Keep user content out of the message so categorize_error sees a code error
+        raise ValueError(f"Invalid code: {errors[0]['type']} at line {errors[0]['line']}")
 
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to MANIM API"}
 
+@app.get("/metrics")
+def get_metrics():
+    return {
+        "generation_scheduler": generation_scheduler.stats(),
+        "render_scheduler": render_scheduler.stats(),
+        "render_pool": render_pool.stats(),
+        "render_cache": render_cache.stats(),
+        "partial_cache": partial_cache.stats(),
+        "tex_cache": tex_cache.stats(),
+        "storage": storage.stats(),
+        "upload_queue": upload_queue.stats(),
+        "objects": object_index.stats(),
+        "media": media_index.stats(),
+        "scratch": scratch_space.stats(),
+        "disk": {"used_bytes": render_disk_usage(), "quota_bytes": RENDER_DISK_QUOTA},
+        "prompt_cache": prompt_cache.stats(),
+        "llm": llm_clients.stats(),
+        "sanitizer_rules": rule_stats(),
+        "render_repair": get_repair_stats(),
+        "job_store": job_store.stats(),
+        "status_streams": job_events.stats()
+    }
+
 @app.get("/test-s3-upload")
 def test_s3_upload():
     try:
@@ -276,13 +341,13 @@ def test_s3_upload():
             f.write("This is a test file for S3 upload")
             
         logger.info(f"Created test file at {test_file_path}")
-        logger.info(f"S3 storage enabled: {s3_storage.is_enabled}")
-        logger.info(f"S3 bucket name: {s3_storage.bucket_name}")
+        logger.info(f"S3 storage enabled: {storage.is_enabled}")
+        logger.info(f"S3 bucket name: {storage.bucket_name}")
         
-        if s3_storage.is_enabled:
+        if storage.is_enabled:
             s3_key = "test/test_upload.txt"
             logger.info(f"Attempting to upload test file to S3 with key: {s3_key}")
-            s3_url = s3_storage.upload_file(str(test_file_path), s3_key)
+            s3_url = storage.upload_file(str(test_file_path), s3_key, content_type="text/plain")
             
             if s3_url:
                 return {"success": True, "message": "S3 upload successful", "url": s3_url}
@@ -295,28 +360,44 @@ def test_s3_upload():
         return {"success": False, "message": f"Error: {str(e)}"}
 
 @app.post("/generate", response_model=ManimGenerationResponse)
-async def generate_animation(request: PromptRequest, background_tasks: BackgroundTasks):
+async def generate_animation(request: PromptRequest):
+    try:
+        profile = get_profile(request.profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     job_id = str(uuid.uuid4())
     job_data = {
-        "status": "processing",
+        "status": "queued",
+        "stage": "queued",
         "created_at": time.time(),
         "prompt": request.prompt,
+        "profile": profile.name,
         "gemini_api_key": request.gemini_api_key  # Store BYOK key
     }
-    generation_jobs[job_id] = job_data
-    save_job(job_id, job_data)
+    job_store.put(job_id, job_data)
 
     try:
-        background_tasks.add_task(
+        # Admission is decided by the render queue, although the job first waits for generation
+        render_scheduler.check_capacity(queued_render_cost(profile, request.preview))
+        generation_scheduler.submit(
+            job_id,
             process_animation_request, 
             job_id=job_id, 
             prompt=request.prompt,
-            gemini_api_key=request.gemini_api_key
+            gemini_api_key=request.gemini_api_key,
+            use_cache=request.use_cache,
+            preview=request.preview,
+            profile=profile.name
         )
         return ManimGenerationResponse(
             id=job_id,
-            status="processing"
+            status="queued",
+            queue_position=generation_scheduler.queue_position(job_id)
         )
+    except QueueFullError as e:
+        job_store.delete(job_id)
+        return queue_full_response(job_id, e.retry_after)
     except Exception as e:
         error_message = f"Failed to start animation task: {str(e)}"
         logger.error(error_message)
@@ -325,6 +406,7 @@ async def generate_animation(request: PromptRequest, background_tasks: Backgroun
         
         job_data = {
             "status": "failed",
+            "stage": "failed",
             "created_at": time.time(),
             "prompt": request.prompt,
             "error": user_message,
@@ -332,8 +414,7 @@ async def generate_animation(request: PromptRequest, background_tasks: Backgroun
             "gemini_api_key": request.gemini_api_key
         }
         
-        generation_jobs[job_id] = job_data
-        save_job(job_id, job_data)
+        job_store.put(job_id, job_data)
         
         return ManimGenerationResponse(
             id=job_id,
@@ -343,34 +424,49 @@ async def generate_animation(request: PromptRequest, background_tasks: Backgroun
         )
 
 @app.post("/edit", response_model=ManimGenerationResponse)
-async def edit_animation(request: EditRequest, background_tasks: BackgroundTasks):
+async def edit_animation(request: EditRequest):
+    try:
+        profile = get_profile(request.profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     job_id = str(uuid.uuid4())
     job_data = {
-        "status": "processing",
+        "status": "queued",
+        "stage": "queued",
         "created_at": time.time(),
         "edit_prompt": request.prompt,
+        "profile": profile.name,
         "original_code": request.code,
         "previous_video_url": request.previous_video_url,
         "previous_video_id": request.previous_video_id,
         "gemini_api_key": request.gemini_api_key
     }
-    generation_jobs[job_id] = job_data
-    save_job(job_id, job_data)
+    job_store.put(job_id, job_data)
 
     try:
-        background_tasks.add_task(
+        # Admission is decided by the render queue, although the job first waits for generation
+        render_scheduler.check_capacity(queued_render_cost(profile, request.preview))
+        generation_scheduler.submit(
+            job_id,
             process_edit_request, 
             job_id=job_id, 
             code=request.code,
             prompt=request.prompt,
             previous_video_url=request.previous_video_url,
             previous_video_id=request.previous_video_id,
-            gemini_api_key=request.gemini_api_key
+            gemini_api_key=request.gemini_api_key,
+            preview=request.preview,
+            profile=profile.name
         )
         return ManimGenerationResponse(
             id=job_id,
-            status="processing"
+            status="queued",
+            queue_position=generation_scheduler.queue_position(job_id)
         )
+    except QueueFullError as e:
+        job_store.delete(job_id)
+        return queue_full_response(job_id, e.retry_after)
     except Exception as e:
         error_message = f"Failed to start edit task: {str(e)}"
         logger.error(error_message)
@@ -379,6 +475,7 @@ async def edit_animation(request: EditRequest, background_tasks: BackgroundTasks
         
         job_data = {
             "status": "failed",
+            "stage": "failed",
             "created_at": time.time(),
             "edit_prompt": request.prompt,
             "original_code": request.code,
@@ -389,8 +486,7 @@ async def edit_animation(request: EditRequest, background_tasks: BackgroundTasks
             "gemini_api_key": request.gemini_api_key
         }
         
-        generation_jobs[job_id] = job_data
-        save_job(job_id, job_data)
+        job_store.put(job_id, job_data)
         
         return ManimGenerationResponse(
             id=job_id,
@@ -399,52 +495,62 @@ async def edit_animation(request: EditRequest, background_tasks: BackgroundTasks
             error_type=error_type
         )
 
+def job_response(job_id: str, job: dict) -> ManimGenerationResponse:
+    response = ManimGenerationResponse(
+        id=job_id,
+        status=job.get("status", "unknown")
+    )
+    
+    if "video_url" in job:
+        response.video_url = job["video_url"]
+    if "preview_url" in job:
+        response.preview_url = job["preview_url"]
+    if "title" in job:
+        response.title = job["title"]
+    if "code" in job:
+        response.code = job["code"]
+    if "previous_video_url" in job:
+        response.previous_video_url = job["previous_video_url"]
+    if "previous_video_id" in job:
+        response.previous_video_id = job["previous_video_id"]
+    if "error" in job:
+        response.error = job["error"]
+    if "error_type" in job:
+        response.error_type = job["error_type"]
+    if "validation_errors" in job:
+        response.validation_errors = job["validation_errors"]
+    if "repair_attempts" in job:
+        response.repair_attempts = job["repair_attempts"]
+    if "profile" in job:
+        response.profile = job["profile"]
+    if "stage" in job:
+        response.stage = job["stage"]
+    if "progress" in job:
+        response.progress = job["progress"]
+    if "render_progress" in job:
+        response.render_progress = job["render_progress"]
+    if response.status == "queued":
+        response.queue_position = generation_scheduler.queue_position(job_id)
+    elif response.stage == "queued":
+        # A preview job waits for its full render under a key of its own
+        response.queue_position = render_scheduler.queue_position(job_id) or render_scheduler.queue_position(full_render_key(job_id))
+        
+    return response
+
 @app.get("/status/{job_id}", response_model=ManimGenerationResponse)
 async def get_job_status(job_id: str):
     try:
-        logger.info(f"Status check requested for job: {job_id}")
-        logger.info(f"Current jobs in memory: {list(generation_jobs.keys())}")
+        logger.debug(f"Status check requested for job: {job_id}")
         
-        if job_id not in generation_jobs:
-            job_file = JOB_DIR / f"{job_id}.json"
-            if job_file.exists():
-                try:
-                    with open(job_file, "r") as f:
-                        generation_jobs[job_id] = json.load(f)
-                        logger.info(f"Loaded job {job_id} from disk on demand")
-                except Exception as e:
-                    logger.error(f"Error loading job {job_id} from disk: {e}")
-        
-        if job_id not in generation_jobs:
+        job = job_store.get(job_id)
+        if job is None:
             logger.error(f"Job not found: {job_id}")
             return JSONResponse(
                 status_code=404,
                 content={"detail": "Job not found", "id": job_id, "status": "not_found"}
             )
-        
-        job = generation_jobs[job_id]
-        
-        response = ManimGenerationResponse(
-            id=job_id,
-            status=job.get("status", "unknown")
-        )
-        
-        if "video_url" in job:
-            response.video_url = job["video_url"]
-        if "title" in job:
-            response.title = job["title"]
-        if "code" in job:
-            response.code = job["code"]
-        if "previous_video_url" in job:
-            response.previous_video_url = job["previous_video_url"]
-        if "previous_video_id" in job:
-            response.previous_video_id = job["previous_video_id"]
-        if "error" in job:
-            response.error = job["error"]
-        if "error_type" in job:
-            response.error_type = job["error_type"]
             
-        return response
+        return job_response(job_id, job)
     except Exception as e:
         logger.error(f"Error processing status request for job {job_id}: {str(e)}")
         return JSONResponse(
@@ -457,33 +563,118 @@ async def get_job_status(job_id: str):
             }
         )
 
+async def job_updates(job_id: str):
+    """Yield the job's status payload now and after every change until it finishes.
+
+    Yields None on idle intervals so callers can send a keep-alive.
+    """
+    queue = job_events.subscribe(job_id)
+    try:
+        # Subscribe before the first read so no change can slip in between
+        job = job_store.get(job_id)
+        if job is None:
+            yield {"detail": "Job not found", "id": job_id, "status": "not_found"}
+            return
+        payload = jsonable_encoder(job_response(job_id, job))
+        yield payload
+
+        while job.get("status") not in TERMINAL_STATUSES:
+            queued = job.get("status") == "queued" or job.get("stage") == "queued"
+            try:
+                update = await asyncio.wait_for(queue.get(), STATUS_STREAM_QUEUE_INTERVAL if queued else STATUS_STREAM_HEARTBEAT)
+            except asyncio.TimeoutError:
+                if queued:
+                    # Other jobs finishing move this one up without changing its record
+                    refreshed = jsonable_encoder(job_response(job_id, job))
+                    if refreshed != payload:
+                        payload = refreshed
+                        yield payload
+                        continue
+                yield None
+                continue
+
+            if update is None:
+                yield {"detail": "Job not found", "id": job_id, "status": "not_found"}
+                return
+            job = update
+            refreshed = jsonable_encoder(job_response(job_id, job))
+            if refreshed != payload:
+                payload = refreshed
+                yield payload
+    finally:
+        job_events.unsubscribe(job_id, queue)
+
+@app.get("/status/{job_id}/stream")
+async def stream_job_status(job_id: str):
+    """Server-sent events with the /status payload on every change, ending once the job finishes"""
+    async def events():
+        async for payload in job_updates(job_id):
+            if payload is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"data: {json.dumps(payload)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/ws/status/{job_id}")
+async def websocket_job_status(websocket: WebSocket, job_id: str):
+    """WebSocket variant of /status/{job_id}/stream; closes once the job finishes"""
+    await websocket.accept()
+    try:
+        async for payload in job_updates(job_id):
+            if payload is not None:
+                await websocket.send_json(payload)
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.debug(f"Status WebSocket for job {job_id} disconnected")
+
 @app.get("/download/{job_id}")
 async def download_video(job_id: str):
-    if job_id not in generation_jobs or generation_jobs[job_id].get("status") != "completed":
+    job = job_store.get(job_id)
+    if job is None or job.get("status") != "completed":
         raise HTTPException(status_code=404, detail="Video not found or not ready")
 
-    # Check if we have an S3 URL
-    if "video_url" in generation_jobs[job_id] and generation_jobs[job_id]["video_url"].startswith("https://"):
+    # Check if we have an uploaded URL
+    if "video_url" in job and not job["video_url"].startswith("/media/"):
         # Redirect to the S3 URL
-        return RedirectResponse(url=generation_jobs[job_id]["video_url"])
+        return RedirectResponse(url=job["video_url"])
     
-    # Fall back to local file
-    video_path = generation_jobs[job_id].get("video_path")
-    if not video_path or not os.path.exists(video_path):
+    # Fall back to the local file; a job whose full render failed completes with its preview
+    media = media_index.get(job_id) or media_index.get(job_id, "preview")
+    if media is None:
         raise HTTPException(status_code=404, detail="Video file not found")
 
     return FileResponse(
-        path=video_path, 
+        path=media["path"], 
         filename=f"animation_{job_id}.mp4", 
         media_type="video/mp4"
     )
 
+@app.get("/videos")
+def videos_for_prompt(prompt: str):
+    """Uploaded videos rendered for a prompt, newest first, found through the prompt index"""
+    return {"prompt": prompt, "videos": object_index.objects_for_prompt(prompt)}
+
 @app.on_event("startup")
 def setup_periodic_cleanup():
-    load_jobs()
     CODE_DIR.mkdir(parents=True, exist_ok=True)
     MEDIA_DIR.mkdir(parents=True, exist_ok=True)
     JOB_DIR.mkdir(parents=True, exist_ok=True)
+    create_services()
+    # Only this process renders, so any scratch directory left now is from a crashed run
+    scratch_space.remove_stale()
+    generation_scheduler.start()
+    render_scheduler.start()
+    render_pool.start()
+    upload_queue.start()
+    logger.info(
+        f"Startup completed in {time.perf_counter() - IMPORT_STARTED:.2f}s "
+        f"(job store: {job_store.count()} jobs, opened in {job_store.startup_seconds * 1000:.1f}ms)"
+    )
     
     # Start a background task for periodic cleanup
     import asyncio
@@ -496,29 +687,32 @@ def setup_periodic_cleanup():
     
     asyncio.create_task(periodic_cleanup())
 
+@app.on_event("shutdown")
+def shutdown_render_workers():
+    generation_scheduler.stop()
+    render_scheduler.stop()
+    render_pool.stop()
+    upload_queue.stop()
+    llm_clients.close()
+    storage.close()
+    object_index.close()
+    media_index.close()
+    job_store.close()
+
 def cleanup_old_jobs():
     """Clean up old jobs from memory and disk to prevent memory accumulation."""
     try:
         current_time = time.time()
-        jobs_to_remove = []
         
-        # Find jobs older than 24 hours
-        for job_id, job_data in generation_jobs.items():
-            job_age = current_time - job_data.get("created_at", current_time)
-            if job_age > 600:  # 24 hours in seconds
-                jobs_to_remove.append(job_id)
+        # Find finished jobs older than 10 minutes; queued and rendering jobs keep their record
+        jobs_to_remove = [
+            job_id for job_id in job_store.ids_created_before(current_time - 600)
+            if (job_store.get(job_id) or {}).get("status") in TERMINAL_STATUSES
+        ]
         
-        # Remove old jobs from memory
         for job_id in jobs_to_remove:
-            if job_id in generation_jobs:
-                del generation_jobs[job_id]
-                logger.info(f"Removed job {job_id} from memory")
-            
-            # Remove job file
-            job_file = JOB_DIR / f"{job_id}.json"
-            if job_file.exists():
-                job_file.unlink()
-                logger.info(f"Removed job file {job_id}.json")
+            job_store.delete(job_id)
+            logger.info(f"Removed job {job_id}")
             
             # Remove code file
             code_file = CODE_DIR / f"{job_id}.py"
@@ -526,18 +720,90 @@ def cleanup_old_jobs():
                 code_file.unlink()
                 logger.info(f"Removed code file {job_id}.py")
             
-            # Remove media file if it exists locally
-            media_files = list(MEDIA_DIR.glob(f"*{job_id}*.mp4"))
-            for media_file in media_files:
-                media_file.unlink()
-                logger.info(f"Removed media file {media_file}")
+            # Remove the job's local videos, found through the media index
+            removed = media_index.delete_job(job_id)
+            if removed:
+                logger.info(f"Removed {removed} media files for job {job_id}")
         
         logger.info(f"Cleanup completed: removed {len(jobs_to_remove)} old jobs")
     except Exception as e:
         logger.error(f"Error during job cleanup: {str(e)}")
 
-def edit_manim_code(original_code: str, edit_prompt: str, gemini_api_key: str = None):
-    """Edit existing Manim code using AI based on user prompt"""
+def strip_code_fences(response_text: str) -> str:
+    """Return the fenced code block of an LLM response, or the whole response if unfenced"""
+    fence = response_text.find("```")
+    if fence == -1:
+        return response_text.strip()
+    body = response_text[fence + 3:]
+    # Drop the language tag on the opening fence line
+    newline = body.find("\n")
+    if newline != -1 and body[:newline].strip().isalnum():
+        body = body[newline + 1:]
+    elif body.startswith("python"):
+        body = body[len("python"):]
+    closing = body.find("```")
+    if closing != -1:
+        body = body[:closing]
+    return body.strip()
+
+def clean_generated_code(response_text: str):
+    """Strip markdown fences from an LLM response and take the title from the first comment"""
+    code = strip_code_fences(response_text)
+
+    title = None
+    for line in code.split('\n'):
+        if line.strip().startswith('#') and not line.strip().startswith('#!'):
+            title = line.strip('# ').strip()
+            break
+    return code, title
+
+def has_scene_structure(code: str) -> bool:
+    return 'from manim import' in code and 'class' in code and 'Scene' in code
+
+# Streaming responses are abandoned when they cannot turn into a Manim scene
+STREAM_SCENE_DEADLINE_TOKENS = int(os.environ.get("LLM_STREAM_SCENE_TOKENS", "1200"))
+STREAM_PROSE_LIMIT = 1000  # Unfenced characters allowed before the first line must look like Python
+STREAM_LEADING_LINES = 5  # Complete lines handed to the compiler to tell Python from prose
+FOREIGN_CODE_MARKERS = ("function ", "const ", "let ", "#include", "public class", "console.log", "<html", "import React")
+
+def is_python_prefix(source: str) -> bool:
+    """Whether source compiles, or could once more lines arrive"""
+    try:
+        codeop.compile_command(source, symbol="exec")
+        return True
+    except (SyntaxError, ValueError, OverflowError):
+        return False
+
+def check_streamed_code(response_text: str):
+    """Raise StreamRejected as soon as a partial response is clearly not a Manim scene"""
+    # A short preamble may still be followed by a fenced code block
+    if "```" not in response_text and len(response_text) < STREAM_PROSE_LIMIT:
+        return
+    code = strip_code_fences(response_text)
+
+    # Only complete lines count; the last one may still be streaming
+    lines = code.split("\n")[:-1]
+    start = next((index for index, line in enumerate(lines) if line.strip()), None)
+    if start is not None:
+        leading_lines = lines[start:start + STREAM_LEADING_LINES]
+        first_line = leading_lines[0].strip()
+        if first_line.startswith(FOREIGN_CODE_MARKERS):
+            raise StreamRejected(f"response is not Python: {first_line[:60]}")
+        if not is_python_prefix(textwrap.dedent("\n".join(leading_lines))):
+            raise StreamRejected(f"response starts with prose: {first_line[:60]}")
+
+    # Roughly four characters per token
+    if len(code) > STREAM_SCENE_DEADLINE_TOKENS * 4:
+        if 'from manim import' not in code:
+            raise StreamRejected("no manim import")
+        if not re.search(r'class\s+\w+\s*\([^)]*Scene', code):
+            raise StreamRejected(f"no Scene class within {STREAM_SCENE_DEADLINE_TOKENS} tokens")
+
+def edit_manim_code(original_code: str, edit_prompt: str, gemini_api_key: str = None, timeout: float = None):
+    """Edit existing Manim code using AI based on user prompt.
+
+    timeout caps the seconds spent across all models; by default each model gets the client timeout.
+    """
     try:
         system_prompt = """You are a Manim expert specializing in editing and improving existing Manim code.
 
@@ -549,7 +815,7 @@ Your task is to modify the provided Manim code according to the user's edit requ
 3. Maintain the existing structure and class names unless specifically asked to change them
 4. Keep all existing functionality unless the user asks to remove it
 5. Follow all modern Manim best practices
-6. The video dimensions must remain in landscape: 1920x1080
+6. Do not set resolution, frame rate or frame size; the renderer applies them
 7. Always preserve imports and configuration settings unless asked to change them
 
 ✅ YOUR RESPONSE MUST:
@@ -575,15 +841,7 @@ from manim import *
             'gemini-1.5-pro'
         ]
         
-        gemini_key_to_use = gemini_api_key or os.environ.get("GEMINI_API_KEY")
-        if gemini_key_to_use:
-            for model_name in models_to_try:
-                try:
-                    logger.info(f"Trying to edit code with Gemini model: {model_name}")
-                    
-                    client = genai.Client(api_key=gemini_key_to_use)
-                    
-                    full_prompt = f"""System Instructions: {system_prompt}
+        full_prompt = f"""System Instructions: {system_prompt}
 
 Original Manim Code:
 ```python
@@ -593,80 +851,37 @@ Original Manim Code:
 User's Edit Request: {edit_prompt}
 
 Please provide the complete modified code following all the system instructions above. Return ONLY the modified Python code with no explanations."""
-                    
-                    response = client.models.generate_content(
-                        model=model_name,
-                        contents=[
-                            {'role': 'user', 'parts': [{'text': full_prompt}]}
-                        ]
-                    )
-                    
-                    if response and response.text:
-                        code = response.text
-                        code = code.replace("```python", "").replace("```", "").strip()
-                        
-                        title = None
-                        lines = code.split('\n')
-                        for line in lines:
-                            if line.strip().startswith('#') and not line.strip().startswith('#!'):
-                                title = line.strip('# ').strip()
-                                break
-                        
-                        if not title:
-                            title = "Edited Animation"
-                                
-                        if 'from manim import' not in code or 'class' not in code or 'Scene' not in code:
-                            logger.warning(f"{model_name} generated code missing required elements, trying next model")
-                            continue
-                        else:    
-                            if code:
-                                logger.info(f"Successfully edited Manim code with {model_name}")
-                                return code, title
-                    else:
-                        logger.warning(f"{model_name} returned empty response, trying next model")
-                        continue
-                        
-                except Exception as e:
-                    logger.error(f"Error with {model_name}: {str(e)}")
-                    continue
-        
-        if 'anthropic_client' in globals() and anthropic_client:
-            try:
-                logger.info("Editing code with Anthropic Claude")
-                
-                response = anthropic_client.messages.create(
-                    model="claude-3-5-haiku-20241022",  
-                    max_tokens=2000,                    
-                    temperature=0.1,                    
-                    system=system_prompt,               
-                    messages=[{
-                        "role": "user", 
-                        "content": f"Original Manim Code:\n```python\n{original_code}\n```\n\nUser's Edit Request: {edit_prompt}\n\nPlease provide the complete modified code."
-                    }]
-                )
-                
-                code = response.content[0].text
-                code = code.replace("```python", "").replace("```", "").strip()
-                
-                title = None
-                lines = code.split('\n')
-                for line in lines:
-                    if line.strip().startswith('#') and not line.strip().startswith('#!'):
-                        title = line.strip('# ').strip()
-                        break
-                
-                if not title:
-                    title = "Edited Animation"
-                        
-                if 'from manim import' not in code or 'class' not in code or 'Scene' not in code:
-                    logger.warning("Claude generated code missing required elements")
-                else:    
-                    if code:
-                        logger.info("Successfully edited Manim code with Claude")
-                        return code, title
-                        
-            except Exception as e:
-                logger.error(f"Error with Anthropic API: {str(e)}")
+
+        attempts = []
+        gemini_key_to_use = gemini_api_key or os.environ.get("GEMINI_API_KEY")
+        if gemini_key_to_use:
+            for model_name in models_to_try:
+                attempts.append((model_name, lambda model_name=model_name: llm_clients.gemini_generate(gemini_key_to_use, model_name, full_prompt, check=check_streamed_code)))
+        
+        if llm_clients.has_anthropic:
+            attempts.append((ANTHROPIC_MODEL, lambda: llm_clients.anthropic_generate(
+                ANTHROPIC_MODEL,
+                system_prompt,
+                f"Original Manim Code:\n```python\n{original_code}\n```\n\nUser's Edit Request: {edit_prompt}\n\nPlease provide the complete modified code.",
+                check=check_streamed_code
+            )))
+
+        def accept(model_name, response_text):
+            code, title = clean_generated_code(response_text)
+            if not has_scene_structure(code):
+                logger.warning(f"{model_name} generated code missing required elements")
+                return None
+            return code, title or "Edited Animation"
+
+        if attempts:
+            total_timeout = llm_clients.timeout * len(attempts)
+            if timeout is not None:
+                total_timeout = min(total_timeout, timeout)
+            result = llm_clients.run(llm_clients.first_valid(attempts, accept), timeout=total_timeout)
+            if result:
+                model_name, (code, title) = result
+                logger.info(f"Successfully edited Manim code with {model_name}")
+                return code, title
         
         logger.warning("All AI models failed to edit code, returning original code")
         return original_code, "Edit Failed - Original Code"
@@ -675,111 +890,363 @@ Please provide the complete modified code following all the system instructions
         logger.error(f"Error in code editing: {str(e)}")
         return original_code, "Edit Failed - Original Code"
 
-def process_edit_request(job_id: str, code: str, prompt: str, previous_video_url: str = None, previous_video_id: str = None, gemini_api_key: str = None):
+def count_repair(outcome: str, n: int = 1):
+    with repair_stats_lock:
+        repair_stats[outcome] += n
+
+def get_repair_stats() -> dict:
+    with repair_stats_lock:
+        stats = dict(repair_stats)
+    stats["success_rate"] = round(stats["repaired"] / stats["jobs"], 3) if stats["jobs"] else 0.0
+    return stats
+
+def is_repairable(error_message: str) -> bool:
+    """Only errors raised by the scene code itself are worth another LLM call"""
+    error_type, _ = categorize_error(error_message)
+    return error_type not in ("TIMEOUT_ERROR", "MEMORY_ERROR", "DEPENDENCY_ERROR")
+
+def repair_manim_code(code: str, error_message: str, gemini_api_key: str = None, timeout: float = None):
+    """Ask the editing model to fix code given the traceback it failed with; None if it could not.
+
+    timeout bounds the LLM call, which runs while the job holds its render slot.
+    """
+    # The end of the traceback names the failing line and exception
+    traceback_tail = error_message[-RENDER_REPAIR_TRACEBACK_CHARS:]
+    repair_prompt = f"""The code above fails to render with this error:
+
+{traceback_tail}
+
+Fix the error. Keep the animation the same in every other respect."""
+
+    repaired_code, _ = edit_manim_code(code, repair_prompt, gemini_api_key, timeout=timeout)
+    if not repaired_code or repaired_code == code:
+        return None
+
+    repaired_code = sanitize_manim_code(repaired_code)
+    errors = validate_scene_code(repaired_code)
+    if errors:
+        logger.warning(f"Repaired code failed static validation: {errors}")
+        return None
+    return repaired_code
+
+def create_video_with_repair(context: JobContext, code_file_path: Path, preview: bool = False):
+    """create_video, re-rendering LLM-repaired code after code errors within a bounded budget"""
+    job_id = context.job_id
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        try:
+            video_result = create_video(context, code_file_path, preview)
+            if attempt:
+                count_repair("repaired")
+                logger.info(f"Render for job {job_id} succeeded after {attempt} repair attempt(s)")
+            return video_result
+        except Exception as e:
+            error_message = str(e)
+            out_of_budget = time.monotonic() - started >= RENDER_REPAIR_BUDGET
+            if attempt >= RENDER_REPAIR_ATTEMPTS or out_of_budget or not is_repairable(error_message):
+                if attempt:
+                    count_repair("failed")
+                raise
+
+            if attempt == 0:
+                count_repair("jobs")
+            attempt += 1
+            count_repair("attempts")
+            logger.info(f"Repairing code for job {job_id} (attempt {attempt}/{RENDER_REPAIR_ATTEMPTS})")
+            job_store.update(job_id, {"stage": "repairing"})
+
+            with open(code_file_path, "r") as f:
+                code = f.read()
+            # The repair call counts against the budget too, so it cannot hold the slot past it
+            remaining = RENDER_REPAIR_BUDGET - (time.monotonic() - started)
+            try:
+                with context.timed("repair"):
+                    repaired_code = repair_manim_code(code, error_message, context.gemini_api_key, timeout=remaining)
+            except Exception as repair_error:
+                logger.error(f"Repair attempt failed for job {job_id}: {repair_error}")
+                repaired_code = None
+            if not repaired_code:
+                count_repair("failed")
+                raise e
+
+            with open(code_file_path, "w") as f:
+                f.write(repaired_code)
+            job_store.update(job_id, {
+                "code": repaired_code,
+                "repair_attempts": attempt,
+                "stage": "rendering"
+            })
+
+def publish_video(context: JobContext, video_result: dict, on_published, preview: bool = False):
+    """Call on_published(video_url, video_path) once a render has its final URL.
+
+    Videos that still need uploading go to the upload queue, so the render
+    slot is free as soon as this returns. Until the upload is confirmed the
+    video plays from /media, and that stays its URL if the upload fails.
+    """
+    job_id = context.job_id
+    if not (video_result and isinstance(video_result, dict) and "local_path" in video_result):
+        logger.error(f"Invalid video result: {video_result}")
+        video_path = str(MEDIA_DIR / f"{job_id}.mp4")
+        # Create an empty file as a last resort
+        Path(video_path).touch()
+        on_published(f"/media/{job_id}.mp4", video_path)
+        return
+
+    video_path = video_result["local_path"]
+    if "s3_url" in video_result:
+        logger.info(f"Using S3 URL from create_video: {video_result['s3_url']}")
+        on_published(video_result["s3_url"], video_path)
+        return
+
+    local_url = f"/media/{Path(video_path).name}"
+    if not storage.is_enabled:
+        logger.info("S3 storage is not enabled, using local storage only")
+        on_published(local_url, video_path)
+        return
+
+    # Playable from local media while the upload runs
+    if preview:
+        job_store.update(job_id, {"preview_url": local_url, "preview_path": video_path})
+    else:
+        job_store.update(job_id, {
+            "status": "uploading",
+            "stage": "uploading",
+            "progress": 100,
+            "video_url": local_url,
+            "video_path": video_path
+        })
+    upload_queue.submit(
+        job_id,
+        upload_video,
+        size=os.path.getsize(video_path) if os.path.exists(video_path) else 0,
+        context=context,
+        video_path=video_path,
+        cache_key=video_result.get("cache_key"),
+        sha256=video_result.get("sha256"),
+        on_published=on_published
+    )
+
+def upload_video(context: JobContext, video_path: str, cache_key: str, sha256: str, on_published):
+    """Upload stage, run on the upload queue; the local file goes only once the upload is confirmed"""
+    job_id = context.job_id
+    output_path = Path(video_path)
+    video_url = f"/media/{output_path.name}"
+    try:
+        size = output_path.stat().st_size
+        with context.timed("upload"):
+            # Identical bytes get the same key, so repeat renders are stored and uploaded once
+            s3_key = content_key(sha256 or file_sha256(video_path))
+            s3_url = object_index.get(s3_key)
+            deduplicated = bool(s3_url) or storage.exists(s3_key, size)
+            if deduplicated:
+                s3_url = s3_url or storage.url_for(s3_key)
+                logger.info(f"Video for job {job_id} is already stored at {s3_key}, skipping upload")
+                confirmed = True
+            else:
+                s3_url = storage.upload_file(video_path, s3_key)
+                confirmed = bool(s3_url) and storage.confirm(s3_key, size)
+        if confirmed:
+            video_url = s3_url
+            object_index.record(s3_key, s3_url, size, context.prompt, job_id, deduplicated)
+            if cache_key:
+                render_cache.put(cache_key, s3_url=s3_url)
+            try:
+                output_path.unlink()
+                media_index.remove(video_path)
+                logger.info(f"Deleted local file after S3 upload: {output_path}")
+            except Exception as e:
+                logger.warning(f"Could not delete local file: {e}")
+        else:
+            logger.warning(f"Upload for job {job_id} was not confirmed, keeping the local URL")
+    finally:
+        on_published(video_url, video_path)
+
+def cache_rendered_code(context: JobContext, code_file_path: Path):
+    """Store generated code in the prompt cache once it has rendered, repairs included"""
+    if context.prompt_cache_entry:
+        model_name, title = context.prompt_cache_entry
+        context.prompt_cache_entry = None
+        with open(code_file_path, "r") as f:
+            prompt_cache.put(context.prompt, model_name, f.read(), title)
+
+def invalidate_generated_code(context: JobContext):
+    """Drop the prompt cache entry for generated code that failed validation or rendering"""
+    if context.prompt_cache_entry:
+        model_name, _ = context.prompt_cache_entry
+        context.prompt_cache_entry = None
+        prompt_cache.invalidate(context.prompt, model_name)
+
+def complete_job(context: JobContext, video_url: str, video_path: str, fields: dict = None):
+    logger.info(f"Final video URL: {video_url}")
+    job_store.update(context.job_id, {
+        "status": "completed",
+        "stage": "completed",
+        "progress": 100,
+        "video_url": video_url,
+        "video_path": video_path,
+        "timings": context.timings,
+        "completed_at": time.time(),
+        **(fields or {})
+    })
+
+def publish_preview(job_id: str, preview_url: str, preview_path: str):
+    job = job_store.get(job_id) or {}
+    fields = {"preview_url": preview_url, "preview_path": preview_path}
+    # A failed full render may already have made the local preview the final video
+    if job.get("status") == "completed" and job.get("video_url") == job.get("preview_url"):
+        fields["video_url"] = preview_url
+        fields["video_path"] = preview_path
+    logger.info(f"Preview for job {job_id} published at {preview_url}")
+    job_store.update(job_id, fields)
+
+def full_render_key(job_id: str) -> str:
+    return f"{job_id}:full"
+
+def render_preview(context: JobContext, code_file_path: Path, completion: dict):
+    """Publish a draft render now and queue the full-quality render behind regular jobs.
+
+    completion holds extra fields for the job record once the full render finishes.
+    """
+    job_id = context.job_id
+    preview_result = create_video_with_repair(context, code_file_path, preview=True)
+    cache_rendered_code(context, code_file_path)
+    publish_video(context, preview_result, functools.partial(publish_preview, job_id), preview=True)
+    job_store.update(job_id, {
+        "stage": "queued",
+        "progress": None,
+        "render_progress": None
+    })
+
+    try:
+        render_scheduler.submit(
+            full_render_key(job_id),
+            render_full_quality,
+            priority=PRIORITY_LOW,
+            cost=get_profile(context.profile).cost,
+            context=context,
+            code_file_path=code_file_path,
+            completion=completion
+        )
+    except QueueFullError:
+        logger.warning(f"Render queue full, job {job_id} keeps its preview as the final video")
+        render_full_quality(context, code_file_path, completion, skip=True)
+
+def render_full_quality(context: JobContext, code_file_path: Path, completion: dict, skip: bool = False):
+    """Second stage of a preview job; the preview stays the video if the full render fails"""
+    job_id = context.job_id
+    if not skip:
+        job_store.update(job_id, {"stage": "rendering"})
+        try:
+            video_result = create_video_with_repair(context, code_file_path)
+            publish_video(context, video_result, functools.partial(complete_job, context, fields=completion))
+            return
+        except Exception as e:
+            logger.error(f"Full-quality render failed for job {job_id}, keeping the preview: {str(e)}")
+            _, completion["full_render_error"] = categorize_error(str(e))
+
+    job = job_store.get(job_id) or {}
+    complete_job(context, job.get("preview_url"), job.get("preview_path"), completion)
+
+def queue_render(context: JobContext, code_file_path: Path, preview: bool, completion: dict):
+    """Hand generated code to a render slot; only the Manim render holds one.
+
+    The job was admitted when it was submitted, so the render queue's limits
+    do not apply here. completion holds extra fields for the finished job.
+    """
+    job_id = context.job_id
+    job_store.update(job_id, {"status": "rendering", "stage": "queued"})
+    render_scheduler.submit(
+        job_id,
+        render_job,
+        cost=queued_render_cost(get_profile(context.profile), preview),
+        force=True,
+        context=context,
+        code_file_path=code_file_path,
+        preview=preview,
+        completion=completion
+    )
+
+def render_job(context: JobContext, code_file_path: Path, preview: bool, completion: dict):
+    """Render stage of /generate and /edit jobs, run on a render slot"""
+    job_id = context.job_id
+    try:
+        job_store.update(job_id, {"stage": "rendering"})
+        if preview:
+            # Publish a draft first; the job completes when the queued full render does
+            render_preview(context, code_file_path, completion)
+            return
+
+        video_result = create_video_with_repair(context, code_file_path)
+        logger.info(f"Video creation result: {video_result}")
+        cache_rendered_code(context, code_file_path)
+
+        # Uploading happens off the render slot; the job completes once the video has its final URL
+        publish_video(context, video_result, functools.partial(complete_job, context, fields=completion))
+
+    except Exception as e:
+        error_message = str(e)
+        logger.error(f"Error rendering job {job_id}: {error_message}")
+        invalidate_generated_code(context)
+        error_type, user_message = categorize_error(error_message)
+        job_store.update(job_id, {
+            "status": "failed",
+            "stage": "failed",
+            "error": user_message,
+            "error_type": error_type,
+            "completed_at": time.time()
+        })
+
+def process_edit_request(job_id: str, code: str, prompt: str, previous_video_url: str = None, previous_video_id: str = None, gemini_api_key: str = None, preview: bool = False, profile: str = None):
     try:
         logger.info(f"Processing edit request: {job_id}, prompt: {prompt}")
         logger.info(f"Previous video URL: {previous_video_url}, Previous video ID: {previous_video_id}")
+        context = JobContext(job_id, prompt, gemini_api_key)
+        context.profile = profile
+        if previous_video_id:
+            # Generated videos keep their job id, so edits of one video share a lineage
+            context.lineage = previous_video_id
         
-        generation_jobs[job_id] = {
+        job_store.put(job_id, {
             "status": "processing",
+            "stage": "generating",
             "edit_prompt": prompt,
             "original_code": code,
             "previous_video_url": previous_video_url,
             "previous_video_id": previous_video_id,
             "created_at": time.time(),
+            "profile": get_profile(profile).name,
             "gemini_api_key": gemini_api_key
-        }
-        save_job(job_id, generation_jobs[job_id])
+        })
         
-        edited_code, title = edit_manim_code(code, prompt, gemini_api_key)
+        with context.timed("generate"):
+            edited_code, title = edit_manim_code(code, prompt, gemini_api_key)
         if not edited_code:
             raise ValueError("Failed to edit Manim code")
 
+        job_store.update(job_id, {"stage": "sanitizing"})
         try:
             edited_code = sanitize_manim_code(edited_code)
         except ValueError as e:
             logger.error(f"Code sanitization failed: {str(e)}")
             raise ValueError(f"Edited code is invalid: {str(e)}")
+
+        check_scene_code(job_id, edited_code)
         
         code_file_path = CODE_DIR / f"{job_id}.py"
         with open(code_file_path, "w") as f:
             f.write(edited_code)
         
-        generation_jobs[job_id].update({
+        job_store.update(job_id, {
             "title": title,
-            "code": edited_code,
-            "status": "rendering"
+            "code": edited_code
         })
-        save_job(job_id, generation_jobs[job_id])
-        
-        video_result = create_video(job_id, code_file_path, prompt)
-        logger.info(f"Video creation result: {video_result}")
-        
-        if video_result and isinstance(video_result, dict) and "local_path" in video_result:
-            video_path = video_result["local_path"]
-            output_path = Path(video_path)
-            
-            if "s3_url" in video_result:
-                video_url = video_result["s3_url"]
-                logger.info(f"Using S3 URL from create_video: {video_url}")
-            else:
-                try:
-                    aws_access_key = os.environ.get("AWS_ACCESS_KEY_ID")
-                    aws_secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
-                    bucket_name = os.environ.get("S3_BUCKET_NAME")
-                    aws_region = os.environ.get("AWS_REGION", "us-east-1")
-                    
-                    if aws_access_key and aws_secret_key and bucket_name and os.path.exists(output_path):
-                        logger.info(f"S3 upload: Credentials found, uploading to bucket {bucket_name}")
-                        
-                        import boto3
-                        s3_client = boto3.client(
-                            's3',
-                            aws_access_key_id=aws_access_key,
-                            aws_secret_access_key=aws_secret_key,
-                            region_name=aws_region
-                        )
-                        
-                        prompt_filename = sanitize_filename(prompt)
-                        s3_key = f"videos/{prompt_filename}.mp4"
-                        logger.info(f"S3 upload: Uploading {output_path} to {bucket_name}/{s3_key}")
-                        
-                        with open(str(output_path), 'rb') as data:
-                            s3_client.put_object(
-                                Bucket=bucket_name,
-                                Key=s3_key,
-                                Body=data,
-                                ContentType='video/mp4'
-                            )
-                        logger.info(f"S3 upload: Direct put_object completed successfully")
-                        
-                        s3_url = f"https://{bucket_name}.s3.amazonaws.com/{s3_key}"
-                        logger.info(f"S3 upload: Success! URL: {s3_url}")
-                        video_url = s3_url
-                    else:
-                        logger.warning(f"S3 upload: AWS credentials not found or file doesn't exist, using local URL")
-                        video_url = f"/media/{job_id}.mp4"
-                except Exception as e:
-                    logger.error(f"S3 upload error: {str(e)}")
-                    import traceback
-                    logger.error(f"S3 upload error details:\n{traceback.format_exc()}")
-                    video_url = f"/media/{job_id}.mp4"
-        else:
-            logger.error(f"Invalid video result: {video_result}")
-            video_url = f"/media/{job_id}.mp4"
-            video_path = str(MEDIA_DIR / f"{job_id}.mp4")
-            Path(video_path).touch()
-        
-        logger.info(f"Final video URL: {video_url}")
-        generation_jobs[job_id].update({
-            "status": "completed",
-            "video_url": video_url,
-            "video_path": video_path,
+
+        queue_render(context, code_file_path, preview, {
             "previous_video_url": previous_video_url,
-            "previous_video_id": previous_video_id,
-            "completed_at": time.time()
+            "previous_video_id": previous_video_id
         })
-        save_job(job_id, generation_jobs[job_id])
         
     except Exception as e:
         error_message = str(e)
@@ -790,16 +1257,18 @@ def process_edit_request(job_id: str, code: str, prompt: str, previous_video_url
         if 'title' not in locals():
             title = None
             
-        if job_id in generation_jobs:
-            generation_jobs[job_id].update({
+        if job_id in job_store:
+            job_store.update(job_id, {
                 "status": "failed",
+                "stage": "failed",
                 "error": user_message,
                 "error_type": error_type,
                 "completed_at": time.time()
             })
         else:
-            generation_jobs[job_id] = {
+            job_store.put(job_id, {
                 "status": "failed",
+                "stage": "failed",
                 "created_at": time.time(),
                 "edit_prompt": prompt,
                 "original_code": code,
@@ -809,163 +1278,99 @@ def process_edit_request(job_id: str, code: str, prompt: str, previous_video_url
                 "error_type": error_type,
                 "title": title,
                 "gemini_api_key": gemini_api_key
-            }
-            
-        save_job(job_id, generation_jobs[job_id])
+            })
         logger.info(f"Edit failed for job {job_id}: {error_type}")
 
-def process_animation_request(job_id: str, prompt: str, gemini_api_key: str = None):
+def process_animation_request(job_id: str, prompt: str, gemini_api_key: str = None, use_cache: bool = True, preview: bool = False, profile: str = None):
+    context = JobContext(job_id, prompt, gemini_api_key)
+    context.profile = profile
     try:
         logger.info(f"Processing animation request: {job_id}, prompt: {prompt}")
         
         # Update job status to processing
-        generation_jobs[job_id] = {
+        job_store.put(job_id, {
             "status": "processing",
+            "stage": "generating",
             "prompt": prompt,
             "created_at": time.time(),
+            "profile": get_profile(profile).name,
             "gemini_api_key": gemini_api_key
-        }
-        save_job(job_id, generation_jobs[job_id])
+        })
         
         # Generate Manim code
-        code, title = generate_manim_code(prompt, gemini_api_key)
+        with context.timed("generate"):
+            code, title = generate_manim_code(prompt, gemini_api_key, use_cache, context=context)
         if not code:
             raise ValueError("Failed to generate Manim code")
 
+        job_store.update(job_id, {"stage": "sanitizing"})
         try:
             code = sanitize_manim_code(code)
         except ValueError as e:
             logger.error(f"Code sanitization failed: {str(e)}")
             raise ValueError(f"Generated code is invalid: {str(e)}")
+
+        check_scene_code(job_id, code)
         
         # Save code to file
         code_file_path = CODE_DIR / f"{job_id}.py"
         with open(code_file_path, "w") as f:
             f.write(code)
         
-        # Update job status to rendering
-        generation_jobs[job_id].update({
+        job_store.update(job_id, {
             "title": title,
-            "code": code,
-            "status": "rendering"
+            "code": code
         })
-        save_job(job_id, generation_jobs[job_id])
         
         # Check if we have a direct URL from the code generation step
-        if "direct_url" in generation_jobs[job_id]:
+        if context.direct_url:
             # Use the direct URL instead of creating a video
-            direct_url = generation_jobs[job_id]["direct_url"]
+            direct_url = context.direct_url
             logger.info(f"Using direct URL for job {job_id}: {direct_url}")
+            job_store.update(job_id, {"direct_url": direct_url})
             video_result = {"local_path": str(MEDIA_DIR / f"{job_id}.mp4"), "s3_url": direct_url}
-        else:
-            # Create the animation video normally
-            video_result = create_video(job_id, code_file_path, prompt)
-            logger.info(f"Video creation result: {video_result}")
-        
-        # Handle video storage (local or S3)
-        if video_result and isinstance(video_result, dict) and "local_path" in video_result:
-            video_path = video_result["local_path"]
-            output_path = Path(video_path)
-            
-            # Check if S3 URL is already available from create_video
-            if "s3_url" in video_result:
-                video_url = video_result["s3_url"]
-                logger.info(f"Using S3 URL from create_video: {video_url}")
-            else:
-                # Try to upload to S3 if not already done
-                try:
-                    # Get AWS credentials from environment variables
-                    aws_access_key = os.environ.get("AWS_ACCESS_KEY_ID")
-                    aws_secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
-                    bucket_name = os.environ.get("S3_BUCKET_NAME")
-                    aws_region = os.environ.get("AWS_REGION", "us-east-1")
-                    
-                    if aws_access_key and aws_secret_key and bucket_name and os.path.exists(output_path):
-                        logger.info(f"S3 upload: Credentials found, uploading to bucket {bucket_name}")
-                        
-                        # Initialize S3 client
-                        import boto3
-                        s3_client = boto3.client(
-                            's3',
-                            aws_access_key_id=aws_access_key,
-                            aws_secret_access_key=aws_secret_key,
-                            region_name=aws_region
-                        )
-                        
-                        # Create prompt-based filename for S3
-                        prompt_filename = sanitize_filename(prompt)
-                        s3_key = f"videos/{prompt_filename}.mp4"
-                        logger.info(f"S3 upload: Uploading {output_path} to {bucket_name}/{s3_key}")
-                        
-                        with open(str(output_path), 'rb') as data:
-                            s3_client.put_object(
-                                Bucket=bucket_name,
-                                Key=s3_key,
-                                Body=data,
-                                ContentType='video/mp4'
-                            )
-                        logger.info(f"S3 upload: Direct put_object completed successfully")
-                        
-                        # Generate the URL
-                        s3_url = f"https://{bucket_name}.s3.amazonaws.com/{s3_key}"
-                        logger.info(f"S3 upload: Success! URL: {s3_url}")
-                        video_url = s3_url
-                    else:
-                        logger.warning(f"S3 upload: AWS credentials not found or file doesn't exist, using local URL")
-                        video_url = f"/media/{job_id}.mp4"
-                except Exception as e:
-                    logger.error(f"S3 upload error: {str(e)}")
-                    import traceback
-                    logger.error(f"S3 upload error details:\n{traceback.format_exc()}")
-                    video_url = f"/media/{job_id}.mp4"
-        else:
-            logger.error(f"Invalid video result: {video_result}")
-            video_url = f"/media/{job_id}.mp4"
-            video_path = str(MEDIA_DIR / f"{job_id}.mp4")
-            # Create an empty file as a last resort
-            Path(video_path).touch()
-        
-        logger.info(f"Final video URL: {video_url}")
-        generation_jobs[job_id].update({
-            "status": "completed",
-            "video_url": video_url,
-            "video_path": video_path,
-            "completed_at": time.time()
-        })
-        save_job(job_id, generation_jobs[job_id])
+            publish_video(context, video_result, functools.partial(complete_job, context))
+            return
+
+        queue_render(context, code_file_path, preview, {})
         
     except Exception as e:
         error_message = str(e)
         logger.error(f"Error processing animation request: {error_message}")
+        invalidate_generated_code(context)
         
         error_type, user_message = categorize_error(error_message)
         
         if 'title' not in locals():
             title = None
             
-        if job_id in generation_jobs:
-            generation_jobs[job_id].update({
+        if job_id in job_store:
+            job_store.update(job_id, {
                 "status": "failed",
+                "stage": "failed",
                 "error": user_message,
                 "error_type": error_type,
                 "completed_at": time.time()
             })
         else:
-            generation_jobs[job_id] = {
+            job_store.put(job_id, {
                 "status": "failed",
+                "stage": "failed",
                 "created_at": time.time(),
                 "prompt": prompt,
                 "error": user_message,
                 "error_type": error_type,
                 "title": title,
                 "gemini_api_key": gemini_api_key
-            }
-            
-        save_job(job_id, generation_jobs[job_id])
+            })
         logger.info(f"Animation generation failed for job {job_id}: {error_type}")
 
-def generate_manim_code(prompt: str, gemini_api_key: str = None):
-    """Generate Manim code using AI with Gemini first, then Anthropic fallback"""
+def generate_manim_code(prompt: str, gemini_api_key: str = None, use_cache: bool = True, context: JobContext = None):
+    """Generate Manim code using AI with Gemini first, then Anthropic fallback.
+
+    When every model fails, returns placeholder code and sets
+    context.direct_url to the prerendered API error video.
+    """
     try:
         system_prompt = """You are a Manim expert. Generate only Python code for mathematical animations.
 
@@ -979,7 +1384,7 @@ Always Remember this:
 4. Use proper mathematical notation with Greek letters (\\alpha, \\beta, \\gamma, etc.), mathematical operators, and formatting.
 5. Support for complex expressions like: \\frac{\\partial^2 f}{\\partial x^2}, \\int_{-\\infty}^{\\infty} e^{-x^2} dx, \\sum_{n=1}^{\\infty} \\frac{1}{n^2}, etc.
 6. DO NOT auto-generate labels on axes or plots. Label them manually and position them properly.
-7. The dimensions of video must be in accordanfe with landsacpe view: 1920x1080.
+7. Do not set resolution, frame rate or frame size; the renderer applies them from the requested render profile.
 
 ✅ STYLE AND STRUCTURE REQUIREMENTS:
 - Alway follow latest Manim code not deprecated ones
@@ -987,7 +1392,6 @@ Always Remember this:
 - Start with a comment title (e.g., `# Advanced Calculus Visualization`)
 - Use only: `from manim import *`, `import numpy as np`
 - Define a class inheriting from `Scene` with a `construct()` method
-- Use `config.pixel_height = 720`, `config.pixel_width = 1280`, and `config.frame_width = 14`, `config.frame_height = 8`
 - Use `.animate` for property transitions (`self.play(square.animate.move_to(...))`)
 - Center visuals with `.center()` or `.move_to(ORIGIN)`
 - Keep animations under 20 seconds, memory-efficient, and smooth
@@ -1032,100 +1436,55 @@ ShowCreation(line)  # FORBIDDEN
             'gemini-2.0-flash',
             'gemini-1.5-pro'
         ]
+
+        # Serve repeat prompts from the cache, preferring the models in fallback order
+        if use_cache:
+            cached = prompt_cache.get(prompt, models_to_try + [ANTHROPIC_MODEL])
+            if cached:
+                code, title, model_name = cached
+                logger.info(f"Prompt cache hit from {model_name}, skipping LLM call")
+                if context:
+                    context.prompt_cache_entry = (model_name, title)
+                return code, title
         
-        gemini_key_to_use = gemini_api_key or os.environ.get("GEMINI_API_KEY")
-        if gemini_key_to_use:
-            for model_name in models_to_try:
-                try:
-                    logger.info(f"Trying Gemini model: {model_name}")
-                    
-                    # Create client with the provided key
-                    client = genai.Client(api_key=gemini_key_to_use)
-                    
-                    # FIXED: Create the user prompt with system instructions included
-                    full_prompt = f"""System Instructions: {system_prompt}
+        # Gemini has no system role, so the instructions go into the user prompt
+        full_prompt = f"""System Instructions: {system_prompt}
 
 User Request: Create a Manim animation that demonstrates: {prompt}
 
 Remember to follow all the system instructions above and generate only valid Python code with no explanations."""
-                    
-                    # FIXED: Use correct Gemini API format - no system role
-                    response = client.models.generate_content(
-                        model=model_name,
-                        contents=[
-                            {'role': 'user', 'parts': [{'text': full_prompt}]}
-                        ]
-                    )
-                    
-                    if response and response.text:
-                        # Clean the response
-                        code = response.text
-                        # Remove any markdown code blocks
-                        code = code.replace("```python", "").replace("```", "").strip()
-                        
-                        # Extract title from first comment
-                        title = None
-                        lines = code.split('\n')
-                        for line in lines:
-                            if line.strip().startswith('#') and not line.strip().startswith('#!'):
-                                title = line.strip('# ').strip()
-                                break
-                                
-                        # Validate code structure
-                        if 'from manim import' not in code or 'class' not in code or 'Scene' not in code:
-                            logger.warning(f"{model_name} generated code missing required elements, trying next model")
-                            continue
-                        else:    
-                            if code and title:
-                                logger.info(f"Successfully generated valid Manim code with {model_name}")
-                                return code, title
-                    else:
-                        logger.warning(f"{model_name} returned empty response, trying next model")
-                        continue
-                        
-                except Exception as e:
-                    logger.error(f"Error with {model_name}: {str(e)}")
-                    continue
-                logger.info("Trying fallback to Anthropic")
-        
-        # Try to use Anthropic Claude API if available and Gemini failed or isn't available
-        if 'anthropic_client' in globals() and anthropic_client:
-            try:
-                logger.info("Generating code with Anthropic Claude")
-                
-                response = anthropic_client.messages.create(
-                        model="claude-3-5-haiku-20241022",  
-                        max_tokens=2000,                    
-                        temperature=0.1,                    
-                        system=system_prompt,               
-                        messages=[{
-                            "role": "user", 
-                            "content": f"Create a Manim animation that demonstrates: {prompt}"
-                        }]
-                )
-                
-                # Clean the response
-                code = response.content[0].text
-                # Remove any markdown code blocks
-                code = code.replace("```python", "").replace("```", "").strip()
-                # Extract title from first comment
-                title = None
-                lines = code.split('\n')
-                for line in lines:
-                    if line.strip().startswith('#') and not line.strip().startswith('#!'):
-                        title = line.strip('# ').strip()
-                        break
-                        
-                # Validate code structure
-                if 'from manim import' not in code or 'class' not in code or 'Scene' not in code:
-                    logger.warning("Claude generated code missing required elements, using API error fallback")
-                else:    
-                    if code and title:
-                        logger.info("Successfully generated valid Manim code with Claude")
-                        return code, title
-                        
-            except Exception as e:
-                logger.error(f"Error with Anthropic API: {str(e)}")
+
+        # Gemini models in order, then Claude; slow models are hedged per LLM_HEDGE_MODE
+        attempts = []
+        gemini_key_to_use = gemini_api_key or os.environ.get("GEMINI_API_KEY")
+        if gemini_key_to_use:
+            for model_name in models_to_try:
+                attempts.append((model_name, lambda model_name=model_name: llm_clients.gemini_generate(gemini_key_to_use, model_name, full_prompt, check=check_streamed_code)))
+        
+        if llm_clients.has_anthropic:
+            attempts.append((ANTHROPIC_MODEL, lambda: llm_clients.anthropic_generate(
+                ANTHROPIC_MODEL,
+                system_prompt,
+                f"Create a Manim animation that demonstrates: {prompt}",
+                check=check_streamed_code
+            )))
+
+        def accept(model_name, response_text):
+            code, title = clean_generated_code(response_text)
+            if not has_scene_structure(code) or not title:
+                logger.warning(f"{model_name} generated code missing required elements")
+                return None
+            return code, title
+
+        if attempts:
+            result = llm_clients.run(llm_clients.first_valid(attempts, accept), timeout=llm_clients.timeout * len(attempts))
+            if result:
+                model_name, (code, title) = result
+                logger.info(f"Successfully generated valid Manim code with {model_name}")
+                # Cached by cache_rendered_code once the code has rendered
+                if context:
+                    context.prompt_cache_entry = (model_name, title)
+                return code, title
         
         # If we get here, both APIs failed or aren't available
         logger.warning("No working LLM API found, using API error fallback")
@@ -1145,11 +1504,9 @@ class APIErrorDemo(Scene):
         pass
 """
         
-        # Update the job to use the direct URL
-        job_id = next((k for k, v in generation_jobs.items() if v.get("prompt") == prompt), None)
-        if job_id:
-            generation_jobs[job_id]["direct_url"] = "https://manim-ai-videos.s3.amazonaws.com/videos/9f13cd36-1399-4ffe-af16-a2f1f9bdbdf7.mp4"
-            save_job(job_id, generation_jobs[job_id])
+        # Tell the pipeline to use the direct URL
+        if context:
+            context.direct_url = API_ERROR_VIDEO_URL
             
         return api_error_code, "API Error Demo"
 
@@ -1170,11 +1527,9 @@ class APIErrorDemo(Scene):
         pass
 """
         
-        # Update the job to use the direct URL if possible
-        job_id = next((k for k, v in generation_jobs.items() if v.get("prompt") == prompt), None)
-        if job_id:
-            generation_jobs[job_id]["direct_url"] = "https://manim-ai-videos.s3.amazonaws.com/videos/9f13cd36-1399-4ffe-af16-a2f1f9bdbdf7.mp4"
-            save_job(job_id, generation_jobs[job_id])
+        # Tell the pipeline to use the direct URL if possible
+        if context:
+            context.direct_url = API_ERROR_VIDEO_URL
             
         return api_error_code, "API Error Demo"
 
@@ -1207,22 +1562,72 @@ def detect_scene_class(code_file_path: Path):
         logger.error(f"Error detecting scene class: {str(e)}")
         return None
 
-def create_video(job_id: str, code_file_path: Path, prompt: str):
-    try:
-        output_path = MEDIA_DIR / f"{job_id}.mp4"
-        scene_class = detect_scene_class(code_file_path)
-        if not scene_class:
-            raise ValueError("Could not detect Scene class in the code")
+RENDER_TIMEOUT = 90  # Reduced timeout for Railway resource optimization
+
+# Settings that change the rendered output and so belong in the render cache key
+RENDER_CACHE_SETTINGS = ("frame_rate", "pixel_height", "pixel_width", "frame_width", "frame_height")
+
+def render_output_name(job_id: str, preview: bool = False) -> str:
+    return f"preview_{job_id}" if preview else job_id
+
+def render_profile(context: JobContext, preview: bool = False):
+    """Draft renders always use the preview profile, full renders the one requested"""
+    return RENDER_PROFILES["preview"] if preview else get_profile(context.profile)
+
+def render_timeout(profile) -> float:
+    # Costlier profiles get proportionally longer, never less than the standard timeout
+    return RENDER_TIMEOUT * max(1.0, profile.cost)
+
+def render_settings(job_id: str, partial_movie_dir: Path = None, profile=None, preview: bool = False, scratch_dir: Path = None) -> dict:
+    """Manim config applied to every render.
+
+    Applied after the scene module is imported, so the profile's resolution
+    and frame rate win over anything the generated code sets at import time.
+    Everything Manim writes, including the video, goes to the render's
+    scratch directory.
+    """
+    settings = {
+        "media_dir": str(scratch_dir or MEDIA_DIR),
+        "video_dir": str(scratch_dir or MEDIA_DIR),
+        "output_file": render_output_name(job_id, preview),
+        **(profile or get_profile()).settings,
+        # Shared Tex cache; Manim's cleanup would delete files other renders are still compiling
+        "tex_dir": str(TEX_CACHE_DIR),
+        "no_latex_cleanup": True,
+        # Memory optimization settings
+        "max_files_cached": 10,
+        "flush_cache": True
+    }
+    if partial_movie_dir:
+        # Keep partial movie files so the next edit in this lineage can reuse them
+        settings.update({
+            "partial_movie_dir": str(partial_movie_dir),
+            "max_files_cached": PARTIAL_CACHE_MAX_FILES,
+            "flush_cache": False
+        })
+    return settings
 
-        # Create a valid module name from the job_id
-        module_name = f"manim_scene_{job_id.replace('-', '_')}"
-        
-        # Copy the original code file with a valid module name
-        module_path = code_file_path.parent / f"{module_name}.py"
-        shutil.copy(code_file_path, module_path)
+def pump_output(stream, on_output):
+    """Pass a binary pipe to on_output as text, chunk by chunk, until it closes"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for chunk in iter(lambda: stream.read1(4096), b""):
+        on_output(decoder.decode(chunk))
+    on_output(decoder.decode(b"", final=True))
 
-        # Create runner script with proper imports and resource optimization
-        runner_script = f'''
+def render_in_subprocess(job_id: str, code: str, scratch_dir: Path, scene_class: str, settings: dict, progress: RenderProgress, timeout: float = RENDER_TIMEOUT):
+    """Render a scene with a one-off Python process running a generated runner script.
+
+    The scene module and runner are written to scratch_dir, which the caller removes.
+    """
+    # Create a valid module name from the job_id
+    module_name = f"manim_scene_{job_id.replace('-', '_')}"
+    with open(scratch_dir / f"{module_name}.py", "w") as f:
+        f.write(code)
+
+    config_lines = "\n".join(f"config.{key} = {value!r}" for key, value in settings.items())
+
+    # Create runner script with proper imports and resource optimization
+    runner_script = f'''
 import os
 import sys
 import platform
@@ -1236,25 +1641,17 @@ if platform.system() == "Windows":
 from manim import *
 import numpy as np
 
-# Add the code directory to Python path
+# Add the scratch directory, and the app directory for tex_cache, to Python path
 sys.path.append(os.path.dirname(__file__))
+sys.path.append({str(Path(__file__).resolve().parent)!r})
 
 # Import the scene module
 from {module_name} import {scene_class}
+from tex_cache import install_tex_cache, print_summary
 
 # Configure Manim with resource optimization for Railway
-config.media_dir = "{str(MEDIA_DIR)}"
-config.video_dir = "{str(MEDIA_DIR)}"
-config.output_file = "{job_id}"
-config.frame_rate = 24  # Reduced from 30 for performance
-config.pixel_height = 720
-config.pixel_width = 1280
-config.frame_width = 14
-config.frame_height = 8
-
-# Memory optimization settings
-config.max_files_cached = 10
-config.flush_cache = True
+{config_lines}
+install_tex_cache(config.tex_dir)
 
 # Render the scene
 try:
@@ -1264,81 +1661,122 @@ try:
 except Exception as e:
     print(f"Rendering error: {{e}}")
     raise e
+finally:
+    print_summary()
 '''
-        runner_path = code_file_path.parent / f"run_{job_id}.py"
-        with open(runner_path, "w") as f:
-            f.write(runner_script)
-
-        # Run the script in a separate process with timeout and resource limits
-        popen_kwargs = {
-            'stdout': subprocess.PIPE,
-            'stderr': subprocess.PIPE,
-            'text': True
-        }
+    runner_path = scratch_dir / "run.py"
+    with open(runner_path, "w") as f:
+        f.write(runner_script)
+
+    # Run the script in a separate process with timeout and resource limits;
+    # output is streamed into progress rather than buffered until exit
+    popen_kwargs = {
+        'stdout': subprocess.PIPE,
+        'stderr': subprocess.STDOUT
+    }
 
-        # Platform-specific process configuration
-        if sys.platform == 'win32':
-            popen_kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
-        else:
-            # On Unix-like systems, start process in new session
-            import os
-            popen_kwargs['preexec_fn'] = os.setsid
-            
-        process = subprocess.Popen(
-            [sys.executable, str(runner_path)],
-            **popen_kwargs
-        )
+    # Platform-specific process configuration
+    if sys.platform == 'win32':
+        popen_kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
+    else:
+        # On Unix-like systems, start process in new session
+        popen_kwargs['preexec_fn'] = os.setsid
+        
+    process = subprocess.Popen(
+        [sys.executable, str(runner_path)],
+        **popen_kwargs
+    )
+    reader = threading.Thread(target=pump_output, args=(process.stdout, progress.feed), daemon=True)
+    reader.start()
 
-        try:
-            # Reduced timeout for Railway resource optimization
-            stdout, stderr = process.communicate(timeout=90)  # 90 seconds timeout
-            logger.info(f"Process stdout: {stdout}")
-            if stderr:
-                logger.error(f"Process stderr: {stderr}")
+    try:
+        process.wait(timeout=timeout)
+        reader.join(timeout=5)
 
-            if process.returncode != 0:
-                raise Exception(f"Render failed with code {process.returncode}: {stderr}")
+        if process.returncode != 0:
+            raise Exception(f"Render failed with code {process.returncode}: {progress.tail()}")
 
-        except subprocess.TimeoutExpired:
-            process.kill()
-            process.wait()  # Ensure process is fully terminated
-            raise Exception("Animation render timed out after 90 seconds")
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()  # Ensure process is fully terminated
+        raise Exception(f"Animation render timed out after {timeout:.0f} seconds")
 
-        finally:
-            # Cleanup temporary files immediately to save memory
-            try:
-                runner_path.unlink(missing_ok=True)
-                module_path.unlink(missing_ok=True)
-            except Exception as e:
-                logger.error(f"Error cleaning up temp files: {e}")
+def create_video(context: JobContext, code_file_path: Path, preview: bool = False):
+    job_id = context.job_id
+    try:
+        # Manim writes to video_dir/output_file.mp4 in the scratch directory, then the
+        # video is moved here, so the path is known before rendering
+        output_name = render_output_name(job_id, preview)
+        output_path = MEDIA_DIR / f"{output_name}.mp4"
+        media_kind = "preview" if preview else "video"
+        scene_class = detect_scene_class(code_file_path)
+        if not scene_class:
+            raise ValueError("Could not detect Scene class in the code")
 
-        # Check for output video
-        video_files = list(MEDIA_DIR.glob(f"*{job_id}*.mp4"))
-        if video_files:
-            output_path = video_files[0]
-            logger.info(f"Found rendered video at {output_path}")
-            
-            # Try S3 upload if enabled
-            if s3_storage.is_enabled:
-                logger.info(f"Attempting to upload video to S3: {output_path}")
-                prompt_filename = sanitize_filename(prompt)
-                s3_key = f"videos/{prompt_filename}.mp4"
-                s3_url = s3_storage.upload_file(str(output_path), s3_key)
-                logger.info(f"S3 upload result: {s3_url}")
-                if s3_url:
-                    # Delete local file after successful S3 upload to save space
-                    try:
-                        output_path.unlink()
-                        logger.info(f"Deleted local file after S3 upload: {output_path}")
-                    except Exception as e:
-                        logger.warning(f"Could not delete local file: {e}")
-                    return {"local_path": str(output_path), "s3_url": s3_url}
-            else:
-                logger.info("S3 storage is not enabled, using local storage only")
-            
-            return {"local_path": str(output_path)}
+        profile = render_profile(context, preview)
+        settings = render_settings(job_id, profile=profile, preview=preview)
+        with open(code_file_path, "r") as f:
+            code = f.read()
 
-        raise FileNotFoundError("No video file was generated")
+        # Identical code and settings always produce the same video
+        cache_key = render_cache.key(code, {key: settings[key] for key in RENDER_CACHE_SETTINGS})
+        cached = render_cache.get(cache_key)
+        if cached:
+            logger.info(f"Render cache hit for job {job_id}")
+            if cached["s3_url"]:
+                return {"local_path": str(output_path), "s3_url": cached["s3_url"]}
+            try:
+                os.link(cached["path"], output_path)
+            except OSError:
+                shutil.copy(cached["path"], output_path)
+            media = media_index.add(job_id, str(output_path), media_kind)
+            return {"local_path": str(output_path), "cache_key": cache_key, "sha256": media["sha256"]}
+
+        def report_progress(snapshot):
+            job_store.update(job_id, {"progress": snapshot["percent"], "render_progress": snapshot})
+
+        timeout = render_timeout(profile)
+        progress = RenderProgress(count_animations(code), on_progress=report_progress)
+        scratch_dir = scratch_space.create(job_id)
+        partial_movie_dir = None
+        try:
+            # Taken last and inside the try, so every failure releases the lineage lock
+            if RENDER_INCREMENTAL:
+                partial_movie_dir = partial_cache.acquire(context.lineage)
+            settings = render_settings(job_id, partial_movie_dir, profile, preview, scratch_dir)
+            rendered_path = scratch_dir / f"{output_name}.mp4"
+            with context.timed("preview_render" if preview else "render"):
+                if render_pool.is_enabled:
+                    # Warm workers already have Manim imported, so skip the runner script
+                    result = render_pool.render(job_id, code, scene_class, settings, timeout=timeout, on_output=progress.feed)
+                    if result.get("movie_file_path"):
+                        rendered_path = Path(result["movie_file_path"])
+                else:
+                    render_in_subprocess(job_id, code, scratch_dir, scene_class, settings, progress, timeout)
+
+            if not rendered_path.exists():
+                raise FileNotFoundError("No video file was generated")
+            # Harvest the video before the scratch directory is removed
+            shutil.move(str(rendered_path), str(output_path))
+        finally:
+            if partial_movie_dir:
+                partial_cache.release(
+                    context.lineage,
+                    reused=len(progress.cached_animations),
+                    rendered=len(progress.rendered_animations)
+                )
+                if progress.cached_animations:
+                    logger.info(f"Reused {len(progress.cached_animations)} cached animations for job {job_id}")
+            logger.info(f"Render output for job {job_id}:\n{progress.tail()}")
+            tex_cache.record(progress.tex_hits, progress.tex_misses)
+            scratch_bytes = scratch_space.release(scratch_dir)
+            job_store.update(job_id, {"preview_scratch_bytes" if preview else "scratch_bytes": scratch_bytes})
+
+        logger.info(f"Found rendered video at {output_path}")
+        media = media_index.add(job_id, str(output_path), media_kind)
+        render_cache.put(cache_key, video_path=str(output_path))
+        # Uploading is a separate stage, see publish_video
+        return {"local_path": str(output_path), "cache_key": cache_key, "sha256": media["sha256"]}
 
     except Exception as e:
         logger.error(f"Error creating video: {str(e)}")
@@ -1414,6 +1852,11 @@ def create_video_direct(job_id: str, code_file_path: Path, prompt: str):
         if not scene_class:
             scene_class = "ErrorScene"  # Default for error videos
 
+        scratch_dir = scratch_space.create(job_id)
+
+        # Error videos always render with the standard profile
+        profile_lines = "\n".join(f"config.{key} = {value!r}" for key, value in RENDER_PROFILES["standard"].settings.items())
+
         # Create minimal runner for error video
         runner_script = f'''
 import os
@@ -1428,47 +1871,41 @@ if platform.system() == "Windows":
 
 from manim import *
 
-sys.path.append(os.path.dirname(__file__))
+sys.path.append({str(code_file_path.parent.resolve())!r})
 from error_{job_id} import {scene_class}
 
-config.media_dir = "{str(MEDIA_DIR)}"
-config.video_dir = "{str(MEDIA_DIR)}"
+config.media_dir = {str(scratch_dir)!r}
+config.video_dir = {str(scratch_dir)!r}
 config.output_file = "error_{job_id}"
-config.frame_rate = 24
-config.pixel_height = 720
-config.pixel_width = 1280
+{profile_lines}
 
 scene = {scene_class}()
 scene.render()
 '''
         
-        runner_path = code_file_path.parent / f"run_error_{job_id}.py"
-        with open(runner_path, "w") as f:
-            f.write(runner_script)
-
-        # Quick render with short timeout
-        process = subprocess.Popen(
-            [sys.executable, str(runner_path)],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-
         try:
-            stdout, stderr = process.communicate(timeout=30)  # Short timeout for error videos
-            if process.returncode == 0:
-                error_videos = list(MEDIA_DIR.glob(f"*error_{job_id}*.mp4"))
-                if error_videos:
-                    return {"local_path": str(error_videos[0])}
-        except subprocess.TimeoutExpired:
-            process.kill()
-            
-        finally:
-            # Cleanup
+            runner_path = scratch_dir / "run.py"
+            with open(runner_path, "w") as f:
+                f.write(runner_script)
+
+            # Quick render with short timeout
+            process = subprocess.Popen(
+                [sys.executable, str(runner_path)],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
+            )
+
             try:
-                runner_path.unlink(missing_ok=True)
-            except:
-                pass
+                stdout, stderr = process.communicate(timeout=30)  # Short timeout for error videos
+                rendered_path = scratch_dir / output_path.name
+                if process.returncode == 0 and rendered_path.exists():
+                    shutil.move(str(rendered_path), str(output_path))
+                    return {"local_path": str(output_path)}
+            except subprocess.TimeoutExpired:
+                process.kill()
+        finally:
+            scratch_space.release(scratch_dir)
 
         return None
         
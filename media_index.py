@@ -0,0 +1,116 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaIndex:
+    """Rendered files on local disk, indexed by job.
+
+    Renders write to a path known in advance and register it here, so
+    finding, serving and cleaning up a job's media never walks the media
+    directory. kind tells a job's final video from its preview.
+    """
+
+    def __init__(self, db_path: Path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS media (
+                path TEXT PRIMARY KEY,
+                job_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS media_job ON media (job_id, kind)")
+        self._db.commit()
+
+    def add(self, job_id: str, path: str, kind: str = "video") -> dict:
+        """Register a file the job produced and return its record"""
+        record = {
+            "path": str(path),
+            "job_id": job_id,
+            "kind": kind,
+            "size": os.path.getsize(path),
+            "sha256": file_sha256(path),
+            "created_at": time.time()
+        }
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO media (path, job_id, kind, size, sha256, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (record["path"], job_id, kind, record["size"], record["sha256"], record["created_at"])
+            )
+            self._db.commit()
+        return record
+
+    def get(self, job_id: str, kind: str = "video"):
+        """The job's newest file of a kind that still exists, or None"""
+        for record in self.for_job(job_id):
+            if record["kind"] == kind and os.path.exists(record["path"]):
+                return record
+        return None
+
+    def by_path(self, path: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT path, job_id, kind, size, sha256, created_at FROM media WHERE path = ?", (str(path),)
+            ).fetchone()
+        return self._record(row) if row else None
+
+    def for_job(self, job_id: str) -> list:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path, job_id, kind, size, sha256, created_at FROM media WHERE job_id = ? ORDER BY created_at DESC",
+                (job_id,)
+            ).fetchall()
+        return [self._record(row) for row in rows]
+
+    def remove(self, path: str):
+        """Forget a file, e.g. once it has been uploaded and deleted"""
+        with self._lock:
+            self._db.execute("DELETE FROM media WHERE path = ?", (str(path),))
+            self._db.commit()
+
+    def delete_job(self, job_id: str) -> int:
+        """Delete every file registered for the job and return how many were removed"""
+        removed = 0
+        for record in self.for_job(job_id):
+            try:
+                Path(record["path"]).unlink(missing_ok=True)
+                removed += 1
+            except OSError as e:
+                logger.warning(f"Could not delete media file {record['path']}: {e}")
+        with self._lock:
+            self._db.execute("DELETE FROM media WHERE job_id = ?", (job_id,))
+            self._db.commit()
+        return removed
+
+    @staticmethod
+    def _record(row) -> dict:
+        path, job_id, kind, size, sha256, created_at = row
+        return {"path": path, "job_id": job_id, "kind": kind, "size": size, "sha256": sha256, "created_at": created_at}
+
+    def stats(self) -> dict:
+        with self._lock:
+            files, total_bytes = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM media").fetchone()
+        return {"files": files, "bytes": total_bytes}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
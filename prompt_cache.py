@@ -0,0 +1,113 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Sentence punctuation that does not change what animation is being asked for
+_PUNCTUATION = re.compile(r"[.,!?;:'\"`]+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    prompt = _PUNCTUATION.sub(" ", prompt.lower())
+    return _WHITESPACE.sub(" ", prompt).strip()
+
+
+class PromptCache:
+    """Persistent prompt -> (code, title) cache in front of the LLM calls.
+
+    Entries are keyed per model on the normalized prompt, expire after
+    ttl seconds and are evicted least-recently-used beyond max_entries.
+    Callers put() code only once it has rendered, and invalidate() an
+    entry whose code failed validation or rendering.
+    """
+
+    def __init__(self, db_path: Path, ttl: float = None, max_entries: int = None):
+        self.ttl = ttl or float(os.environ.get("PROMPT_CACHE_TTL", str(7 * 24 * 3600)))
+        self.max_entries = max_entries or int(os.environ.get("PROMPT_CACHE_MAX_ENTRIES", "5000"))
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS prompts (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                code TEXT NOT NULL,
+                title TEXT,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS prompts_last_used ON prompts (last_used)")
+        self._db.commit()
+
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def key(prompt: str, model: str) -> str:
+        return hashlib.sha256(f"{model}\n{normalize_prompt(prompt)}".encode()).hexdigest()
+
+    def get(self, prompt: str, models: list):
+        """Return (code, title, model) from the first model with a fresh entry, or None"""
+        now = time.time()
+        with self._lock:
+            for model in models:
+                key = self.key(prompt, model)
+                row = self._db.execute("SELECT code, title, created_at FROM prompts WHERE key = ?", (key,)).fetchone()
+                if not row:
+                    continue
+                code, title, created_at = row
+                if now - created_at > self.ttl:
+                    self._db.execute("DELETE FROM prompts WHERE key = ?", (key,))
+                    self._db.commit()
+                    continue
+                self._db.execute("UPDATE prompts SET last_used = ? WHERE key = ?", (now, key))
+                self._db.commit()
+                self._hits += 1
+                return code, title, model
+            self._misses += 1
+            return None
+
+    def put(self, prompt: str, model: str, code: str, title: str):
+        try:
+            now = time.time()
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO prompts (key, model, code, title, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                    (self.key(prompt, model), model, code, title, now, now)
+                )
+                self._db.execute("DELETE FROM prompts WHERE created_at < ?", (now - self.ttl,))
+                self._db.execute("""
+                    DELETE FROM prompts WHERE key IN (
+                        SELECT key FROM prompts ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+                self._db.commit()
+        except Exception as e:
+            logger.error(f"Error storing prompt cache entry for {model}: {e}")
+
+    def invalidate(self, prompt: str, model: str):
+        try:
+            with self._lock:
+                self._db.execute("DELETE FROM prompts WHERE key = ?", (self.key(prompt, model),))
+                self._db.commit()
+        except Exception as e:
+            logger.error(f"Error invalidating prompt cache entry for {model}: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM prompts").fetchone()[0]
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+                "entries": entries
+            }
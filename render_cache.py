@@ -0,0 +1,238 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class RenderCache:
+    """Maps a hash of sanitized scene code plus render settings to a rendered video.
+
+    Entries point at a local copy under cache_dir and/or an uploaded S3 URL.
+    Local copies are evicted least-recently-used once they exceed max_bytes.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = None, max_entries: int = None):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes or int(os.environ.get("RENDER_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+        self.max_entries = max_entries or int(os.environ.get("RENDER_CACHE_MAX_ENTRIES", "10000"))
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.cache_dir / "index.db"), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS renders (
+                key TEXT PRIMARY KEY,
+                path TEXT,
+                s3_url TEXT,
+                size INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS renders_last_used ON renders (last_used)")
+        self._db.commit()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def key(code: str, settings: dict) -> str:
+        payload = json.dumps(settings, sort_keys=True) + "\n" + code
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str):
+        """Return {"path", "s3_url"} for a cached render, or None on a miss"""
+        with self._lock:
+            row = self._db.execute("SELECT path, s3_url FROM renders WHERE key = ?", (key,)).fetchone()
+            if row:
+                path, s3_url = row
+                if path and not os.path.exists(path):
+                    path = None
+                if path or s3_url:
+                    self._db.execute("UPDATE renders SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    self._hits += 1
+                    return {"path": path, "s3_url": s3_url}
+                self._db.execute("DELETE FROM renders WHERE key = ?", (key,))
+                self._db.commit()
+            self._misses += 1
+            return None
+
+    def put(self, key: str, video_path: str = None, s3_url: str = None):
+        """Record a render; video_path is linked (or copied) into the cache directory"""
+        try:
+            cached_path = None
+            size = 0
+            if video_path and os.path.exists(video_path):
+                cached_path = self.cache_dir / f"{key}.mp4"
+                if not cached_path.exists():
+                    try:
+                        os.link(video_path, cached_path)
+                    except OSError:
+                        shutil.copy(video_path, cached_path)
+                size = cached_path.stat().st_size
+
+            now = time.time()
+            with self._lock:
+                self._db.execute("""
+                    INSERT INTO renders (key, path, s3_url, size, created_at, last_used)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        path = COALESCE(excluded.path, renders.path),
+                        s3_url = COALESCE(excluded.s3_url, renders.s3_url),
+                        size = CASE WHEN excluded.path IS NULL THEN renders.size ELSE excluded.size END,
+                        last_used = excluded.last_used
+                """, (key, str(cached_path) if cached_path else None, s3_url, size, now, now))
+                self._db.commit()
+                self._evict_locked()
+        except Exception as e:
+            logger.error(f"Error storing render cache entry {key}: {e}")
+
+    def _evict_locked(self):
+        total_bytes, total_entries = self._db.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM renders").fetchone()
+        if total_bytes <= self.max_bytes and total_entries <= self.max_entries:
+            return
+
+        for key, path, s3_url, size in self._db.execute(
+            "SELECT key, path, s3_url, size FROM renders ORDER BY last_used"
+        ).fetchall():
+            if total_bytes <= self.max_bytes and total_entries <= self.max_entries:
+                break
+            if not path and total_entries <= self.max_entries:
+                continue
+            if path:
+                try:
+                    Path(path).unlink(missing_ok=True)
+                except Exception as e:
+                    logger.warning(f"Could not delete cached render {path}: {e}")
+            total_bytes -= size
+
+            if s3_url and total_entries <= self.max_entries:
+                # The uploaded copy stays valid, only drop the local file
+                self._db.execute("UPDATE renders SET path = NULL, size = 0 WHERE key = ?", (key,))
+            else:
+                self._db.execute("DELETE FROM renders WHERE key = ?", (key,))
+                total_entries -= 1
+            self._evictions += 1
+        self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, total_bytes = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM renders").fetchone()
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+                "entries": entries,
+                "bytes": total_bytes,
+                "evictions": self._evictions
+            }
+
+
+class PartialMovieCache:
+    """Per-lineage directories of Manim partial movie files, kept between renders.
+
+    A lineage is a generated video and every edit made to it. Manim names
+    each partial movie file after a hash of the animation it holds, so when
+    an edit re-renders the scene into the same directory, unchanged
+    animations are reused instead of rendered again. Whole lineage
+    directories are evicted least-recently-used once they exceed max_bytes.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = None):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes or int(os.environ.get("PARTIAL_CACHE_MAX_BYTES", str(1024 ** 3)))
+
+        self._lock = threading.Lock()
+        self._lineage_locks = {}
+        self._in_use = set()
+
+        self._renders = 0
+        self._reused_animations = 0
+        self._rendered_animations = 0
+        self._evictions = 0
+
+    @staticmethod
+    def _dir_name(lineage: str) -> str:
+        return hashlib.sha256(lineage.encode()).hexdigest()[:32]
+
+    def acquire(self, lineage: str) -> Path:
+        """Lock a lineage's directory for one render; call release() afterwards"""
+        with self._lock:
+            entry = self._lineage_locks.setdefault(lineage, [threading.Lock(), 0])
+            entry[1] += 1
+        # Renders in one lineage share files, so they run one at a time
+        entry[0].acquire()
+        with self._lock:
+            self._in_use.add(lineage)
+        path = self.cache_dir / self._dir_name(lineage)
+        try:
+            path.mkdir(parents=True, exist_ok=True)
+            os.utime(path)
+        except OSError:
+            # The caller gets no directory to release, so give the lineage back here
+            self.release(lineage)
+            raise
+        return path
+
+    def release(self, lineage: str, reused: int = 0, rendered: int = 0):
+        with self._lock:
+            self._in_use.discard(lineage)
+            self._renders += 1
+            self._reused_animations += reused
+            self._rendered_animations += rendered
+            entry = self._lineage_locks[lineage]
+            entry[1] -= 1
+            if not entry[1]:
+                del self._lineage_locks[lineage]
+        entry[0].release()
+        self.evict()
+
+    def _sizes(self):
+        entries = []
+        for path in self.cache_dir.iterdir():
+            if not path.is_dir():
+                continue
+            size = sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+            entries.append((path.stat().st_mtime, path, size))
+        return entries
+
+    def evict(self):
+        try:
+            entries = sorted(self._sizes())
+            total = sum(size for _, _, size in entries)
+            with self._lock:
+                busy = {self._dir_name(lineage) for lineage in self._in_use}
+            for _, path, size in entries:
+                if total <= self.max_bytes:
+                    break
+                if path.name in busy:
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                with self._lock:
+                    self._evictions += 1
+                logger.info(f"Evicted partial movie cache {path.name} ({size / (1024 * 1024):.1f} MB)")
+        except Exception as e:
+            logger.error(f"Error evicting partial movie cache: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            animations = self._reused_animations + self._rendered_animations
+            return {
+                "renders": self._renders,
+                "reused_animations": self._reused_animations,
+                "rendered_animations": self._rendered_animations,
+                "reuse_rate": round(self._reused_animations / animations, 3) if animations else 0.0,
+                "evictions": self._evictions
+            }
@@ -0,0 +1,41 @@
+import os
+
+# Pixels per second the standard profile renders; profile costs are relative to it
+_STANDARD_PIXEL_RATE = 1280 * 720 * 24
+
+
+class RenderProfile:
+    """Named Manim output settings with a render cost estimate.
+
+    cost is the profile's pixel rate relative to the standard profile, so an
+    hd render counts as roughly three standard ones in scheduler admission.
+    """
+
+    def __init__(self, name: str, pixel_width: int, pixel_height: int, frame_rate: int, frame_width: float = 14, frame_height: float = 8):
+        self.name = name
+        self.settings = {
+            "frame_rate": frame_rate,
+            "pixel_height": pixel_height,
+            "pixel_width": pixel_width,
+            "frame_width": frame_width,
+            "frame_height": frame_height
+        }
+        self.cost = round(pixel_width * pixel_height * frame_rate / _STANDARD_PIXEL_RATE, 2)
+
+
+RENDER_PROFILES = {profile.name: profile for profile in (
+    RenderProfile("preview", 854, 480, 15),
+    RenderProfile("standard", 1280, 720, 24),
+    RenderProfile("hd", 1920, 1080, 30),
+    RenderProfile("social-vertical", 1080, 1920, 30, frame_width=8, frame_height=14),
+)}
+
+DEFAULT_PROFILE = os.environ.get("RENDER_PROFILE", "standard")
+
+
+def get_profile(name: str = None) -> RenderProfile:
+    """Look up a profile by name, raising ValueError for unknown names"""
+    name = name or DEFAULT_PROFILE
+    if name not in RENDER_PROFILES:
+        raise ValueError(f"Unknown render profile '{name}', expected one of: {', '.join(RENDER_PROFILES)}")
+    return RENDER_PROFILES[name]
@@ -0,0 +1,160 @@
+import ast
+import logging
+import os
+import re
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Manim's tqdm bars look like "Animation 3: Create(Circle):  45%|####  | 27/60 [00:01<00:00, ...]"
+# and "Waiting 4:  50%|##  | 12/24 [...]"; the count is the last "| f/n [" on the line
+_PROGRESS_LINE = re.compile(r"(?:Animation|Waiting) (\d+)\b.*\|\s*(\d+)/(\d+)\s*\[")
+# Logged instead of a progress bar when a partial movie file is reused
+_CACHED_LINE = re.compile(r"Animation (\d+)\s*:\s*Using cached data")
+# tex_cache.SUMMARY_FORMAT, printed once the scene has rendered
+_TEX_CACHE_LINE = re.compile(r"^Tex cache: (\d+) hits, (\d+) misses$")
+
+
+def count_animations(code: str):
+    """Number of self.play/self.wait calls Manim will number, or None if loops make it unknowable"""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+
+    count = 0
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.For, ast.While, ast.AsyncFor, ast.ListComp, ast.GeneratorExp)):
+            for inner in ast.walk(node):
+                if _is_animation_call(inner):
+                    return None
+        elif _is_animation_call(node):
+            count += 1
+    return count or None
+
+
+def _is_animation_call(node) -> bool:
+    return (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr in ("play", "wait")
+        and isinstance(node.func.value, ast.Name)
+        and node.func.value.id == "self"
+    )
+
+
+class RenderProgress:
+    """Parses streamed render output into progress and keeps a bounded tail of it.
+
+    Progress bar redraws separated by carriage returns collapse to their
+    last state, and only the most recent max_log_bytes of output lines are
+    retained. on_progress(snapshot) is called when the animation changes or
+    the overall percentage moves by at least a point.
+    """
+
+    def __init__(self, total_animations: int = None, on_progress=None, max_log_bytes: int = None):
+        self.total_animations = total_animations
+        self.on_progress = on_progress
+        self.max_log_bytes = max_log_bytes or int(os.environ.get("RENDER_LOG_MAX_BYTES", str(64 * 1024)))
+
+        self.animation = None  # Manim's 0-based animation number
+        self.frame = None
+        self.frames = None
+        self.rendered_animations = set()
+        self.cached_animations = set()
+        self.tex_hits = 0
+        self.tex_misses = 0
+
+        self._lines = deque()
+        self._log_bytes = 0
+        self.dropped_bytes = 0
+        self._partial = ""
+        self._reported = None
+        self._lock = threading.Lock()
+
+    def feed(self, text: str):
+        with self._lock:
+            data = self._partial + text
+            lines = data.split("\n")
+            self._partial = lines.pop()
+            for line in lines:
+                # A terminal would only show the last redraw of the line
+                final = line.rsplit("\r", 1)[-1]
+                if self._parse(final):
+                    self._retain(final + "\n")
+            # The bar being redrawn right now has no newline yet; only its last redraw matters
+            self._partial = self._partial.rsplit("\r", 1)[-1]
+            self._parse(self._partial, complete=False)
+        self._report()
+
+    def _parse(self, line: str, complete: bool = True) -> bool:
+        """Update progress from a line; False if it is bookkeeping to leave out of the log.
+
+        Incomplete lines are parsed again once their newline arrives, so
+        only idempotent updates are made from them.
+        """
+        match = _PROGRESS_LINE.search(line)
+        if match:
+            self.animation, self.frame, self.frames = (int(group) for group in match.groups())
+            self.rendered_animations.add(self.animation)
+            return True
+        match = _CACHED_LINE.search(line)
+        if match:
+            self.cached_animations.add(int(match.group(1)))
+            return True
+        match = _TEX_CACHE_LINE.match(line.strip())
+        if match and complete:
+            # Kept out of the log so the word "Tex" cannot make categorize_error report a LaTeX error
+            self.tex_hits += int(match.group(1))
+            self.tex_misses += int(match.group(2))
+            return False
+        return match is None
+
+    def _retain(self, line: str):
+        size = len(line.encode(errors="replace"))
+        self._lines.append(line)
+        self._log_bytes += size
+        while self._log_bytes > self.max_log_bytes and len(self._lines) > 1:
+            dropped = self._lines.popleft()
+            dropped_size = len(dropped.encode(errors="replace"))
+            self._log_bytes -= dropped_size
+            self.dropped_bytes += dropped_size
+
+    @property
+    def percent(self):
+        if self.animation is None or not self.frames or not self.total_animations:
+            return None
+        done = min(self.animation + self.frame / self.frames, self.total_animations)
+        # 100 is reserved for the finished video, after encoding
+        return min(round(done / self.total_animations * 100, 1), 99.0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "animation": self.animation + 1 if self.animation is not None else None,
+                "animations": self.total_animations,
+                "frame": self.frame,
+                "frames": self.frames,
+                "percent": self.percent
+            }
+
+    def _report(self):
+        if not self.on_progress or self.animation is None:
+            return
+        snapshot = self.snapshot()
+        key = (snapshot["animation"], int(snapshot["percent"] or 0))
+        if key == self._reported:
+            return
+        self._reported = key
+        try:
+            self.on_progress(snapshot)
+        except Exception as e:
+            logger.warning(f"Render progress callback failed: {e}")
+
+    def tail(self) -> str:
+        with self._lock:
+            text = "".join(self._lines) + self._partial
+            if self.dropped_bytes:
+                text = f"[{self.dropped_bytes} earlier bytes dropped]\n" + text
+            return text
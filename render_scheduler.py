@@ -0,0 +1,206 @@
+import heapq
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+
+class QueueFullError(Exception):
+    """Raised when the render queue cannot accept another job"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Render queue is full, retry after {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class RenderScheduler:
+    """Fixed pool of render slots fed by a bounded priority queue.
+
+    Jobs with a lower priority number run first; jobs with equal priority
+    run in submission order. A waiting job gains one priority level every
+    priority_aging seconds, so low-priority jobs are delayed behind later
+    submissions but never starved by them (0 disables aging). Each job carries a cost estimate in standard
+    renders, and the queue also rejects jobs once their total cost would
+    exceed max_cost. When has_room is given, queued jobs only start while it
+    returns True, e.g. while the disk quota has space left.
+
+    The same class runs the code generation stage ahead of rendering; name
+    tells the two apart in thread names and logs, and settings not passed in
+    are read from environment variables prefixed with it (RENDER_SLOTS,
+    GENERATION_QUEUE_MAX, ...), so tuning one queue leaves the other alone.
+    """
+
+    def __init__(self, slots: int = None, max_queue: int = None, max_cost: float = None, has_room=None, room_poll_interval: float = 1.0, name: str = "render", priority_aging: float = None):
+        self.name = name
+        self.slots = slots or int(self._setting("SLOTS", "0")) or os.cpu_count() or 1
+        self.max_queue = max_queue or int(self._setting("QUEUE_MAX", "100"))
+        self.max_cost = max_cost or float(self._setting("QUEUE_MAX_COST", str(self.max_queue)))
+        self.has_room = has_room
+        self.room_poll_interval = room_poll_interval
+        self.priority_aging = priority_aging if priority_aging is not None else float(self._setting("PRIORITY_AGING", "15"))
+
+        self._heap = []
+        self._queued = {}
+        self._queued_cost = 0.0
+        self._running = {}
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._workers = []
+        self._stopping = False
+
+        # Exponentially weighted average duration per unit of cost, used for retry hints
+        self._avg_duration = 60.0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._waiting_for_room = False
+        self._room_waits = 0
+
+    def _setting(self, key: str, default: str) -> str:
+        return os.environ.get(f"{self.name.upper()}_{key}", default)
+
+    def start(self):
+        with self._cond:
+            if self._workers:
+                return
+            self._stopping = False
+            for slot in range(self.slots):
+                worker = threading.Thread(target=self._worker, name=f"{self.name}-slot-{slot}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+        logger.info(f"{self.name.capitalize()} scheduler started with {self.slots} slots, queue limit {self.max_queue}")
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join(timeout=5)
+        self._workers = []
+
+    def submit(self, job_id: str, func, priority: int = PRIORITY_NORMAL, cost: float = 1.0, force: bool = False, **kwargs):
+        """Queue func(**kwargs) for a slot, raising QueueFullError when full.
+
+        force skips the queue limits, for jobs admitted by check_capacity()
+        before an earlier stage ran.
+        """
+        with self._cond:
+            if job_id in self._queued:
+                raise ValueError(f"Job {job_id} is already queued")
+            if not force:
+                self._check_capacity_locked(cost)
+
+            # Aging lowers every waiting job's priority at the same rate, so a fixed rank orders them
+            rank = priority * self.priority_aging + time.monotonic() if self.priority_aging else priority
+            entry = [rank, next(self._counter), job_id, cost, func, kwargs]
+            heapq.heappush(self._heap, entry)
+            self._queued[job_id] = entry
+            self._queued_cost += cost
+            self._cond.notify()
+        logger.info(f"Queued job {job_id} with priority {priority}, cost {cost} ({len(self._queued)} waiting)")
+
+    def check_capacity(self, cost: float = 1.0):
+        """Raise QueueFullError if a job of this cost would be rejected now"""
+        with self._cond:
+            self._check_capacity_locked(cost)
+
+    def _check_capacity_locked(self, cost: float):
+        # A job costlier than max_cost on its own is still admitted to an empty queue
+        over_cost = self._queued and self._queued_cost + cost > self.max_cost
+        if len(self._queued) >= self.max_queue or over_cost:
+            self._rejected += 1
+            raise QueueFullError(self._retry_after_locked(cost))
+
+    def queue_position(self, job_id: str):
+        """1-based position of a waiting job, or None if it is not queued"""
+        with self._cond:
+            entry = self._queued.get(job_id)
+            if entry is None:
+                return None
+            return sum(1 for other in self._queued.values() if other[:2] < entry[:2]) + 1
+
+    def retry_after(self, cost: float = 1.0) -> int:
+        with self._cond:
+            return self._retry_after_locked(cost)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "slots": self.slots,
+                "running": len(self._running),
+                "queued": len(self._queued),
+                "max_queue": self.max_queue,
+                "queued_cost": round(self._queued_cost, 2),
+                "max_cost": self.max_cost,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "waiting_for_room": self._waiting_for_room,
+                "room_waits": self._room_waits,
+                "avg_duration": round(self._avg_duration, 2),
+            }
+
+    def _retry_after_locked(self, cost: float = 1.0) -> int:
+        waves = (self._queued_cost + cost) / self.slots
+        return max(1, math.ceil(self._avg_duration * waves))
+
+    def _room_available(self) -> bool:
+        try:
+            return self.has_room()
+        except Exception as e:
+            # A broken check must not stall the queue forever
+            logger.error(f"Render room check failed: {str(e)}")
+            return True
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+
+            # Checked outside the lock, has_room may be slow (it can walk directories)
+            if self.has_room is not None and not self._room_available():
+                with self._cond:
+                    if not self._waiting_for_room:
+                        self._room_waits += 1
+                        logger.warning(f"Render queue paused, {len(self._queued)} jobs waiting for room")
+                    self._waiting_for_room = True
+                    self._cond.wait(timeout=self.room_poll_interval)
+                continue
+
+            with self._cond:
+                self._waiting_for_room = False
+                if not self._heap or self._stopping:
+                    continue
+                _, _, job_id, cost, func, kwargs = heapq.heappop(self._heap)
+                del self._queued[job_id]
+                self._queued_cost = max(0.0, self._queued_cost - cost)
+                self._running[job_id] = time.time()
+
+            started = time.time()
+            try:
+                func(**kwargs)
+                succeeded = True
+            except Exception as e:
+                logger.error(f"{self.name.capitalize()} job {job_id} raised: {str(e)}")
+                succeeded = False
+
+            duration = time.time() - started
+            with self._cond:
+                self._running.pop(job_id, None)
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration / max(cost, 0.01)
+                if succeeded:
+                    self._completed += 1
+                else:
+                    self._failed += 1
+            logger.info(f"{self.name.capitalize()} slot finished job {job_id} in {duration:.1f}s")
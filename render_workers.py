@@ -0,0 +1,280 @@
+import contextlib
+import io
+import logging
+import multiprocessing
+import os
+import platform
+import queue
+import sys
+import threading
+import time
+import traceback
+import types
+
+from tex_cache import install_tex_cache, print_summary
+
+logger = logging.getLogger(__name__)
+
+
+def _current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except Exception:
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # ru_maxrss is KB on Linux and bytes on macOS
+            return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+        except Exception:
+            return 0.0
+
+
+class _OutputForwarder(io.TextIOBase):
+    """Stands in for stdout/stderr during a job and sends output to the parent in batches"""
+
+    def __init__(self, conn, interval: float = 0.25):
+        self._conn = conn
+        self._interval = interval
+        self._buffer = []
+        self._last_sent = time.monotonic()
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return False
+
+    def write(self, text):
+        self._buffer.append(text)
+        if time.monotonic() - self._last_sent >= self._interval:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self._buffer:
+            self._conn.send(("output", "".join(self._buffer)))
+            self._buffer = []
+        self._last_sent = time.monotonic()
+
+
+def _render_job(job: dict) -> dict:
+    from manim import config, tempconfig
+
+    module = types.ModuleType(job["module_name"])
+    module.__file__ = job["module_name"] + ".py"
+
+    # tempconfig restores the global config on exit, so assignments made by
+    # the scene module at import time do not leak into the next job
+    with tempconfig({}):
+        exec(compile(job["code"], module.__file__, "exec"), module.__dict__)
+
+        # Apply the job's settings after the module body, as the runner script does
+        for key, value in job["config"].items():
+            setattr(config, key, value)
+
+        scene_class = module.__dict__.get(job["scene_class"])
+        if scene_class is None:
+            raise ValueError(f"Scene class {job['scene_class']} not found in module")
+
+        tex_dir = job["config"].get("tex_dir")
+        if tex_dir:
+            install_tex_cache(tex_dir)
+        try:
+            scene = scene_class()
+            scene.render()
+        finally:
+            if tex_dir:
+                print_summary()
+        movie_file_path = str(scene.renderer.file_writer.movie_file_path)
+
+    return {"rss_mb": _current_rss_mb(), "movie_file_path": movie_file_path}
+
+
+def _worker_main(conn):
+    started = time.perf_counter()
+
+    # Add MiKTeX to PATH on Windows (fix for LaTeX rendering)
+    if platform.system() == "Windows":
+        miktex_path = r"C:\Users\harsh\AppData\Local\Programs\MiKTeX\miktex\bin\x64"
+        if os.path.exists(miktex_path) and miktex_path not in os.environ.get("PATH", ""):
+            os.environ["PATH"] = miktex_path + os.pathsep + os.environ.get("PATH", "")
+
+    import manim  # noqa: F401
+    import numpy  # noqa: F401
+
+    conn.send(("ready", {"pid": os.getpid(), "import_seconds": time.perf_counter() - started}))
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+
+        # Progress bars and logs go to the parent while the job runs
+        output = _OutputForwarder(conn)
+        try:
+            with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+                result = _render_job(job)
+            output.flush()
+            conn.send(("done", result))
+        except Exception as e:
+            output.flush()
+            conn.send(("error", {
+                "error": f"{type(e).__name__}: {e}",
+                "traceback": traceback.format_exc(),
+                "rss_mb": _current_rss_mb()
+            }))
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        self.import_seconds = None
+
+    def wait_ready(self, timeout: float):
+        if self.import_seconds is not None:
+            return
+        if not self.conn.poll(timeout):
+            raise TimeoutError("Render worker did not finish starting")
+        kind, payload = self.conn.recv()
+        if kind != "ready":
+            raise RuntimeError(f"Unexpected message from render worker: {kind}")
+        self.import_seconds = payload["import_seconds"]
+        logger.info(f"Render worker {payload['pid']} ready after {self.import_seconds:.2f}s of imports")
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(timeout=5)
+        except Exception as e:
+            logger.warning(f"Error killing render worker: {e}")
+        self.conn.close()
+
+    def shutdown(self):
+        try:
+            self.conn.send(None)
+            self.process.join(timeout=5)
+        except Exception:
+            pass
+        if self.process.is_alive():
+            self.kill()
+
+
+class WarmRenderPool:
+    """Long-lived worker processes that keep Manim imported between renders.
+
+    Each job executes in a fresh module namespace under tempconfig, and a
+    worker is replaced after RENDER_WORKER_MAX_JOBS jobs or once its RSS
+    exceeds RENDER_WORKER_MAX_RSS_MB.
+    """
+
+    def __init__(self, size: int = 0, max_jobs: int = None, max_rss_mb: float = None):
+        self.size = size
+        self.max_jobs = max_jobs or int(os.environ.get("RENDER_WORKER_MAX_JOBS", "50"))
+        self.max_rss_mb = max_rss_mb or float(os.environ.get("RENDER_WORKER_MAX_RSS_MB", "1500"))
+        self.startup_timeout = float(os.environ.get("RENDER_WORKER_STARTUP_TIMEOUT", "120"))
+
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+        self._jobs = 0
+        self._recycled = 0
+        self._startup_seconds_saved = 0.0
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.size > 0
+
+    def start(self):
+        with self._lock:
+            if self._started or not self.is_enabled:
+                return
+            self._started = True
+        for _ in range(self.size):
+            self._idle.put(_Worker(self._ctx))
+        logger.info(f"Started {self.size} warm render workers")
+
+    def stop(self):
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.shutdown()
+
+    def render(self, job_id: str, code: str, scene_class: str, render_config: dict, timeout: float, on_output=None) -> dict:
+        """Render a scene on a warm worker, raising on failure or timeout.
+
+        on_output(text) receives the worker's stdout/stderr as it is produced.
+        """
+        self.start()
+        worker = self._idle.get()
+        replace = False
+        try:
+            worker.wait_ready(self.startup_timeout)
+            worker.conn.send({
+                "module_name": f"manim_scene_{job_id.replace('-', '_')}",
+                "code": code,
+                "scene_class": scene_class,
+                "config": render_config
+            })
+
+            deadline = time.monotonic() + timeout
+            while True:
+                if not worker.conn.poll(max(deadline - time.monotonic(), 0)):
+                    replace = True
+                    raise TimeoutError(f"Animation render timed out after {timeout:g} seconds")
+
+                try:
+                    kind, payload = worker.conn.recv()
+                except EOFError:
+                    replace = True
+                    raise RuntimeError("Render failed: render worker exited unexpectedly")
+
+                if kind != "output":
+                    break
+                if on_output:
+                    on_output(payload)
+
+            worker.jobs += 1
+            with self._lock:
+                self._jobs += 1
+                self._startup_seconds_saved += worker.import_seconds
+
+            if worker.jobs >= self.max_jobs or payload.get("rss_mb", 0) > self.max_rss_mb:
+                logger.info(f"Recycling render worker after {worker.jobs} jobs ({payload.get('rss_mb', 0):.0f} MB RSS)")
+                replace = True
+
+            if kind == "error":
+                raise RuntimeError(f"Render failed: {payload['error']}\n{payload['traceback']}")
+            return payload
+        except (TimeoutError, OSError, EOFError):
+            replace = True
+            raise
+        finally:
+            if replace:
+                with self._lock:
+                    self._recycled += 1
+                worker.kill()
+                worker = _Worker(self._ctx)
+            self._idle.put(worker)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.is_enabled,
+                "workers": self.size,
+                "jobs": self._jobs,
+                "recycled": self._recycled,
+                "startup_seconds_saved": round(self._startup_seconds_saved, 2)
+            }
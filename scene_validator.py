@@ -0,0 +1,111 @@
+import ast
+import builtins
+import functools
+import importlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Modules generated scenes may import; anything else is rejected before rendering
+ALLOWED_IMPORTS = {"manim", "numpy", "math", "random", "itertools", "functools"}
+
+FORBIDDEN_CALLS = {"__import__", "exec", "eval", "compile", "open", "input", "breakpoint", "globals", "locals", "vars"}
+
+
+@functools.lru_cache(maxsize=None)
+def _module_names(module_name: str):
+    """Public names a star import of module_name provides, or None if it cannot be imported"""
+    try:
+        module = importlib.import_module(module_name)
+    except Exception as e:
+        logger.warning(f"Could not import {module_name} for name checks: {e}")
+        return None
+    exported = getattr(module, "__all__", None)
+    return frozenset(exported if exported is not None else (name for name in dir(module) if not name.startswith("_")))
+
+
+def _error(kind: str, message: str, node=None) -> dict:
+    return {"type": kind, "message": message, "line": getattr(node, "lineno", None)}
+
+
+def _is_scene_base(base) -> bool:
+    if isinstance(base, ast.Name):
+        return base.id.endswith("Scene")
+    if isinstance(base, ast.Attribute):
+        return base.attr.endswith("Scene")
+    return False
+
+
+def validate_scene_code(code: str) -> list:
+    """Statically check sanitized scene code before it is handed to a renderer.
+
+    Returns a list of {"type", "message", "line"} errors; an empty list means
+    the code parses, defines a Scene subclass with construct(), imports only
+    whitelisted modules and references only names Manim or the code defines.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return [{"type": "syntax", "message": f"Syntax error: {e.msg}", "line": e.lineno}]
+
+    errors = []
+    defined = set(dir(builtins))
+    star_modules = []
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                root = alias.name.split(".")[0]
+                if root not in ALLOWED_IMPORTS:
+                    errors.append(_error("forbidden_import", f"Import of '{alias.name}' is not allowed", node))
+                defined.add(alias.asname or root)
+        elif isinstance(node, ast.ImportFrom):
+            root = (node.module or "").split(".")[0]
+            if node.level or root not in ALLOWED_IMPORTS:
+                errors.append(_error("forbidden_import", f"Import from '{node.module or '.'}' is not allowed", node))
+                continue
+            for alias in node.names:
+                if alias.name == "*":
+                    star_modules.append(node.module)
+                else:
+                    defined.add(alias.asname or alias.name)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            defined.add(node.name)
+        elif isinstance(node, ast.arg):
+            defined.add(node.arg)
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            defined.add(node.id)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            defined.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            defined.update(node.names)
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FORBIDDEN_CALLS:
+            errors.append(_error("forbidden_call", f"Call to '{node.func.id}' is not allowed", node))
+
+    scene_classes = [
+        node for node in tree.body
+        if isinstance(node, ast.ClassDef) and any(_is_scene_base(base) for base in node.bases)
+    ]
+    if not scene_classes:
+        errors.append(_error("missing_scene", "No class inheriting from Scene"))
+    elif not any(
+        isinstance(item, ast.FunctionDef) and item.name == "construct"
+        for scene in scene_classes for item in scene.body
+    ):
+        errors.append(_error("missing_construct", "Scene class has no construct() method", scene_classes[0]))
+
+    # Unknown names are only reported when every star import can be resolved
+    for module_name in star_modules:
+        names = _module_names(module_name)
+        if names is None:
+            return errors
+        defined.update(names)
+
+    reported = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            if node.id not in defined and node.id not in reported:
+                reported.add(node.id)
+                errors.append(_error("undefined_name", f"Name '{node.id}' is not defined by Manim or the scene", node))
+
+    return errors
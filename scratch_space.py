@@ -0,0 +1,89 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Scratch directories are named render_<job id>_<random>; only those are ever purged
+_PREFIX = "render_"
+
+
+def dir_size(path) -> int:
+    """Total bytes of the regular files under path"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class ScratchSpace:
+    """Private working directories for renders, each removed in one rmtree.
+
+    A render writes its runner script, scene module and Manim media tree
+    (partial movie files, images, text SVGs) into its own directory, and the
+    finished video is moved out before the directory goes. Pointing root at
+    a tmpfs mount such as /dev/shm keeps that churn off the disk.
+
+    release() records how many bytes each job's directories held; usage()
+    is what directories still in use hold now.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._active = set()
+        self._created = 0
+        self._released_bytes = 0
+        self._peak_bytes = 0
+
+    def remove_stale(self):
+        """Remove directories left behind by a process that did not exit cleanly.
+
+        Only call this from the process that owns every render, before any
+        render starts; it would delete the directories of running renders.
+        """
+        for entry in os.scandir(self.root):
+            if entry.name.startswith(_PREFIX) and entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def create(self, job_id: str) -> Path:
+        """A new empty directory for one render; pass it to release() afterwards"""
+        path = Path(tempfile.mkdtemp(prefix=f"{_PREFIX}{job_id}_", dir=self.root))
+        with self._lock:
+            self._active.add(path)
+            self._created += 1
+        return path
+
+    def release(self, path: Path) -> int:
+        """Remove a directory and everything in it, returning the bytes it held"""
+        size = dir_size(path)
+        shutil.rmtree(path, ignore_errors=True)
+        with self._lock:
+            self._active.discard(path)
+            self._released_bytes += size
+            self._peak_bytes = max(self._peak_bytes, size)
+        return size
+
+    def usage(self) -> int:
+        with self._lock:
+            active = list(self._active)
+        return sum(dir_size(path) for path in active)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "root": str(self.root),
+                "active": len(self._active),
+                "created": self._created,
+                "released_bytes": self._released_bytes,
+                "peak_bytes": self._peak_bytes
+            }
@@ -9,7 +9,7 @@ import Header from "@/components/Header"
 import Footer from "@/components/Footer"
 import VideoPlayer from "@/components/VideoPlayer"
 import { useToast } from "@/hooks/use-toast"
-import { editAnimation, checkGenerationStatus, getErrorMessage } from "@/services"
+import { editAnimation, watchGenerationStatus, getErrorMessage } from "@/services"
 import { EditLoadingModal } from "@/components/EditLoadingModal"
 import { UserVideo } from "@/types/next-auth"
 
@@ -84,12 +84,8 @@ export function EditVideo({ videoId }: EditVideoProps) {
       )
 
       const jobId = response.job_id || response.id
-      const checkInterval = setInterval(async () => {
-        const status = await checkGenerationStatus(jobId)
-        
+      watchGenerationStatus(jobId, async (status) => {
         if (status.status === "completed") {
-          clearInterval(checkInterval)
-          
           let videoUrl = status.video_url || ""
           if (!videoUrl.startsWith("http")) {
             videoUrl = `https://manim-ai-videos.s3.amazonaws.com/videos/${videoId}.mp4`
@@ -139,7 +135,6 @@ export function EditVideo({ videoId }: EditVideoProps) {
           
           setIsLoading(false)
         } else if (status.status === "failed") {
-          clearInterval(checkInterval)
           const errorMessage = getErrorMessage(status.error_type)
           toast({
             title: "Edit Failed",
@@ -148,7 +143,7 @@ export function EditVideo({ videoId }: EditVideoProps) {
           })
           setIsLoading(false)
         }
-      }, 3000)
+      })
     } catch (error) {
       console.error("Error editing video:", error)
       
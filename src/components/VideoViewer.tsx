@@ -11,7 +11,7 @@ import Footer from "@/components/Footer"
 import VideoPlayer from "@/components/VideoPlayer"
 import { useToast } from "@/hooks/use-toast"
 import { UserVideo } from "@/types/next-auth"
-import { generateAnimation, checkGenerationStatus, getErrorMessage } from "@/services"
+import { generateAnimation, watchGenerationStatus, getErrorMessage } from "@/services"
 
 interface VideoViewerProps {
   videoId: string
@@ -121,12 +121,8 @@ export function VideoViewer({ videoId }: VideoViewerProps) {
       const response = await generateAnimation(newPrompt, session.user.id)
       const jobId = response.id
 
-      const checkInterval = setInterval(async () => {
-        const status = await checkGenerationStatus(jobId)
-        
+      watchGenerationStatus(jobId, async (status) => {
         if (status.status === "completed") {
-          clearInterval(checkInterval)
-          
           let videoUrl = status.video_url || ""
           if (!videoUrl.startsWith("http")) {
             videoUrl = `https://manim-ai-videos.s3.amazonaws.com/videos/${status.id}.mp4`
@@ -141,7 +137,6 @@ export function VideoViewer({ videoId }: VideoViewerProps) {
           router.push(`/video/${status.id}`)
           setIsGenerating(false)
         } else if (status.status === "failed") {
-          clearInterval(checkInterval)
           const errorMessage = getErrorMessage(status.error_type)
           toast({
             title: "Generation Failed",
@@ -150,7 +145,7 @@ export function VideoViewer({ videoId }: VideoViewerProps) {
           })
           setIsGenerating(false)
         }
-      }, 3000)
+      })
     } catch (error) {
       console.error("Error generating animation:", error)
       toast({
@@ -11,6 +11,7 @@ export interface GenerationResponse {
   id: string
   status: string
   video_url?: string
+  preview_url?: string
   title?: string
   code?: string
   previous_video_url?: string  
@@ -18,6 +19,10 @@ export interface GenerationResponse {
   job_id?: string
   error?: string
   error_type?: string
+  profile?: string
+  stage?: string
+  progress?: number
+  queue_position?: number
 }
 
 export interface EditRequest {
@@ -111,6 +116,58 @@ export const checkGenerationStatus = async (
   }
 }
 
+const TERMINAL_STATUSES = ["completed", "failed", "not_found"]
+
+// Calls onStatus on every job change pushed over server-sent events, falling
+// back to polling /status if the stream cannot be opened. Returns a function
+// that stops watching.
+export const watchGenerationStatus = (
+  jobId: string,
+  onStatus: (status: GenerationResponse) => void,
+  pollInterval = 3000
+): (() => void) => {
+  let stopped = false
+  let source: EventSource | null = null
+  let pollTimer: ReturnType<typeof setInterval> | null = null
+
+  const stop = () => {
+    stopped = true
+    source?.close()
+    if (pollTimer) clearInterval(pollTimer)
+  }
+
+  const deliver = (status: GenerationResponse) => {
+    if (stopped) return
+    if (TERMINAL_STATUSES.includes(status.status)) stop()
+    onStatus(status)
+  }
+
+  const startPolling = () => {
+    if (stopped || pollTimer) return
+    pollTimer = setInterval(async () => {
+      deliver(await checkGenerationStatus(jobId))
+    }, pollInterval)
+  }
+
+  if (typeof EventSource === "undefined") {
+    startPolling()
+    return stop
+  }
+
+  source = new EventSource(`${API_BASE_URL}/status/${jobId}/stream`)
+  source.onmessage = (event) => {
+    deliver(JSON.parse(event.data) as GenerationResponse)
+  }
+  source.onerror = () => {
+    if (stopped) return
+    console.warn(`Status stream for job ${jobId} failed, polling instead`)
+    source?.close()
+    startPolling()
+  }
+
+  return stop
+}
+
 export const editAnimation = async (
   videoId: string,
   code: string,
@@ -0,0 +1,501 @@
+import hashlib
+import logging
+import os
+import queue
+import random
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MIN_PART_SIZE = 5 * 1024 ** 2  # S3 rejects smaller parts, except the last
+
+
+class StorageService:
+    """Uploads rendered videos through one shared, thread-safe S3 client.
+
+    Files up to part_size go up in a single PUT. Larger files use multipart
+    uploads: their parts are read straight from disk and sent concurrently,
+    and each part is retried with exponential backoff. STORAGE_BACKEND=local
+    swaps S3 for LocalS3Client, an S3-compatible stand-in writing to a
+    directory. S3_ENDPOINT_URL points the client at another S3-compatible
+    server such as MinIO.
+    """
+
+    def __init__(self, bucket_name: str = None, client=None, part_size: int = None, concurrency: int = None, max_attempts: int = None):
+        self.backend = os.environ.get("STORAGE_BACKEND", "s3")
+        self.bucket_name = bucket_name or os.environ.get("S3_BUCKET_NAME") or ("local" if self.backend == "local" else None)
+        self.region = os.environ.get("AWS_REGION", "us-east-1")
+        self.endpoint_url = os.environ.get("S3_ENDPOINT_URL")
+        self.local_dir = Path(os.environ.get("STORAGE_LOCAL_DIR", "./outputs/storage"))
+        self.part_size = max(part_size or int(os.environ.get("S3_PART_SIZE", str(8 * 1024 ** 2))), MIN_PART_SIZE)
+        self.concurrency = concurrency or int(os.environ.get("S3_UPLOAD_CONCURRENCY", "4"))
+        self.max_attempts = max_attempts or int(os.environ.get("S3_UPLOAD_ATTEMPTS", "4"))
+        self.backoff = float(os.environ.get("S3_UPLOAD_BACKOFF", "0.5"))  # Seconds before the first retry
+
+        self._client = client
+        self._client_lock = threading.Lock()
+        self._parts = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="upload-part")
+
+        self._stats_lock = threading.Lock()
+        self._uploads = 0
+        self._multipart_uploads = 0
+        self._failures = 0
+        self._retries = 0
+        self._bytes = 0
+        self._seconds = 0.0
+
+    @property
+    def is_enabled(self) -> bool:
+        if self._client is not None or self.backend == "local":
+            return bool(self.bucket_name)
+        if not (self.bucket_name and os.environ.get("AWS_ACCESS_KEY_ID") and os.environ.get("AWS_SECRET_ACCESS_KEY")):
+            return False
+        try:
+            import boto3  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    @property
+    def client(self):
+        """The shared client, created on first use"""
+        with self._client_lock:
+            if self._client is None:
+                if self.backend == "local":
+                    self._client = LocalS3Client(self.local_dir)
+                else:
+                    import boto3
+                    from botocore.config import Config
+
+                    self._client = boto3.client(
+                        "s3",
+                        aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
+                        aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
+                        region_name=self.region,
+                        endpoint_url=self.endpoint_url,
+                        config=Config(
+                            # Room for every part thread plus concurrent single-PUT uploads
+                            max_pool_connections=self.concurrency * 2 + 8,
+                            # Retries happen per part here, with backoff
+                            retries={"max_attempts": 1, "mode": "standard"}
+                        )
+                    )
+            return self._client
+
+    def url_for(self, key: str) -> str:
+        if self.backend == "local":
+            return f"/storage/{key}"
+        if self.endpoint_url:
+            return f"{self.endpoint_url.rstrip('/')}/{self.bucket_name}/{key}"
+        return f"https://{self.bucket_name}.s3.amazonaws.com/{key}"
+
+    def upload_file(self, file_path: str, key: str, content_type: str = "video/mp4"):
+        """Upload a file and return its URL, or None if the upload failed"""
+        if not self.is_enabled:
+            logger.warning("Storage not enabled, skipping upload")
+            return None
+
+        started = time.perf_counter()
+        try:
+            size = os.path.getsize(file_path)
+            if size <= self.part_size:
+                self._retry(f"upload of {key}", self._put_object, file_path, key, content_type)
+            else:
+                self._multipart_upload(file_path, key, size, content_type)
+        except Exception as e:
+            logger.error(f"Upload of {file_path} to {key} failed: {str(e)}")
+            with self._stats_lock:
+                self._failures += 1
+            return None
+
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self._uploads += 1
+            self._bytes += size
+            self._seconds += elapsed
+        logger.info(f"Uploaded {file_path} to {key} ({size / 1024 ** 2:.1f} MB in {elapsed:.2f}s)")
+        return self.url_for(key)
+
+    def _put_object(self, file_path: str, key: str, content_type: str):
+        with open(file_path, "rb") as data:
+            self.client.put_object(Bucket=self.bucket_name, Key=key, Body=data, ContentType=content_type)
+
+    def _multipart_upload(self, file_path: str, key: str, size: int, content_type: str):
+        client = self.client
+        upload_id = self._retry(
+            f"start of multipart upload {key}",
+            client.create_multipart_upload, Bucket=self.bucket_name, Key=key, ContentType=content_type
+        )["UploadId"]
+
+        futures = []
+        try:
+            for number, offset in enumerate(range(0, size, self.part_size), start=1):
+                length = min(self.part_size, size - offset)
+                futures.append(self._parts.submit(
+                    self._retry, f"part {number} of {key}",
+                    self._upload_part, file_path, key, upload_id, number, offset, length
+                ))
+            parts = [future.result() for future in futures]
+            self._retry(
+                f"completion of multipart upload {key}",
+                client.complete_multipart_upload,
+                Bucket=self.bucket_name, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+            )
+        except Exception:
+            for future in futures:
+                future.cancel()
+            # Parts still in flight would otherwise land after the abort and linger
+            wait(futures)
+            try:
+                client.abort_multipart_upload(Bucket=self.bucket_name, Key=key, UploadId=upload_id)
+            except Exception as e:
+                logger.warning(f"Could not abort multipart upload {upload_id}: {e}")
+            raise
+
+        with self._stats_lock:
+            self._multipart_uploads += 1
+
+    def _upload_part(self, file_path: str, key: str, upload_id: str, number: int, offset: int, length: int) -> dict:
+        # Each part reads only its own range, so memory stays at concurrency x part_size
+        with open(file_path, "rb") as f:
+            f.seek(offset)
+            body = f.read(length)
+        response = self.client.upload_part(Bucket=self.bucket_name, Key=key, UploadId=upload_id, PartNumber=number, Body=body)
+        return {"PartNumber": number, "ETag": response["ETag"]}
+
+    def _retry(self, description: str, func, *args, **kwargs):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    raise
+                delay = self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                logger.warning(f"Retrying {description} in {delay:.2f}s (attempt {attempt}/{self.max_attempts}): {e}")
+                with self._stats_lock:
+                    self._retries += 1
+                time.sleep(delay)
+
+    def exists(self, key: str, size: int) -> bool:
+        """HEAD check before a PUT; any error counts as missing, so the upload just goes ahead"""
+        try:
+            response = self.client.head_object(Bucket=self.bucket_name, Key=key)
+        except Exception:
+            return False
+        return response.get("ContentLength") == size
+
+    def confirm(self, key: str, size: int) -> bool:
+        """True once the stored object exists with the expected size"""
+        try:
+            response = self._retry(f"check of {key}", self.client.head_object, Bucket=self.bucket_name, Key=key)
+        except Exception as e:
+            logger.error(f"Could not confirm upload of {key}: {str(e)}")
+            return False
+        return response.get("ContentLength") == size
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "enabled": self.is_enabled,
+                "backend": self.backend,
+                "uploads": self._uploads,
+                "multipart_uploads": self._multipart_uploads,
+                "failures": self._failures,
+                "retries": self._retries,
+                "bytes": self._bytes,
+                "mb_per_second": round(self._bytes / 1024 ** 2 / self._seconds, 2) if self._seconds else 0.0
+            }
+
+    def close(self):
+        self._parts.shutdown(wait=False)
+
+
+def content_key(sha256: str, prefix: str = "videos") -> str:
+    """Object key derived from a video's SHA-256, so identical videos share one object"""
+    return f"{prefix}/{sha256}.mp4"
+
+
+class ObjectIndex:
+    """Uploaded objects and the prompts and jobs that produced them.
+
+    Keys are content hashes, so many jobs can reference one object; a key
+    found here skips the upload without even a HEAD request.
+    """
+
+    def __init__(self, db_path: Path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS objects (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                uploaded_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS prompt_objects (
+                job_id TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                prompt TEXT,
+                key TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (job_id, key)
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS prompt_objects_prompt ON prompt_objects (prompt_hash, created_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS prompt_objects_key ON prompt_objects (key)")
+        self._db.commit()
+
+        self._deduplicated = 0
+        self._bytes_saved = 0
+
+    def get(self, key: str):
+        """URL of an indexed object, or None"""
+        with self._lock:
+            row = self._db.execute("SELECT url FROM objects WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def record(self, key: str, url: str, size: int, prompt: str, job_id: str, deduplicated: bool = False):
+        now = time.time()
+        prompt_hash = hashlib.sha256((prompt or "").encode()).hexdigest()
+        try:
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR IGNORE INTO objects (key, url, size, uploaded_at) VALUES (?, ?, ?, ?)",
+                    (key, url, size, now)
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO prompt_objects (job_id, prompt_hash, prompt, key, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, prompt_hash, prompt, key, now)
+                )
+                self._db.commit()
+                if deduplicated:
+                    self._deduplicated += 1
+                    self._bytes_saved += size
+        except Exception as e:
+            logger.error(f"Error indexing object {key} for job {job_id}: {e}")
+
+    def objects_for_prompt(self, prompt: str) -> list:
+        """URLs of every video rendered for a prompt, newest first"""
+        prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()
+        with self._lock:
+            rows = self._db.execute("""
+                SELECT objects.url FROM prompt_objects
+                JOIN objects ON objects.key = prompt_objects.key
+                WHERE prompt_objects.prompt_hash = ?
+                GROUP BY objects.key
+                ORDER BY MAX(prompt_objects.created_at) DESC
+            """, (prompt_hash,)).fetchall()
+        return [row[0] for row in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            objects, total_bytes = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects").fetchone()
+            references = self._db.execute("SELECT COUNT(*) FROM prompt_objects").fetchone()[0]
+            return {
+                "objects": objects,
+                "references": references,
+                "bytes": total_bytes,
+                "deduplicated_uploads": self._deduplicated,
+                "bytes_saved": self._bytes_saved
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class UploadQueue:
+    """Bounded queue of uploads run by their own worker threads, off the render slots.
+
+    When the queue is full, submit() runs the upload on the calling thread,
+    so a slow store slows rendering down instead of piling up local files.
+    pending_bytes() is the size of the files still waiting to be uploaded.
+    """
+
+    def __init__(self, workers: int = None, max_queue: int = None):
+        self.workers = workers or int(os.environ.get("UPLOAD_WORKERS", "2"))
+        self.max_queue = max_queue or int(os.environ.get("UPLOAD_QUEUE_MAX", "100"))
+
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()  # Workers exit once the queue is empty
+
+        self._active = 0
+        self._completed = 0
+        self._failed = 0
+        self._inline = 0
+        self._pending_bytes = 0
+        self._dequeued = 0
+        self._wait_seconds = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"upload-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Upload queue started with {self.workers} workers, queue limit {self.max_queue}")
+
+    def stop(self, timeout: float = 30):
+        """Let queued uploads finish, up to timeout seconds, then stop the workers"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        self._stopping.set()
+        # Wake idle workers; on a full queue the workers see the event once it drains
+        for _ in threads:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(timeout=max(deadline - time.monotonic(), 0))
+
+    def submit(self, job_id: str, func, size: int = 0, **kwargs):
+        """Run func(**kwargs) on an upload worker; size is the bytes it uploads"""
+        self.start()
+        with self._lock:
+            self._pending_bytes += size
+        try:
+            self._queue.put_nowait((job_id, func, kwargs, size, time.monotonic()))
+        except queue.Full:
+            logger.warning(f"Upload queue full, uploading job {job_id} on the render slot")
+            with self._lock:
+                self._inline += 1
+            self._run(job_id, func, kwargs, size)
+
+    def _worker(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=1)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                continue
+            if item is None:
+                return
+            job_id, func, kwargs, size, queued_at = item
+            with self._lock:
+                self._dequeued += 1
+                self._wait_seconds += time.monotonic() - queued_at
+            self._run(job_id, func, kwargs, size)
+
+    def _run(self, job_id: str, func, kwargs: dict, size: int):
+        with self._lock:
+            self._active += 1
+        try:
+            func(**kwargs)
+            succeeded = True
+        except Exception as e:
+            logger.error(f"Upload for job {job_id} raised: {str(e)}")
+            succeeded = False
+        with self._lock:
+            self._active -= 1
+            self._pending_bytes -= size
+            if succeeded:
+                self._completed += 1
+            else:
+                self._failed += 1
+
+    def pending_bytes(self) -> int:
+        with self._lock:
+            return self._pending_bytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queued": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "active": self._active,
+                "completed": self._completed,
+                "failed": self._failed,
+                "inline": self._inline,
+                "pending_bytes": self._pending_bytes,
+                "avg_wait_seconds": round(self._wait_seconds / self._dequeued, 2) if self._dequeued else 0.0
+            }
+
+
+class LocalS3Client:
+    """The subset of the boto3 S3 client StorageService uses, backed by a directory.
+
+    Objects live at root/bucket/key and are published atomically, so it can
+    stand in for S3 in development and tests.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._uploads = self.root / ".multipart"
+        self._uploads.mkdir(parents=True, exist_ok=True)
+
+    def _object_path(self, bucket: str, key: str) -> Path:
+        path = (self.root / bucket / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Invalid object key: {key}")
+        return path
+
+    def _publish(self, bucket: str, key: str, write) -> str:
+        path = self._object_path(bucket, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        digest = hashlib.md5()
+        with open(tmp_path, "wb") as f:
+            for chunk in write():
+                digest.update(chunk)
+                f.write(chunk)
+        os.replace(tmp_path, path)
+        return f'"{digest.hexdigest()}"'
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        data = Body if isinstance(Body, bytes) else None
+
+        def chunks():
+            if data is not None:
+                yield data
+                return
+            yield from iter(lambda: Body.read(1024 * 1024), b"")
+
+        return {"ETag": self._publish(Bucket, Key, chunks)}
+
+    def head_object(self, Bucket, Key):
+        path = self._object_path(Bucket, Key)
+        if not path.exists():
+            raise FileNotFoundError(f"No such key: {Key}")
+        return {"ContentLength": path.stat().st_size}
+
+    def create_multipart_upload(self, Bucket, Key, ContentType=None):
+        upload_id = uuid.uuid4().hex
+        (self._uploads / upload_id).mkdir()
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        part_path = self._uploads / UploadId / f"{PartNumber:05d}"
+        part_path.write_bytes(Body)
+        return {"ETag": f'"{hashlib.md5(Body).hexdigest()}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        upload_dir = self._uploads / UploadId
+
+        def chunks():
+            for part in sorted(MultipartUpload["Parts"], key=lambda part: part["PartNumber"]):
+                with open(upload_dir / f"{part['PartNumber']:05d}", "rb") as f:
+                    yield from iter(lambda: f.read(1024 * 1024), b"")
+
+        etag = self._publish(Bucket, Key, chunks)
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        return {"ETag": etag}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        shutil.rmtree(self._uploads / UploadId, ignore_errors=True)
@@ -0,0 +1,89 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from code_sanitizer import apply_rules  # noqa: E402
+
+
+@pytest.mark.parametrize("code, expected", [
+    # Methods called on a call or subscript result, not just on a plain name
+    ("x = Line(ORIGIN, UP).shorten_ends(0.1)\n", "x = Line(ORIGIN, UP)\n"),
+    ("x = lines[0].shorten_ends(0.1).scale(2)\n", "x = lines[0].scale(2)\n"),
+    ('g = Axes().plot(f, label="f")\n', "g = Axes().plot(f)\n"),
+    ("g = axes.get_graph(f).plot(g, label=1)\n", "g = axes.get_graph(f).plot(g)\n"),
+    ("g = axes.plot(f, label=1)\n", "g = axes.plot(f)\n"),
+])
+def test_chained_method_calls(code, expected):
+    assert apply_rules(code) == expected
+
+
+@pytest.mark.parametrize("code, expected", [
+    ("l = Line(a, b, shorten_ends=0.1, color=RED)\n", "l = Line(a, b, color=RED)\n"),
+    ("l = Line(a, b, color=RED, shorten_ends=0.1)\n", "l = Line(a, b, color=RED)\n"),
+    ("l = Line(a, b, color=RED,\n    # (\n    shorten_ends=0.1)\n", "l = Line(a, b, color=RED)\n"),
+    ("g = axes.plot(lambda x: x, color=BLUE, label=MathTex('a, b'))\n", "g = axes.plot(lambda x: x, color=BLUE)\n"),
+    ("p = NumberPlane(x_range=(-7, 7, 1), background_line_style={'a': (1, 2)})\n", "p = NumberPlane()\n"),
+])
+def test_keyword_rules(code, expected):
+    assert apply_rules(code) == expected
+
+
+@pytest.mark.parametrize("code", [
+    "s = 'x.shorten_ends(1)'  # axes.plot(f, label=1)\n",
+    "label = MathTex('x')\n",
+    "shorten_ends = 3\n",
+    "t = Text('ShowCreation(')\n",
+    "x = g(h(label=2), label=3\n",
+])
+def test_leaves_strings_comments_and_other_code_alone(code):
+    assert apply_rules(code) == code
+
+
+@pytest.mark.parametrize("code, expected", [
+    # Escaped quotes and quotes inside triple-quoted strings do not end the string
+    ("t = Text('it\\'s ShowCreation(')\nShowCreation(a)\n", "t = Text('it\\'s ShowCreation(')\nCreate(a)\n"),
+    ('d = """a "quoted" ShowCreation(\n"""\nShowCreation(a)\n', 'd = """a "quoted" ShowCreation(\n"""\nCreate(a)\n'),
+    # Brackets inside string arguments are not counted
+    ("g = axes.plot(f, color=(1, [2, {3: '(]'}]), label='a,b')\n", "g = axes.plot(f, color=(1, [2, {3: '(]'}]))\n"),
+])
+def test_strings_inside_rewritten_code(code, expected):
+    assert apply_rules(code) == expected
+
+
+def test_deeply_nested_arguments():
+    code = "g = axes.plot(f(g(h(i(j(k(1)))))), color=1, label=3, width=2)\nl = Line(a, shorten_ends=(1+(2*(3-(4/(5))))))\n"
+    assert apply_rules(code) == "g = axes.plot(f(g(h(i(j(k(1)))))), color=1, width=2)\nl = Line(a)\n"
+
+
+def test_word_boundaries():
+    code = "a = MyShowCreation(b); ShowCreation(c); AVERAGE_COLORS; AVERAGE_COLOR\nmyconfig.frame_rate = 3\nconfig.frame_rate = 30\n"
+    assert apply_rules(code) == "a = MyShowCreation(b); Create(c); AVERAGE_COLORS; BLUE\nmyconfig.frame_rate = 3\npass\n"
+
+
+@pytest.mark.parametrize("code, expected", [
+    ("config.frame_width = (\n    14)\nx = 1\n", "pass\nx = 1\n"),
+    ("config.pixel_height, config.pixel_width = 1080, 1920\n", "pass\n"),
+    ("config.pixel_height = config.pixel_width = 720\n", "pass\n"),
+    ("class S(Scene):\n    def construct(self):\n        config.frame_rate = 60; self.wait()\n",
+     "class S(Scene):\n    def construct(self):\n        pass; self.wait()\n"),
+    ("config['frame_rate'] = 30\nconfig.frame_height: float = 8\nconfig.frame_rate *= 2\n", "pass\npass\npass\n"),
+    ("t = Text('é'); config.frame_rate = 30\n", "t = Text('é'); pass\n"),
+])
+def test_render_config_assignments_are_removed(code, expected):
+    result = apply_rules(code)
+    assert result == expected
+    compile(result, "<scene>", "exec")
+
+
+@pytest.mark.parametrize("code", [
+    "config.background_color = BLACK\n",
+    "if config.frame_rate == 30:\n    pass\n",
+    "a, config.frame_rate = 1, 30\n",
+    "s = 'config.frame_rate = 30'\n",
+    "config.frame_rate = (\n",
+])
+def test_other_config_code_is_left_alone(code):
+    assert apply_rules(code) == code
@@ -0,0 +1,58 @@
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from job_events import JobEvents  # noqa: E402
+
+
+def test_publish_from_a_thread_reaches_every_subscriber_of_the_job():
+    events = JobEvents()
+
+    async def main():
+        first = events.subscribe("job-1")
+        second = events.subscribe("job-1")
+        other = events.subscribe("job-2")
+        assert events.stats() == {"jobs_watched": 2, "subscribers": 3}
+
+        publisher = threading.Thread(target=events.publish, args=("job-1", {"status": "rendering"}))
+        publisher.start()
+        publisher.join()
+
+        assert await asyncio.wait_for(first.get(), 1) == {"status": "rendering"}
+        assert await asyncio.wait_for(second.get(), 1) == {"status": "rendering"}
+        assert other.empty()
+
+    asyncio.run(main())
+
+
+def test_unsubscribed_queue_gets_nothing():
+    events = JobEvents()
+
+    async def main():
+        kept = events.subscribe("job-1")
+        dropped = events.subscribe("job-1")
+        events.unsubscribe("job-1", dropped)
+
+        events.publish("job-1", None)
+        assert await asyncio.wait_for(kept.get(), 1) is None
+        assert dropped.empty()
+
+        events.unsubscribe("job-1", kept)
+        assert events.stats() == {"jobs_watched": 0, "subscribers": 0}
+
+    asyncio.run(main())
+
+
+def test_subscriber_whose_loop_closed_is_dropped():
+    events = JobEvents()
+
+    async def subscribe():
+        return events.subscribe("job-1")
+
+    asyncio.run(subscribe())
+
+    events.publish("job-1", {"status": "completed"})
+    assert events.stats() == {"jobs_watched": 0, "subscribers": 0}
@@ -0,0 +1,74 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from job_store import FileJobStore, SQLiteJobStore  # noqa: E402
+
+
+def open_store(tmp_path):
+    # A long flush interval keeps the background writer out of the way
+    return SQLiteJobStore(tmp_path / "jobs.db", flush_interval=3600)
+
+
+@pytest.fixture(params=["sqlite", "file"])
+def open_backend(request, tmp_path):
+    """Opens a store on the same location each call, as a restarted process would"""
+    if request.param == "sqlite":
+        return lambda: SQLiteJobStore(tmp_path / "jobs.db", flush_interval=3600)
+    return lambda: FileJobStore(tmp_path / "jobs", flush_interval=3600)
+
+
+def test_terminal_update_is_written_through(open_backend):
+    store = open_backend()
+    store.put("a", {"status": "processing", "created_at": 1.0})
+    store.put("b", {"status": "processing", "created_at": 2.0})
+    store.flush()
+
+    store.update("a", {"status": "completed"})
+    store.update("b", {"status": "rendering"})
+
+    # Another process sees the finished job at once; progress waits for the next flush
+    other = open_backend()
+    assert other.get("a")["status"] == "completed"
+    assert other.get("b")["status"] == "processing"
+    assert store.stats()["queued_writes"] == 1
+    other.close()
+    store.close()
+
+
+def test_close_writes_queued_updates(open_backend):
+    store = open_backend()
+    store.put("a", {"status": "processing", "created_at": 1.0})
+    store.update("a", {"status": "rendering"})
+    store.close()
+
+    reopened = open_backend()
+    assert reopened.get("a")["status"] == "rendering"
+    reopened.close()
+
+
+def test_lookups_by_status_and_prompt(tmp_path):
+    store = open_store(tmp_path)
+    store.put("a", {"status": "completed", "created_at": 1.0, "prompt": "circle"})
+    store.put("b", {"status": "processing", "created_at": 2.0, "prompt": "circle"})
+    store.put("c", {"status": "completed", "created_at": 3.0, "prompt": "square"})
+    store.flush()
+    # Queued writes are merged with what the backend returns
+    store.update("b", {"status": "completed"})
+    store.put("d", {"status": "processing", "created_at": 4.0, "prompt": "circle"})
+
+    assert sorted(store.ids_by_status("completed")) == ["a", "b", "c"]
+    assert store.ids_by_status("processing") == ["d"]
+    assert store.latest_by_prompt("circle") == "d"
+    assert store.latest_by_prompt("square") == "c"
+    assert store.latest_by_prompt("triangle") is None
+    assert sorted(store.ids_created_before(2.5)) == ["a", "b"]
+    store.close()
+
+    reopened = open_store(tmp_path)
+    assert sorted(reopened.ids_by_status("completed")) == ["a", "b", "c"]
+    assert reopened.latest_by_prompt("circle") == "d"
+    reopened.close()
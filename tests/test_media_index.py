@@ -0,0 +1,64 @@
+import hashlib
+import itertools
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import media_index  # noqa: E402
+from media_index import MediaIndex  # noqa: E402
+
+
+def make_file(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_get_returns_the_newest_existing_file_of_a_kind(tmp_path, monkeypatch):
+    clock = itertools.count(1000)
+    monkeypatch.setattr(media_index.time, "time", lambda: float(next(clock)))
+    index = MediaIndex(tmp_path / "media.db")
+    first = make_file(tmp_path, "first.mp4", b"first")
+    preview = make_file(tmp_path, "preview.mp4", b"preview")
+    second = make_file(tmp_path, "second.mp4", b"second")
+
+    record = index.add("job-1", first)
+    assert record["size"] == 5
+    assert record["sha256"] == hashlib.sha256(b"first").hexdigest()
+    index.add("job-1", preview, kind="preview")
+    index.add("job-1", second)
+
+    assert index.get("job-1")["path"] == second
+    assert index.get("job-1", kind="preview")["path"] == preview
+    assert index.get("job-2") is None
+    assert index.by_path(first)["job_id"] == "job-1"
+
+    # A file deleted behind the index's back falls through to the next one
+    Path(second).unlink()
+    assert index.get("job-1")["path"] == first
+
+    index.remove(first)
+    assert index.get("job-1") is None
+    assert index.by_path(first) is None
+    index.close()
+
+
+def test_delete_job_removes_only_that_jobs_files(tmp_path):
+    index = MediaIndex(tmp_path / "media.db")
+    video = make_file(tmp_path, "video.mp4", b"video")
+    preview = make_file(tmp_path, "preview.mp4", b"preview")
+    other = make_file(tmp_path, "other.mp4", b"other")
+    index.add("job-1", video)
+    index.add("job-1", preview, kind="preview")
+    index.add("job-2", other)
+    assert index.stats() == {"files": 3, "bytes": 17}
+
+    assert index.delete_job("job-1") == 2
+
+    assert not Path(video).exists()
+    assert not Path(preview).exists()
+    assert Path(other).exists()
+    assert index.for_job("job-1") == []
+    assert index.stats() == {"files": 1, "bytes": 5}
+    index.close()
@@ -0,0 +1,77 @@
+import itertools
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import prompt_cache  # noqa: E402
+from prompt_cache import PromptCache  # noqa: E402
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_prompts_differing_in_case_and_punctuation_share_an_entry(tmp_path):
+    cache = PromptCache(tmp_path / "prompts.db", ttl=3600, max_entries=10)
+    assert cache.get("Draw a circle.", ["gemini"]) is None
+
+    cache.put("Draw a circle.", "gemini", "code", "Circle")
+
+    assert cache.get("draw   a circle!", ["gemini"]) == ("code", "Circle", "gemini")
+    assert cache.get("draw a square", ["gemini"]) is None
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["entries"] == 1
+
+
+def test_first_model_with_an_entry_wins(tmp_path):
+    cache = PromptCache(tmp_path / "prompts.db", ttl=3600, max_entries=10)
+    cache.put("draw a circle", "claude", "claude code", "Circle")
+
+    assert cache.get("draw a circle", ["gemini", "claude"]) == ("claude code", "Circle", "claude")
+
+    cache.put("draw a circle", "gemini", "gemini code", "Circle")
+    assert cache.get("draw a circle", ["gemini", "claude"]) == ("gemini code", "Circle", "gemini")
+
+
+def test_expired_entry_is_a_miss(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(prompt_cache.time, "time", clock)
+    cache = PromptCache(tmp_path / "prompts.db", ttl=60, max_entries=10)
+    cache.put("draw a circle", "gemini", "code", "Circle")
+
+    clock.now += 61
+    assert cache.get("draw a circle", ["gemini"]) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, monkeypatch):
+    clock = itertools.count(1000)
+    monkeypatch.setattr(prompt_cache.time, "time", lambda: float(next(clock)))
+    cache = PromptCache(tmp_path / "prompts.db", ttl=3600, max_entries=2)
+    cache.put("a", "gemini", "code a", "A")
+    cache.put("b", "gemini", "code b", "B")
+    assert cache.get("a", ["gemini"]) is not None
+
+    cache.put("c", "gemini", "code c", "C")
+
+    assert cache.get("b", ["gemini"]) is None
+    assert cache.get("a", ["gemini"]) is not None
+    assert cache.get("c", ["gemini"]) is not None
+
+
+def test_invalidate_drops_only_that_model(tmp_path):
+    cache = PromptCache(tmp_path / "prompts.db", ttl=3600, max_entries=10)
+    cache.put("draw a circle", "gemini", "gemini code", "Circle")
+    cache.put("draw a circle", "claude", "claude code", "Circle")
+
+    cache.invalidate("Draw a circle", "gemini")
+
+    assert cache.get("draw a circle", ["gemini"]) is None
+    assert cache.get("draw a circle", ["gemini", "claude"]) == ("claude code", "Circle", "claude")
@@ -0,0 +1,140 @@
+import itertools
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import render_cache  # noqa: E402
+from render_cache import PartialMovieCache, RenderCache  # noqa: E402
+
+
+def make_video(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(b"\0" * size)
+    return str(path)
+
+
+def tick(monkeypatch):
+    clock = itertools.count(1000)
+    monkeypatch.setattr(render_cache.time, "time", lambda: float(next(clock)))
+
+
+def test_key_depends_on_code_and_settings():
+    key = RenderCache.key("code", {"quality": "l", "fps": 15})
+    assert key == RenderCache.key("code", {"fps": 15, "quality": "l"})
+    assert key != RenderCache.key("code", {"quality": "h", "fps": 15})
+    assert key != RenderCache.key("other code", {"quality": "l", "fps": 15})
+
+
+def test_miss_then_hit(tmp_path):
+    cache = RenderCache(tmp_path / "cache", max_bytes=1024, max_entries=10)
+    assert cache.get("a") is None
+
+    cache.put("a", video_path=make_video(tmp_path, "a.mp4", 100))
+    hit = cache.get("a")
+    assert hit == {"path": str(tmp_path / "cache" / "a.mp4"), "s3_url": None}
+    assert Path(hit["path"]).stat().st_size == 100
+
+    # The S3 URL recorded after upload joins the local copy
+    cache.put("a", s3_url="https://cdn/a.mp4")
+    assert cache.get("a") == {"path": hit["path"], "s3_url": "https://cdn/a.mp4"}
+
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+    assert stats["bytes"] == 100
+
+
+def test_entry_without_a_local_file_or_url_is_dropped(tmp_path):
+    cache = RenderCache(tmp_path / "cache", max_bytes=1024, max_entries=10)
+    cache.put("a", video_path=make_video(tmp_path, "a.mp4", 100))
+    os.unlink(tmp_path / "cache" / "a.mp4")
+
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_file_is_evicted_over_max_bytes(tmp_path, monkeypatch):
+    tick(monkeypatch)
+    cache = RenderCache(tmp_path / "cache", max_bytes=250, max_entries=10)
+    cache.put("a", video_path=make_video(tmp_path, "a.mp4", 100))
+    cache.put("b", video_path=make_video(tmp_path, "b.mp4", 100))
+    assert cache.get("a") is not None
+
+    cache.put("c", video_path=make_video(tmp_path, "c.mp4", 100))
+
+    assert cache.get("b") is None
+    assert not (tmp_path / "cache" / "b.mp4").exists()
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 200
+
+
+def test_evicted_file_keeps_its_uploaded_copy(tmp_path, monkeypatch):
+    tick(monkeypatch)
+    cache = RenderCache(tmp_path / "cache", max_bytes=150, max_entries=10)
+    cache.put("a", video_path=make_video(tmp_path, "a.mp4", 100), s3_url="https://cdn/a.mp4")
+    cache.put("b", video_path=make_video(tmp_path, "b.mp4", 100))
+
+    assert cache.get("a") == {"path": None, "s3_url": "https://cdn/a.mp4"}
+    assert not (tmp_path / "cache" / "a.mp4").exists()
+    assert cache.get("b")["path"] is not None
+
+
+def test_oldest_entries_are_evicted_over_max_entries(tmp_path, monkeypatch):
+    tick(monkeypatch)
+    cache = RenderCache(tmp_path / "cache", max_bytes=1024, max_entries=2)
+    for key in "abc":
+        cache.put(key, s3_url=f"https://cdn/{key}.mp4")
+
+    assert cache.get("a") is None
+    assert cache.get("b") == {"path": None, "s3_url": "https://cdn/b.mp4"}
+    assert cache.stats()["entries"] == 2
+
+
+def fill(path, size):
+    (path / "partial.mp4").write_bytes(b"\0" * size)
+
+
+def test_lineage_keeps_its_directory_between_renders(tmp_path):
+    cache = PartialMovieCache(tmp_path / "partial", max_bytes=1024)
+    first = cache.acquire("video-1")
+    fill(first, 100)
+    cache.release("video-1", rendered=3)
+
+    second = cache.acquire("video-1")
+    assert second == first
+    assert (second / "partial.mp4").exists()
+    cache.release("video-1", reused=2, rendered=1)
+    assert cache.acquire("video-2") != first
+    cache.release("video-2")
+
+    stats = cache.stats()
+    assert stats["renders"] == 3
+    assert stats["reused_animations"] == 2
+    assert stats["rendered_animations"] == 4
+    assert stats["reuse_rate"] == 0.333
+
+
+def test_least_recently_used_idle_lineage_is_evicted(tmp_path):
+    cache = PartialMovieCache(tmp_path / "partial", max_bytes=250)
+    paths = {}
+    for age, lineage in enumerate(["old", "busy", "new"]):
+        paths[lineage] = cache.acquire(lineage)
+        fill(paths[lineage], 100)
+        os.utime(paths[lineage], (age, age))
+        if lineage != "busy":
+            cache.release(lineage)
+
+    # "busy" is older than "new" but still rendering, so it stays
+    assert not paths["old"].exists()
+    assert paths["busy"].exists()
+    assert paths["new"].exists()
+
+    # With "old" gone the rest fit
+    cache.release("busy")
+    assert paths["busy"].exists()
+    assert cache.stats()["evictions"] == 1
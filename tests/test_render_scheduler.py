@@ -0,0 +1,66 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from render_scheduler import PRIORITY_LOW, PRIORITY_NORMAL, RenderScheduler  # noqa: E402
+
+
+def noop():
+    pass
+
+
+def test_priority_orders_jobs_submitted_together():
+    scheduler = RenderScheduler(slots=1, priority_aging=0.01)
+    scheduler.submit("low", noop, priority=PRIORITY_LOW)
+    scheduler.submit("normal", noop, priority=PRIORITY_NORMAL)
+    assert scheduler.queue_position("normal") == 1
+    assert scheduler.queue_position("low") == 2
+
+
+def test_waiting_job_ages_ahead_of_later_submissions():
+    # PRIORITY_LOW is ten levels behind PRIORITY_NORMAL, 0.1s at this aging rate
+    scheduler = RenderScheduler(slots=1, priority_aging=0.01)
+    scheduler.submit("low", noop, priority=PRIORITY_LOW)
+    time.sleep(0.2)
+    scheduler.submit("normal", noop, priority=PRIORITY_NORMAL)
+    assert scheduler.queue_position("low") == 1
+    assert scheduler.queue_position("normal") == 2
+
+
+def test_no_aging_keeps_strict_priorities():
+    scheduler = RenderScheduler(slots=1, priority_aging=0)
+    scheduler.submit("low", noop, priority=PRIORITY_LOW)
+    time.sleep(0.05)
+    scheduler.submit("normal", noop, priority=PRIORITY_NORMAL)
+    assert scheduler.queue_position("normal") == 1
+
+
+def test_jobs_run_in_rank_order():
+    scheduler = RenderScheduler(slots=1, priority_aging=0.01)
+    order = []
+
+    def record(name):
+        order.append(name)
+
+    scheduler.submit("low", record, priority=PRIORITY_LOW, name="low")
+    scheduler.submit("normal", record, priority=PRIORITY_NORMAL, name="normal")
+    scheduler.start()
+    deadline = time.monotonic() + 2
+    while len(order) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    scheduler.stop()
+    assert order == ["normal", "low"]
+
+
+def test_settings_come_from_variables_named_after_the_scheduler(monkeypatch):
+    monkeypatch.setenv("RENDER_QUEUE_MAX_COST", "3")
+    monkeypatch.setenv("RENDER_PRIORITY_AGING", "0")
+    monkeypatch.setenv("GENERATION_QUEUE_MAX", "7")
+
+    render = RenderScheduler(slots=1)
+    generation = RenderScheduler(slots=1, name="generation")
+
+    assert (render.max_queue, render.max_cost, render.priority_aging) == (100, 3.0, 0.0)
+    assert (generation.max_queue, generation.max_cost, generation.priority_aging) == (7, 7.0, 15.0)
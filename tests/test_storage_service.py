@@ -0,0 +1,130 @@
+import itertools
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import storage_service  # noqa: E402
+from storage_service import MIN_PART_SIZE, LocalS3Client, ObjectIndex, StorageService  # noqa: E402
+
+
+def test_objects_for_prompt_newest_first(tmp_path, monkeypatch):
+    clock = itertools.count(1000)
+    monkeypatch.setattr(storage_service.time, "time", lambda: float(next(clock)))
+    index = ObjectIndex(tmp_path / "objects.db")
+    index.record("videos/a.mp4", "https://cdn/a.mp4", 10, "draw a circle", "job-1")
+    index.record("videos/b.mp4", "https://cdn/b.mp4", 20, "draw a circle", "job-2")
+    # The same bytes rendered again for another job are one object
+    index.record("videos/a.mp4", "https://cdn/a.mp4", 10, "draw a circle", "job-3", deduplicated=True)
+    index.record("videos/c.mp4", "https://cdn/c.mp4", 30, "draw a square", "job-4")
+
+    assert index.objects_for_prompt("draw a circle") == ["https://cdn/a.mp4", "https://cdn/b.mp4"]
+    assert index.objects_for_prompt("draw a square") == ["https://cdn/c.mp4"]
+    assert index.objects_for_prompt("draw a line") == []
+    assert index.get("videos/b.mp4") == "https://cdn/b.mp4"
+
+    stats = index.stats()
+    assert stats["objects"] == 3
+    assert stats["references"] == 4
+    assert stats["deduplicated_uploads"] == 1
+    assert stats["bytes_saved"] == 10
+    index.close()
+
+
+class FlakyClient(LocalS3Client):
+    """Fails the given part a number of times before letting it through"""
+
+    def __init__(self, root, part_number, failures):
+        super().__init__(root)
+        self.part_number = part_number
+        self.failures = failures
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if PartNumber == self.part_number and self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("connection reset")
+        return super().upload_part(Bucket=Bucket, Key=Key, UploadId=UploadId, PartNumber=PartNumber, Body=Body)
+
+
+def make_storage(client):
+    storage = StorageService(bucket_name="videos", client=client, part_size=MIN_PART_SIZE, concurrency=2, max_attempts=3)
+    storage.backoff = 0
+    return storage
+
+
+def write_video(path, size):
+    data = os.urandom(size)
+    path.write_bytes(data)
+    return data
+
+
+def test_small_file_is_one_put(tmp_path):
+    client = LocalS3Client(tmp_path / "s3")
+    storage = make_storage(client)
+    data = write_video(tmp_path / "small.mp4", 1024)
+
+    url = storage.upload_file(str(tmp_path / "small.mp4"), "videos/small.mp4")
+
+    assert url == storage.url_for("videos/small.mp4")
+    assert (tmp_path / "s3" / "videos" / "videos" / "small.mp4").read_bytes() == data
+    assert storage.exists("videos/small.mp4", len(data))
+    assert not storage.exists("videos/small.mp4", len(data) + 1)
+    assert not storage.exists("videos/missing.mp4", len(data))
+    assert storage.confirm("videos/small.mp4", len(data))
+    stats = storage.stats()
+    assert stats["uploads"] == 1
+    assert stats["multipart_uploads"] == 0
+    assert stats["bytes"] == len(data)
+    storage.close()
+
+
+def test_large_file_is_uploaded_in_parts(tmp_path):
+    client = LocalS3Client(tmp_path / "s3")
+    storage = make_storage(client)
+    # Two full parts and a short last one
+    data = write_video(tmp_path / "large.mp4", 2 * MIN_PART_SIZE + 1234)
+
+    url = storage.upload_file(str(tmp_path / "large.mp4"), "videos/large.mp4")
+
+    assert url == storage.url_for("videos/large.mp4")
+    assert (tmp_path / "s3" / "videos" / "videos" / "large.mp4").read_bytes() == data
+    assert storage.confirm("videos/large.mp4", len(data))
+    assert list((tmp_path / "s3" / ".multipart").iterdir()) == []
+    stats = storage.stats()
+    assert stats["uploads"] == 1
+    assert stats["multipart_uploads"] == 1
+    assert stats["retries"] == 0
+    storage.close()
+
+
+def test_failed_part_is_retried(tmp_path):
+    client = FlakyClient(tmp_path / "s3", part_number=2, failures=2)
+    storage = make_storage(client)
+    data = write_video(tmp_path / "large.mp4", MIN_PART_SIZE + 1)
+
+    assert storage.upload_file(str(tmp_path / "large.mp4"), "videos/large.mp4") is not None
+
+    assert (tmp_path / "s3" / "videos" / "videos" / "large.mp4").read_bytes() == data
+    stats = storage.stats()
+    assert stats["retries"] == 2
+    assert stats["failures"] == 0
+    assert stats["multipart_uploads"] == 1
+    storage.close()
+
+
+def test_upload_is_aborted_when_a_part_keeps_failing(tmp_path):
+    client = FlakyClient(tmp_path / "s3", part_number=2, failures=3)
+    storage = make_storage(client)
+    data = write_video(tmp_path / "large.mp4", MIN_PART_SIZE + 1)
+
+    assert storage.upload_file(str(tmp_path / "large.mp4"), "videos/large.mp4") is None
+
+    assert not storage.exists("videos/large.mp4", len(data))
+    # The parts that did land are discarded with the upload
+    assert list((tmp_path / "s3" / ".multipart").iterdir()) == []
+    stats = storage.stats()
+    assert stats["uploads"] == 0
+    assert stats["failures"] == 1
+    assert stats["retries"] == 2
+    storage.close()
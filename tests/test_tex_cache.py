@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tex_cache import TexCache  # noqa: E402
+
+
+def make_file(tex_dir, name, size, age):
+    path = tex_dir / name
+    path.write_bytes(b"\0" * size)
+    used = time.time() - age
+    os.utime(path, (used, used))
+    return path
+
+
+def test_least_recently_used_svgs_are_evicted_over_max_bytes(tmp_path):
+    cache = TexCache(tmp_path, max_bytes=250, grace_seconds=60)
+    oldest = make_file(tmp_path, "a.svg", 100, age=300)
+    older = make_file(tmp_path, "b.svg", 100, age=200)
+    recent = make_file(tmp_path, "c.svg", 100, age=100)
+
+    cache.evict()
+
+    assert not oldest.exists()
+    assert older.exists()
+    assert recent.exists()
+    assert cache.stats()["bytes"] == 200
+    assert cache.stats()["evictions"] == 1
+
+
+def test_svgs_used_within_the_grace_period_are_kept(tmp_path):
+    cache = TexCache(tmp_path, max_bytes=100, grace_seconds=60)
+    in_use = [make_file(tmp_path, f"{name}.svg", 100, age=10) for name in "abc"]
+
+    cache.evict()
+
+    assert all(path.exists() for path in in_use)
+    assert cache.stats()["bytes"] == 300
+    assert cache.stats()["evictions"] == 0
+
+
+def test_old_compilation_leftovers_are_removed(tmp_path):
+    cache = TexCache(tmp_path, max_bytes=1024, grace_seconds=60)
+    old_log = make_file(tmp_path, "a.log", 10, age=120)
+    new_tex = make_file(tmp_path, "b.tex", 10, age=10)
+    svg = make_file(tmp_path, "a.svg", 10, age=120)
+
+    cache.evict()
+
+    assert not old_log.exists()
+    assert new_tex.exists()
+    assert svg.exists()
+
+
+def test_record_counts_hits_and_sweeps_at_most_once_per_interval(tmp_path):
+    cache = TexCache(tmp_path, max_bytes=100, grace_seconds=60, evict_interval=3600)
+    cache.record(hits=3, misses=1)
+    stale = make_file(tmp_path, "a.svg", 100, age=300)
+    make_file(tmp_path, "b.svg", 100, age=200)
+
+    # The first record() swept an empty directory, the next sweep is an hour away
+    cache.record(hits=1, misses=0)
+    assert stale.exists()
+
+    stats = cache.stats()
+    assert stats["hits"] == 4
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.8
@@ -0,0 +1,175 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: renders still share the directory, just without per-formula locks
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Printed by the render process after each scene; RenderProgress counts it and keeps it out of the log
+SUMMARY_FORMAT = "Tex cache: {hits} hits, {misses} misses"
+
+_counts = {"hits": 0, "misses": 0}
+_installed = False
+
+
+def install_tex_cache(tex_dir: str):
+    """Route Manim's Tex compilation through the shared cache; call once per render process.
+
+    Manim already reuses an SVG whose hash-named file exists in tex_dir.
+    The wrapper adds a file lock around each formula, so concurrent renders
+    compile it once and never read a half-written file. It also counts hits and
+    refreshes the SVG's mtime, which TexCache uses for LRU eviction.
+    """
+    global _installed
+    if _installed:
+        return
+    from manim.mobject.text import tex_mobject
+    from manim.utils import tex_file_writing
+
+    lock_dir = Path(tex_dir) / "locks"
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    compile_svg = tex_file_writing.tex_to_svg_file
+
+    def tex_to_svg_file(expression, environment=None, tex_template=None):
+        template_body = getattr(tex_template, "body", "") if tex_template is not None else ""
+        key = hashlib.sha256(f"{expression}\0{environment}\0{template_body}".encode()).hexdigest()
+        # A fixed set of lock stripes, so lock files never need cleaning up
+        with _FormulaLock(lock_dir / f"{key[:2]}.lock"):
+            started = time.time()
+            svg_file = compile_svg(expression, environment=environment, tex_template=tex_template)
+            try:
+                hit = os.stat(svg_file).st_mtime < started
+                os.utime(svg_file)
+            except FileNotFoundError:
+                # Evicted between Manim's existence check and now
+                hit = False
+                svg_file = compile_svg(expression, environment=environment, tex_template=tex_template)
+        _counts["hits" if hit else "misses"] += 1
+        return svg_file
+
+    tex_file_writing.tex_to_svg_file = tex_to_svg_file
+    tex_mobject.tex_to_svg_file = tex_to_svg_file
+    _installed = True
+
+
+class _FormulaLock:
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._file = open(self.path, "a")
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+
+
+def print_summary():
+    """Print and reset this process's hit counts for the scene just rendered"""
+    print(SUMMARY_FORMAT.format(**_counts), flush=True)
+    _counts["hits"] = _counts["misses"] = 0
+
+
+class TexCache:
+    """Size bound and hit rate for the Tex directory shared by every render.
+
+    SVGs are evicted least-recently-used by mtime once the directory exceeds
+    max_bytes. Anything used within grace_seconds is never evicted, and
+    compilation leftovers (.tex, .dvi, .log, ...) older than that are removed.
+    """
+
+    def __init__(self, tex_dir: Path, max_bytes: int = None, grace_seconds: float = 3600, evict_interval: float = 60):
+        self.tex_dir = Path(tex_dir)
+        self.tex_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes or int(os.environ.get("TEX_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+        self.grace_seconds = grace_seconds
+        self.evict_interval = evict_interval
+
+        self._lock = threading.Lock()
+        self._last_evicted = 0.0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._bytes = 0
+
+    def record(self, hits: int, misses: int):
+        """Add a render's counts and evict if the last sweep was more than evict_interval ago"""
+        with self._lock:
+            self._hits += hits
+            self._misses += misses
+            due = time.time() - self._last_evicted >= self.evict_interval
+            if due:
+                self._last_evicted = time.time()
+        if due:
+            self.evict()
+
+    def evict(self):
+        now = time.time()
+        svgs = []
+        total = 0
+        removed = 0
+        for entry in os.scandir(self.tex_dir):
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith(".svg"):
+                svgs.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+            elif now - stat.st_mtime > self.grace_seconds:
+                self._unlink(entry.path)
+
+        svgs.sort()
+        for mtime, size, path in svgs:
+            if total <= self.max_bytes:
+                break
+            try:
+                # Re-check right before removing; a render may have just used it
+                if now - os.stat(path).st_mtime <= self.grace_seconds:
+                    continue
+            except FileNotFoundError:
+                total -= size
+                continue
+            if self._unlink(path):
+                total -= size
+                removed += 1
+
+        with self._lock:
+            self._bytes = total
+            self._evictions += removed
+        if removed:
+            logger.info(f"Evicted {removed} Tex SVGs, {total / 1024 ** 2:.1f} MB remain")
+
+    @staticmethod
+    def _unlink(path: str) -> bool:
+        try:
+            os.unlink(path)
+            return True
+        except OSError:
+            return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self._evictions
+            }